@@ -1,9 +1,10 @@
 # Filename: 01_fetch_data.py
 import os
 import pandas as pd
-from supabase import create_client, Client
 from dotenv import load_dotenv
-import ast # For safely evaluating string representations of lists
+from enrolment_ratings import COMPLETED_STATUS, interactions_from_enrolments
+from postgrest_fetcher import PostgrestFetcher
+from preference_interests import PREFERENCE_COLUMNS, interests_from_preferences
 
 load_dotenv() # Load environment variables from .env file
 
@@ -14,24 +15,12 @@ SUPABASE_KEY = os.environ.get("VITE_SUPABASE_SERVICE_KEY") # Use service key for
 if not SUPABASE_URL or not SUPABASE_KEY:
     raise ValueError("Supabase URL or Key not found in environment variables.")
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-
-# --- Define Grade to Rating Mapping ---
-# Adjust this mapping based on your actual grade values and desired numerical scale
-# Ensure a consistent numerical scale, e.g., 1 (worst) to 5 (best) or 0-10.
-# The 'surprise' library typically expects a min/max rating scale.
-GRADE_TO_RATING_MAPPING = {
-    'A+': 10.0, 'A': 9.0, 'A-': 8.5,
-    'B+': 8.0, 'B': 7.0, 'B-': 6.5,
-    'C+': 6.0, 'C': 5.0, 'C-': 4.5,
-    'D+': 4.0, 'D': 3.0,
-    'P': 5.0,  # Pass
-    'S': 7.0,  # Satisfactory (often used for non-graded courses)
-    'F': 1.0,  # Fail
-    'U': 1.0,  # Unsatisfactory
-    # Add any other grades present in your 'user_semester_courses' table
-}
-DEFAULT_RATING_FOR_UNKNOWN_GRADE = 3.0 # A neutral rating for unmapped grades
+# Tables are paged to disk with concurrent, retried, resumable range requests (see postgrest_fetcher.py)
+fetcher = PostgrestFetcher(f"{SUPABASE_URL.rstrip('/')}/rest/v1", SUPABASE_KEY,
+                           page_size=int(os.environ.get('SUPABASE_PAGE_SIZE', 1000)),
+                           max_in_flight=int(os.environ.get('SUPABASE_MAX_IN_FLIGHT', 4)))
+# Raw table exports (and their resume checkpoints while a fetch is in progress)
+RAW_DATA_DIR = 'data/raw'
 
 # --- Fetch Courses Data ---
 def fetch_courses_data():
@@ -39,9 +28,10 @@ def fetch_courses_data():
     # Since there's no dedicated courses table, we'll extract unique course information
     # from the user_semester_courses table
     try:
-        response = supabase.table('user_semester_courses').select('course_uuid, course_acronym').execute()
-        if response.data:
-            courses_df = pd.DataFrame(response.data)
+        raw_path = os.path.join(RAW_DATA_DIR, 'user_semester_courses_catalog.csv')
+        fetcher.fetch_table('user_semester_courses', raw_path, select='course_uuid,course_acronym')
+        courses_df = pd.read_csv(raw_path)
+        if not courses_df.empty:
             # Remove duplicates and create a proper courses dataframe
             courses_df = courses_df.drop_duplicates(subset=['course_uuid'])
             courses_df.rename(columns={'course_uuid': 'course_id', 'course_acronym': 'code'}, inplace=True)
@@ -68,60 +58,20 @@ def fetch_courses_data():
 def fetch_student_interactions_data():
     print("Fetching student completed courses data (interactions)...")
     try:
-        response = supabase.table('user_semester_courses') \
-                           .select('user_id, course_uuid, grade, status') \
-                           .eq('status', 'completed') \
-                           .execute()
-
-        print(f"DEBUG: Supabase raw response object type: {type(response)}")
-        # The 'execute()' method typically returns a ModelResponse or APIResponse object
-        # from postgrest-py (used by supabase-py)
-        # Let's inspect its attributes
-
-        if hasattr(response, 'data'):
-            print(f"DEBUG: response.data type: {type(response.data)}")
-            print(f"DEBUG: response.data content (first 500 chars): {str(response.data)[:500]}")
-            if isinstance(response.data, list):
-                print(f"DEBUG: Number of records in response.data: {len(response.data)}")
-            else:
-                print("DEBUG: response.data is not a list.")
-        else:
-            print("DEBUG: response object does not have a 'data' attribute.")
-
-        if hasattr(response, 'error'):
-            print(f"DEBUG: response.error type: {type(response.error)}")
-            print(f"DEBUG: response.error content: {response.error}")
-        else:
-            print("DEBUG: response object does not have an 'error' attribute.")
-
-        if hasattr(response, 'count'):
-             print(f"DEBUG: response.count: {response.count}")
-        else:
-             print("DEBUG: response object does not have a 'count' attribute.")
-
+        raw_path = os.path.join(RAW_DATA_DIR, 'user_semester_courses_completed.csv')
+        fetcher.fetch_table('user_semester_courses', raw_path, select='user_id,course_uuid,grade,status',
+                            filters={'status': f"eq.{COMPLETED_STATUS}"})
+        interactions_df = pd.read_csv(raw_path, dtype={'user_id': str, 'course_uuid': str, 'grade': str})
 
-        # Proceed only if data is present and is a list
-        if response.data and isinstance(response.data, list) and len(response.data) > 0:
-            interactions_df = pd.DataFrame(response.data)
-            if interactions_df.empty:
-                print("DataFrame is empty after creation, though response.data was not.")
-                interactions_df.to_csv('data/student_interactions.csv', index=False)
-                return interactions_df # Return empty df
-
-            print("DEBUG: Raw interactions_df before grade mapping:")
-            print(interactions_df.head())
-
-            # Rename course_uuid to course_id for consistency
-            interactions_df.rename(columns={'course_uuid': 'course_id'}, inplace=True)
-
-            interactions_df['rating'] = interactions_df['grade'].str.upper().map(GRADE_TO_RATING_MAPPING)
-            interactions_df['rating'] = interactions_df['rating'].fillna(DEFAULT_RATING_FOR_UNKNOWN_GRADE)
+        if not interactions_df.empty:
+            # Renames course_uuid to course_id and maps grades to ratings (shared with the incremental sync)
+            interactions_df = interactions_from_enrolments(interactions_df)
 
             print(f"Fetched and processed {len(interactions_df)} 'completed' student-course interactions.")
-            interactions_df[['user_id', 'course_id', 'rating']].to_csv('data/student_interactions.csv', index=False)
-            return interactions_df[['user_id', 'course_id', 'rating']]
+            interactions_df.to_csv('data/student_interactions.csv', index=False)
+            return interactions_df
         else:
-            print("No 'completed' student-course interactions found in response.data or response.data was not a list.")
+            print("No 'completed' student-course interactions found.")
             # Create an empty DataFrame with expected columns if none found
             empty_df = pd.DataFrame(columns=['user_id', 'course_id', 'rating'])
             empty_df.to_csv('data/student_interactions.csv', index=False)
@@ -138,49 +88,21 @@ def fetch_student_interactions_data():
 # --- Fetch Student Preferences/Interests Data ---
 def fetch_student_preferences_data():
     print("Fetching student preferences/interests data...")
-    response = supabase.table('user_course_preferences') \
-                       .select('user_id, career_goal, technical_skills, improvement_areas, primary_interest, secondary_interest') \
-                       .execute()
-    if response.data:
-        preferences_df = pd.DataFrame(response.data)
-        # preferences_df.rename(columns={'user_id': 'student_id'}, inplace=True)
-
-        # Combine relevant text fields into a single 'interests_text' field
-        # Handle TEXT[] arrays: join them into space-separated strings
-        def process_text_array(arr):
-            if arr is None:
-                return ""
-            if isinstance(arr, str): # If it's already a string (e.g. from CSV load)
-                try:
-                    # Try to evaluate if it's a string representation of a list
-                    evaluated_arr = ast.literal_eval(arr)
-                    if isinstance(evaluated_arr, list):
-                        return " ".join(str(item) for item in evaluated_arr if item)
-                except (ValueError, SyntaxError):
-                    # If not a list string, just return the string itself
-                    return arr
-            if isinstance(arr, list):
-                return " ".join(str(item) for item in arr if item)
-            return str(arr) # Fallback for other types
-
-        preferences_df['technical_skills_str'] = preferences_df['technical_skills'].apply(process_text_array)
-        preferences_df['improvement_areas_str'] = preferences_df['improvement_areas'].apply(process_text_array)
-
-        # Concatenate interest fields
-        interest_columns = ['career_goal', 'technical_skills_str', 'improvement_areas_str', 'primary_interest', 'secondary_interest']
-        for col in interest_columns:
-            if col not in preferences_df.columns: # Handle if a column is missing
-                 preferences_df[col] = ""
-            preferences_df[col] = preferences_df[col].fillna('') # Fill NaN with empty string
-
-        preferences_df['interests_combined'] = preferences_df[interest_columns].agg(' '.join, axis=1)
+    raw_path = os.path.join(RAW_DATA_DIR, 'user_course_preferences.csv')
+    fetcher.fetch_table('user_course_preferences', raw_path,
+                        select=','.join(['user_id'] + PREFERENCE_COLUMNS),
+                        order='user_id')
+    # Nulls read back as empty strings; TEXT[] columns hold JSON arrays
+    preferences_df = pd.read_csv(raw_path, dtype=str, keep_default_na=False)
+    if not preferences_df.empty:
+        # Combine the preference fields into 'interests_combined' (shared with the incremental sync)
+        preferences_df = interests_from_preferences(preferences_df)
 
         print(f"Fetched preferences for {len(preferences_df)} students.")
-        # Save only relevant columns
-        preferences_df[['user_id', 'interests_combined']].to_csv('data/student_preferences.csv', index=False)
-        return preferences_df[['user_id', 'interests_combined']]
+        preferences_df.to_csv('data/student_preferences.csv', index=False)
+        return preferences_df
     else:
-        print("No student preferences data found or error fetching.")
+        print("No student preferences data found.")
         return pd.DataFrame()
 
 if __name__ == "__main__":
@@ -189,9 +111,10 @@ if __name__ == "__main__":
         os.makedirs('data')
 
     print("--- Starting Data Fetching ---")
-    courses_df = fetch_courses_data()
-    interactions_df = fetch_student_interactions_data()
-    preferences_df = fetch_student_preferences_data()
+    with fetcher:
+        courses_df = fetch_courses_data()
+        interactions_df = fetch_student_interactions_data()
+        preferences_df = fetch_student_preferences_data()
 
     print("\n--- Data Fetching Summary ---")
     if not courses_df.empty:
@@ -0,0 +1,96 @@
+# Filename: 01_sync_supabase_data.py
+# Incremental ingestion: keeps local mirrors of the Supabase tables up to date with watermark syncs
+# (only rows changed since the last run are downloaded, see incremental_sync.py), rebuilds the derived
+# CSVs of the tables that changed and reports which downstream steps have work to do.
+#
+#   python 01_sync_supabase_data.py          # incremental
+#   python 01_sync_supabase_data.py --full   # download everything again (still diffed into a changeset)
+import argparse
+import os
+import pandas as pd
+from dotenv import load_dotenv
+from enrolment_ratings import interactions_from_enrolments
+from incremental_sync import load_state, sync_table
+from postgrest_fetcher import PostgrestFetcher
+from preference_interests import interests_from_preferences
+
+# Table -> local mirror and primary key. Every table has an `updated_at` column maintained by the database.
+# Mirrors are the sync's own copies; the pipeline's input files are derived from them.
+TABLES = {
+    'courses_iiitd': {'mirror': 'data/raw/courses_iiitd.csv', 'key': 'uuid'},
+    'user_semester_courses': {'mirror': 'data/raw/user_semester_courses.csv', 'key': 'id'},
+    'user_course_preferences': {'mirror': 'data/raw/user_course_preferences.csv', 'key': 'user_id'},
+}
+# Columns of data/courses_iiitd.csv, the course catalog 02_preprocess_and_vectorize_bert.py reads
+COURSE_COLUMNS = ['uuid', 'course_code', 'course_acronym', 'course_name', 'dept_acronym', 'description', 'credits',
+                  'prerequisites', 'antirequisites', 'semester', 'semester_type', 'professor_allocated', 'schedule',
+                  'related_course_codes', 'created_at', 'updated_at', 'suitable tags']
+
+
+def build_courses(mirror_path, output_path='data/courses_iiitd.csv'):
+    """The course catalog in its usual column layout, from the mirrored courses_iiitd table."""
+    df = pd.read_csv(mirror_path, dtype=str, keep_default_na=False)
+    df.reindex(columns=COURSE_COLUMNS, fill_value='').to_csv(output_path, index=False)
+    print(f"  {output_path}: {len(df)} courses")
+
+
+def build_interactions(mirror_path, output_path='data/student_interactions.csv'):
+    """Completed courses of the mirrored user_semester_courses as (user_id, course_id, rating), as 001 builds them."""
+    df = interactions_from_enrolments(pd.read_csv(mirror_path, dtype=str, keep_default_na=False))
+    df.to_csv(output_path, index=False)
+    print(f"  {output_path}: {len(df)} interactions")
+
+
+def build_preferences(mirror_path, output_path='data/student_preferences.csv'):
+    """Each student's preference fields of the mirrored user_course_preferences joined into `interests_combined`, as 001 builds them."""
+    df = interests_from_preferences(pd.read_csv(mirror_path, dtype=str, keep_default_na=False))
+    df.to_csv(output_path, index=False)
+    print(f"  {output_path}: {len(df)} students")
+
+
+def sync(args):
+    load_dotenv()
+    url = os.environ.get("SUPABASE_URL")
+    key = os.environ.get("SUPABASE_SERVICE_KEY")
+    if not url or not key:
+        raise SystemExit("ERROR: SUPABASE_URL or SUPABASE_SERVICE_KEY not found in environment variables.")
+
+    print("--- 1. Syncing Tables ---")
+    state = load_state()
+    changesets = {}
+    with PostgrestFetcher(f"{url.rstrip('/')}/rest/v1", key,
+                          page_size=int(os.environ.get('SUPABASE_PAGE_SIZE', 1000)),
+                          max_in_flight=int(os.environ.get('SUPABASE_MAX_IN_FLIGHT', 4))) as fetcher:
+        for table in args.tables:
+            config = TABLES[table]
+            changesets[table] = sync_table(fetcher, table, config['mirror'], config['key'], state, full=args.full)
+    changed = {table for table, c in changesets.items() if c['inserted'] or c['updated'] or c['deleted']}
+
+    print("\n--- 2. Rebuilding Derived Data ---")
+    if 'courses_iiitd' in changed:
+        build_courses(TABLES['courses_iiitd']['mirror'])
+    if 'user_semester_courses' in changed:
+        build_interactions(TABLES['user_semester_courses']['mirror'])
+    if 'user_course_preferences' in changed:
+        build_preferences(TABLES['user_course_preferences']['mirror'])
+    if not changed:
+        print("  Nothing to rebuild.")
+
+    print("\n--- 3. Downstream ---")
+    if not changed:
+        print("  No changes since the last sync.")
+    if 'courses_iiitd' in changed:
+        c = changesets['courses_iiitd']
+        print(f"  Courses: {len(c['inserted'])} new, {len(c['updated'])} updated, {len(c['deleted'])} deleted -> "
+              f"run 02_preprocess_and_vectorize_bert.py (only new or edited course texts are re-embedded).")
+    if 'user_course_preferences' in changed:
+        print("  Preferences changed -> clean them and re-run 02_preprocess_and_vectorize_bert.py for student vectors.")
+    if 'user_semester_courses' in changed:
+        print("  Interactions changed -> clean them and re-run 03_train_collaborative_filtering.py.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Incrementally sync the Supabase tables into data/.")
+    parser.add_argument('--full', action='store_true', help="Ignore the watermarks and download every row.")
+    parser.add_argument('--tables', nargs='+', choices=list(TABLES), default=list(TABLES))
+    sync(parser.parse_args())
@@ -1,10 +1,10 @@
 # Filename: 02_preprocess_and_vectorize.py
 import pandas as pd
 import nltk
-import re
-import joblib
 from sklearn.feature_extraction.text import TfidfVectorizer
 import os
+from artifacts import write_lexical_bundle
+from text_normalization import normalize_corpus
 
 # --- Download NLTK resources (only needs to run once) ---
 try:
@@ -19,23 +19,15 @@ except LookupError:
     nltk.download('punkt_tab')
     print("NLTK data downloaded.")
 
-def preprocess_text(text):
-    """A helper function to clean up text."""
-    if pd.isna(text): return ""
-    text = str(text).lower()
-    text = re.sub(r'[^\w\s]', '', text)
-    tokens = nltk.word_tokenize(text)
-    stop_words = set(nltk.corpus.stopwords.words('english'))
-    lemmatizer = nltk.stem.WordNetLemmatizer()
-    tokens = [lemmatizer.lemmatize(w) for w in tokens if w not in stop_words and w.isalpha()]
-    return " ".join(tokens)
+# Worker processes used for text normalization (1 = normalize in this process)
+NORMALIZE_JOBS = int(os.environ.get('RECOMMENDER_NORMALIZE_JOBS', os.cpu_count() or 1))
 
 def process_course_content():
     """Processes course descriptions for content-based filtering."""
     print("--- 1. Processing Course Content ---")
     df = pd.read_csv('data/courses.csv')
     df['content_full'] = df['name'].fillna('') + ' ' + df['description'].fillna('') + ' ' + df['prerequisites'].fillna('')
-    df['processed_content'] = df['content_full'].apply(preprocess_text)
+    df['processed_content'] = normalize_corpus(df['content_full'], n_jobs=NORMALIZE_JOBS)
     print("Course content processed.")
     return df
 
@@ -43,7 +35,7 @@ def process_student_preferences():
     """Processes student preferences for content-based profiling."""
     print("--- 2. Processing Student Preferences ---")
     df = pd.read_csv('data/student_preferences_cleaned.csv')
-    df['processed_interests'] = df['interests_combined'].apply(preprocess_text)
+    df['processed_interests'] = normalize_corpus(df['interests_combined'], n_jobs=NORMALIZE_JOBS)
     print("Student preferences processed.")
     return df
 
@@ -64,20 +56,18 @@ def vectorize_data(courses_df, preferences_df):
     student_tfidf_matrix = vectorizer.transform(student_corpus)
     print(f"Student TF-IDF matrix created with shape: {student_tfidf_matrix.shape}")
     
-    # Save the vectorizer and matrices for later use in the API
-    model_dir = 'models/content_based'
-    if not os.path.exists(model_dir):
-        os.makedirs(model_dir)
-
-    joblib.dump(vectorizer, f'{model_dir}/tfidf_vectorizer.joblib')
-    joblib.dump(course_tfidf_matrix, f'{model_dir}/course_tfidf_matrix.joblib')
-    joblib.dump(student_tfidf_matrix, f'{model_dir}/student_tfidf_matrix.joblib')
-    
-    # Save the mappings from matrix row to actual ID
-    joblib.dump(courses_df['course_id'].tolist(), f'{model_dir}/course_ids.joblib')
-    joblib.dump(preferences_df['user_id'].astype(str).tolist(), f'{model_dir}/user_ids.joblib')
+    # Save the matrices, vocabulary and IDF weights as a memory-mappable bundle for the API's lexical mode
+    model_dir = 'models/lexical'
+    manifest = write_lexical_bundle(
+        model_dir,
+        courses_df['course_id'].tolist(),
+        course_tfidf_matrix,
+        preferences_df['user_id'].astype(str).tolist(),
+        student_tfidf_matrix,
+        vectorizer,
+    )
     
-    print("\nVectorizer, matrices, and ID mappings saved to 'models/content_based/' directory.")
+    print(f"\nTF-IDF matrices, vocabulary and ID mappings saved to '{model_dir}' directory (version {manifest['version']}).")
 
 if __name__ == "__main__":
     courses_df = process_course_content()
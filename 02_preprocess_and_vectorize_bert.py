@@ -1,8 +1,18 @@
 # Filename: 02_preprocess_and_vectorize.py (Upgraded to Sentence-BERT)
-import pandas as pd
-import joblib
 import os
-from sentence_transformers import SentenceTransformer
+import time
+import pandas as pd
+from artifacts import write_content_bundle
+from embedding_store import EmbeddingStore
+from chunked_encoding import encode_chunked, encode_length_sorted
+from encoder import encoder_id, load_sentence_model
+
+MODEL_NAME = 'all-MiniLM-L6-v2'
+# Inference backend: 'torch' (fp32) or 'torch-int8' (dynamically quantized, faster on CPU)
+ENCODER_BACKEND = os.environ.get('RECOMMENDER_ENCODER_BACKEND', 'torch')
+
+# Embeddings of earlier runs, keyed by (model name, text hash). Only new or edited texts are encoded.
+EMBEDDING_CACHE_DIR = '.cache/embeddings'
 
 def process_course_content():
     """Processes course content from the local CSV file."""
@@ -46,37 +56,62 @@ def vectorize_data_with_bert(courses_df, preferences_df):
     """Creates Semantic Embeddings for courses and students using Sentence-BERT."""
     print("\n--- 3. Vectorizing Data with Sentence-BERT ---")
     
-    # Load a powerful, pre-trained Sentence Transformer model.
-    # This will be downloaded and cached automatically the first time.
-    print("Loading Sentence-BERT model (all-MiniLM-L6-v2)...")
-    model = SentenceTransformer('all-MiniLM-L6-v2')
-
-    # Create the course-feature matrix. This is the most time-consuming step.
     course_corpus = courses_df['content_full'].tolist()
-    print("Encoding course data... (This may take a few minutes)")
-    course_embeddings = model.encode(course_corpus, show_progress_bar=True)
-    print(f"Course embedding matrix created with shape: {course_embeddings.shape}")
-    
-    # Create the student-feature matrix
     student_corpus = preferences_df['interests_combined'].tolist()
-    print("Encoding student preference data...")
-    student_embeddings = model.encode(student_corpus, show_progress_bar=True)
+
+    # Reuse the embeddings of every text that has not changed since the last run. Course vectors are
+    # pooled over chunks, so they are cached separately from the single-pass student vectors.
+    course_store = EmbeddingStore(EMBEDDING_CACHE_DIR, encoder_id(MODEL_NAME, ENCODER_BACKEND), variant='chunked')
+    student_store = EmbeddingStore(EMBEDDING_CACHE_DIR, encoder_id(MODEL_NAME, ENCODER_BACKEND))
+    missing_courses = course_store.missing(course_corpus)
+    missing_students = student_store.missing(student_corpus)
+    hits = course_store.hits + student_store.hits
+    misses = course_store.misses + student_store.misses
+    print(f"Embedding cache: {hits} texts cached, {misses} new or changed (hit rate {hits / max(hits + misses, 1):.1%}).")
+
+    if missing_courses or missing_students:
+        # Load a powerful, pre-trained Sentence Transformer model.
+        # This will be downloaded and cached automatically the first time.
+        print(f"Loading Sentence-BERT model ({MODEL_NAME}, {ENCODER_BACKEND} backend)...")
+        model = load_sentence_model(MODEL_NAME, ENCODER_BACKEND)
+
+        # Long descriptions are split into chunks that fit the model's sequence length (nothing is
+        # truncated) and mean-pooled back; all chunks are encoded in batches of similar token length.
+        print(f"Encoding {len(missing_courses)} course texts... (This may take a few minutes on a fresh cache)")
+        start = time.perf_counter()
+        embeddings, stats = encode_chunked(model, missing_courses)
+        course_store.add(missing_courses, embeddings)
+        print(f"  {stats['chunks']} chunks ({stats['chunked_texts']} long descriptions split) encoded in {time.perf_counter() - start:.1f}s.")
+
+        print(f"Encoding {len(missing_students)} student preference texts...")
+        student_store.add(missing_students, encode_length_sorted(model, missing_students))
+
+    # Create the course-feature and student-feature matrices
+    course_embeddings = course_store.get_many(course_corpus)
+    print(f"Course embedding matrix created with shape: {course_embeddings.shape}")
+    student_embeddings = student_store.get_many(student_corpus)
     print(f"Student embedding matrix created with shape: {student_embeddings.shape}")
-    
-    # Save the new artifacts to the models folder.
-    model_dir = 'models/content_based'
-    if not os.path.exists(model_dir):
-        os.makedirs(model_dir)
 
-    # We save the results (the embeddings), not the model itself.
-    joblib.dump(course_embeddings, f'{model_dir}/course_embeddings.joblib')
-    joblib.dump(student_embeddings, f'{model_dir}/student_embeddings.joblib')
+    for store in (course_store, student_store):
+        pruned = store.save()
+        print(f"Embedding cache saved to '{store.path}' ({len(store) - pruned} entries, {pruned} orphans pruned).")
     
-    # The ID mappings are still essential
-    joblib.dump(courses_df['course_id'].tolist(), f'{model_dir}/course_ids.joblib')# Use 'code' or 'id' from your Excel
-    joblib.dump(preferences_df['user_id'].astype(str).tolist(), f'{model_dir}/user_ids.joblib')
+    # Save the new artifacts to the models folder as a memory-mappable bundle (.npy arrays + manifest).
+    # We save the results (the embeddings), not the model itself. The bundle also holds the ID
+    # mappings and an IVF index that lets the API retrieve candidates without scanning every course.
+    model_dir = 'models/content_based'
+    print("Writing content bundle (normalized embeddings, ID tables, IVF index)...")
+    manifest = write_content_bundle(
+        model_dir,
+        courses_df['course_id'].tolist(),  # Use 'code' or 'id' from your Excel
+        course_embeddings,
+        preferences_df['user_id'].astype(str).tolist(),
+        student_embeddings,
+        model_name=MODEL_NAME,
+        encoder_backend=ENCODER_BACKEND,
+    )
     
-    print(f"\nSemantic embeddings and ID mappings saved to '{model_dir}' directory.")
+    print(f"\nSemantic embeddings and ID mappings saved to '{model_dir}' directory (version {manifest['version']}).")
 
 if __name__ == "__main__":
     courses_df = process_course_content()
@@ -1,10 +1,11 @@
 # Filename: 02_preprocess_course_text.py
+import os
 import pandas as pd
 import nltk
-import re
 from nltk.corpus import stopwords
 from nltk.stem import WordNetLemmatizer
 from nltk.tokenize import word_tokenize
+from text_normalization import normalize_corpus
 
 # --- Download NLTK resources (run once) ---
 try:
@@ -25,20 +26,11 @@ except LookupError:
     nltk.download('averaged_perceptron_tagger')
 
 
-# --- Text Preprocessing Function ---
-def preprocess_text(text):
-    if pd.isna(text): # Handle missing descriptions or tags
-        return ""
-    text = str(text).lower()  # Lowercase
-    text = re.sub(r'[^\w\s]', '', text)  # Remove punctuation
-    tokens = word_tokenize(text)  # Tokenize
-    # Remove stopwords
-    stop_words_set = set(stopwords.words('english'))
-    tokens = [word for word in tokens if word not in stop_words_set and word.isalpha() and len(word) > 2] # Also remove non-alpha and short words
-    # Lemmatize
-    lemmatizer = WordNetLemmatizer()
-    tokens = [lemmatizer.lemmatize(word) for word in tokens]
-    return " ".join(tokens)
+# --- Text Preprocessing ---
+# Shared normalizer; this pipeline also drops tokens of two characters or fewer
+MIN_TOKEN_LENGTH = 3
+# Worker processes used for text normalization (1 = normalize in this process)
+NORMALIZE_JOBS = int(os.environ.get('RECOMMENDER_NORMALIZE_JOBS', os.cpu_count() or 1))
 
 # --- Main Preprocessing Logic ---
 def preprocess_course_content():
@@ -58,7 +50,7 @@ def preprocess_course_content():
     # Fill NaN with empty string to avoid errors with string operations
     courses_df['content_full'] = courses_df['description'].fillna('') + " " + courses_df['tags_str'].fillna('')
 
-    courses_df['processed_content'] = courses_df['content_full'].apply(preprocess_text)
+    courses_df['processed_content'] = normalize_corpus(courses_df['content_full'], MIN_TOKEN_LENGTH, NORMALIZE_JOBS)
 
     # Save the processed data
     courses_df[['id', 'course_code', 'name', 'processed_content']].to_csv('data/courses_processed_content.csv', index=False)
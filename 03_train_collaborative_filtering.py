@@ -1,12 +1,37 @@
 # Filename: 03_train_collaborative_filtering.py
-import pandas as pd
+#
+#   python 03_train_collaborative_filtering.py                            # Surprise SVD (default)
+#   python 03_train_collaborative_filtering.py --trainer als --threads 4  # NumPy ALS over a sparse matrix
+#   python 03_train_collaborative_filtering.py --search random --jobs 8   # Tune, then train the best config
+#   python 03_train_collaborative_filtering.py --skip-cv                  # Fast rebuild, no evaluation
+import argparse
 import os
-import joblib
-from surprise import Dataset, Reader, SVD
-from surprise.model_selection import train_test_split, cross_validate
+import time
+import pandas as pd
+from surprise import Dataset, Reader
+from artifacts import write_als_bundle, write_cf_bundle
+from cf_search import DEFAULT_PARAMS, SEARCH_SPACES, best_params, make_model, sample_configs, search_cf
+
+# Where --search writes its ranked results table
+SEARCH_RESULTS_PATH = 'models/cf_search_results.csv'
+
+def evaluate_configs(trainer, interactions_df, search, n_configs, n_jobs, n_threads):
+    """Cross-validates the default config (or the searched ones) and returns the params to train with."""
+    configs = [DEFAULT_PARAMS[trainer]] if search == 'none' else sample_configs(SEARCH_SPACES[trainer], search, n_configs)
+    print(f"\n--- 2. Evaluating {len(configs)} {trainer} config(s) with 5-fold Cross-Validation ({n_jobs} process(es)) ---")
+    start = time.perf_counter()
+    results = search_cf(trainer, interactions_df, configs, n_jobs=n_jobs, n_threads=n_threads,
+                        # A single config is always evaluated on every fold
+                        keep_fraction=1 / 3 if len(configs) > 1 else 1)
+    print(results.head(10).to_string(index=False, float_format=lambda v: f"{v:.4f}"))
+    print(f"Evaluation took {time.perf_counter() - start:.2f}s.")
+    if search != 'none':
+        results.to_csv(SEARCH_RESULTS_PATH, index=False)
+        print(f"Ranked results of all {len(configs)} configs saved to: {SEARCH_RESULTS_PATH}")
+    return best_params(results, configs)
 
-def train_cf_model():
-    """Trains and saves a Collaborative Filtering model using the Surprise library."""
+def train_cf_model(trainer='surprise', n_threads=1, search='none', n_configs=20, n_jobs=1, skip_cv=False):
+    """Trains and saves a Collaborative Filtering model using the Surprise library (or the ALS trainer)."""
     print("--- 1. Loading Student Interaction Data ---")
     try:
         interactions_df = pd.read_csv('data/student_interactions_cleaned.csv', dtype={'user_id': str})
@@ -18,42 +43,45 @@ def train_cf_model():
         print("ERROR: Interaction data is empty. Cannot train model.")
         return
 
-    # The Surprise Reader needs to know the rating scale.
-    # Our mapping is from 1.0 to 10.0.
-    reader = Reader(rating_scale=(1, 10))
-
-    # Load the data from the pandas dataframe
-    data = Dataset.load_from_df(interactions_df[['user_id', 'course_id', 'rating']], reader)
-    print("Data loaded successfully into Surprise dataset format.")
-
     # --- Optional: Evaluate the model (good practice) ---
-    # We can use cross-validation to get a sense of the model's performance.
-    # SVD is a powerful matrix factorization algorithm.
-    print("\n--- 2. Evaluating SVD Model with Cross-Validation ---")
-    algo = SVD(n_factors=100, n_epochs=20, lr_all=0.005, reg_all=0.04, random_state=42)
-    
-    # Run 5-fold cross-validation and print results (RMSE, MAE)
-    # This gives an estimate of how well the model predicts ratings.
-    # Lower RMSE/MAE is better.
-    cv_results = cross_validate(algo, data, measures=['RMSE', 'MAE'], cv=5, verbose=True)
-    
+    # Cross-validation gives a sense of how well the model predicts ratings (lower RMSE/MAE is better);
+    # with --search it picks the hyperparameters too. --skip-cv goes straight to the final fit.
+    params = DEFAULT_PARAMS[trainer]
+    if skip_cv:
+        if search != 'none':
+            print("WARNING: --skip-cv ignores --search; training with the default config.")
+        print("\n--- 2. Skipping Cross-Validation ---")
+    else:
+        params = evaluate_configs(trainer, interactions_df, search, n_configs, n_jobs, n_threads)
+
     # --- 3. Training the Full Model and Saving It ---
-    print("\n--- 3. Training on the Full Dataset ---")
-    # We build a training set from the entire dataset to train the final model
-    trainset = data.build_full_trainset()
-    algo.fit(trainset)
-    print("Model training complete.")
+    print(f"\n--- 3. Training on the Full Dataset with {params} ---")
+    start = time.perf_counter()
+    model = make_model(trainer, params, n_threads)
+    if trainer == 'als':
+        model.fit(interactions_df['user_id'], interactions_df['course_id'], interactions_df['rating'])
+    else:
+        # The Surprise Reader needs to know the rating scale. Our mapping is from 1.0 to 10.0.
+        data = Dataset.load_from_df(interactions_df[['user_id', 'course_id', 'rating']], Reader(rating_scale=(1, 10)))
+        model.fit(data.build_full_trainset())
+    print(f"Model training complete ({len(interactions_df)} ratings in {time.perf_counter() - start:.2f}s).")
 
-    # Save the trained model
+    # Save the factors, biases and ID tables as a memory-mappable bundle; the API never needs the algo object
     model_dir = 'models/collaborative_filtering'
-    if not os.path.exists(model_dir):
-        os.makedirs(model_dir)
-
-    model_path = os.path.join(model_dir, 'cf_svd_model.joblib')
-    joblib.dump(algo, model_path)
+    write = write_als_bundle if trainer == 'als' else write_cf_bundle
+    manifest = write(model_dir, model, hyperparameters=params)
 
-    print(f"\nCollaborative Filtering model saved to: {model_path}")
+    print(f"\nCollaborative Filtering model saved to: {model_dir} (version {manifest['version']})")
     print("\n--- Collaborative Filtering Training Finished ---")
 
 if __name__ == "__main__":
-    train_cf_model()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Train the collaborative-filtering model and write its bundle.")
+    parser.add_argument('--trainer', choices=['surprise', 'als'], default='surprise')
+    parser.add_argument('--threads', type=int, default=1, help="Threads for the ALS solves.")
+    parser.add_argument('--search', choices=['none', 'grid', 'random'], default='none',
+                        help="Tune hyperparameters over the trainer's search space before the final fit.")
+    parser.add_argument('--n-configs', type=int, default=20, help="Configs sampled by --search random.")
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help="Processes for the CV fits.")
+    parser.add_argument('--skip-cv', action='store_true', help="Train the final model without cross-validation.")
+    args = parser.parse_args()
+    train_cf_model(args.trainer, args.threads, args.search, args.n_configs, args.jobs, args.skip_cv)
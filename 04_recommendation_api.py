@@ -1,56 +1,395 @@
 # Filename: 04_recommendation_api.py (Corrected with Absolute Paths)
 import pandas as pd
-import joblib
-from fastapi import FastAPI, HTTPException
+import numpy as np
+from fastapi import FastAPI, Header, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse
 from pydantic import BaseModel
+from typing import Literal
 import os
-from sklearn.metrics.pairwise import cosine_similarity
-from contextlib import asynccontextmanager
-from sentence_transformers import SentenceTransformer
+import time
+import asyncio
+from contextlib import asynccontextmanager, contextmanager, nullcontext
+from dataclasses import dataclass
+
+from scoring import CFFactors, HybridRecommender, RatingHistory, TakenCourseIndex
+from ann_index import IVFFlatIndex
+from quantized_embeddings import QuantizedEmbeddings
+from lexical_index import LexicalIndex
+from artifacts import load_bundle, read_manifest
+from encoder import (
+    EmbeddingCache, EncoderQueueFull, EncoderStopped, MicroBatchEncoder, TextEncoder, encoder_id, load_sentence_model,
+    normalize_text,
+)
+from result_cache import ResultCache
+from metrics import RecommenderMetrics
 
 # Get the absolute path to the directory where this script is located.
 # This makes our file paths reliable, no matter where the script is run from.
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_DIR = os.path.join(BASE_DIR, 'models')
+CONTENT_MODEL_DIR = os.path.join(MODEL_DIR, 'content_based')
+CF_MODEL_DIR = os.path.join(MODEL_DIR, 'collaborative_filtering')
+LEXICAL_MODEL_DIR = os.path.join(MODEL_DIR, 'lexical')
+DATA_DIR = os.path.join(BASE_DIR, 'data')
+
+# Hash every artifact against its manifest checksum at startup (reads all pages; off by default)
+VERIFY_ARTIFACTS = os.environ.get('RECOMMENDER_VERIFY_ARTIFACTS', '0') == '1'
+
+# Candidate retrieval for the content stage: 'exact' scans every course, 'ann' searches the IVF index
+# built by 02_preprocess_and_vectorize_bert.py and re-ranks a pool of the closest courses.
+RETRIEVAL_MODE = os.environ.get('RECOMMENDER_RETRIEVAL', 'exact')
+ANN_POOL_SIZE = int(os.environ.get('RECOMMENDER_ANN_POOL_SIZE', 200))
+ANN_N_PROBE = int(os.environ.get('RECOMMENDER_ANN_N_PROBE', 8))
+
+# Precision of the full-catalog content scan: 'float32', or 'float16'/'int8' to scan a smaller copy
+# of the course matrix and re-score only the shortlisted courses from the (memory-mapped) float32 one.
+EMBEDDING_PRECISION = os.environ.get('RECOMMENDER_EMBEDDING_PRECISION', 'float32')
+
+# Lexical (TF-IDF) content scores from the bundle 02_preprocess_and_vectorize.py writes, selectable per
+# request with `retrieval`: 'semantic' (default), 'lexical' (no sentence encoder involved) or 'blend',
+# whose content score is (1 - LEXICAL_BLEND_WEIGHT) * semantic + LEXICAL_BLEND_WEIGHT * lexical.
+LEXICAL_BLEND_WEIGHT = float(os.environ.get('RECOMMENDER_LEXICAL_BLEND_WEIGHT', 0.5))
+
+# Sentence encoder used for free-text interests, and how many encoded texts to keep in memory.
+# Importing sentence_transformers pulls in torch, so by default the encoder loads in the background
+# after the server starts serving: 'eager' loads it before serving, 'lazy' on the first request needing it.
+ENCODER_MODEL_NAME = 'all-MiniLM-L6-v2'
+# 'torch' (fp32) or 'torch-int8' (dynamically quantized, faster on CPU; cosine ~0.99+ with fp32)
+ENCODER_BACKEND = os.environ.get('RECOMMENDER_ENCODER_BACKEND', 'torch')
+ENCODER_LOADING_MODES = ('eager', 'background', 'lazy')
+ENCODER_LOADING = os.environ.get('RECOMMENDER_ENCODER_LOADING', 'background')
+if ENCODER_LOADING not in ENCODER_LOADING_MODES:
+    raise ValueError(f"Unknown encoder loading '{ENCODER_LOADING}' (RECOMMENDER_ENCODER_LOADING); "
+                     f"expected one of {ENCODER_LOADING_MODES}.")
+EMBEDDING_CACHE_SIZE = int(os.environ.get('RECOMMENDER_EMBEDDING_CACHE_SIZE', 10000))
+# After a failed encoder load, the next request needing it retries once this many seconds have passed
+ENCODER_RETRY_SECONDS = float(os.environ.get('RECOMMENDER_ENCODER_RETRY_SECONDS', 30))
+
+# Micro-batching of online encodes: texts from concurrent requests are encoded together in one batch
+# of up to ENCODE_MAX_BATCH texts, waiting at most ENCODE_MAX_WAIT_MS for the batch to fill up.
+ENCODE_BATCHING = os.environ.get('RECOMMENDER_ENCODE_BATCHING', '1') == '1'
+ENCODE_MAX_BATCH = int(os.environ.get('RECOMMENDER_ENCODE_MAX_BATCH', 32))
+ENCODE_MAX_WAIT_MS = float(os.environ.get('RECOMMENDER_ENCODE_MAX_WAIT_MS', 5))
+ENCODE_QUEUE_DEPTH = int(os.environ.get('RECOMMENDER_ENCODE_QUEUE_DEPTH', 1024))
+
+# Ratings recorded through /users/{user_id}/interactions fold the user into the CF model on their next
+# request: their factors are re-solved against the fixed course factors with this ridge per rating.
+FOLD_IN_REG = float(os.environ.get('RECOMMENDER_FOLD_IN_REG', 0.5))
+# Folded-in factors are cached for this many recently scored users (LRU); others are re-solved (~0.5 ms)
+FOLD_IN_CACHE_SIZE = int(os.environ.get('RECOMMENDER_FOLD_IN_CACHE_SIZE', 10000))
+
+# Cache of final ranked lists, keyed by user, top_n, interests and artifact versions (0 entries disables it)
+RESULT_CACHE_SIZE = int(os.environ.get('RECOMMENDER_RESULT_CACHE_SIZE', 10000))
+RESULT_CACHE_TTL = float(os.environ.get('RECOMMENDER_RESULT_CACHE_TTL', 300))
+
+# Hot reload of model artifacts: POST /admin/reload (guarded by ADMIN_TOKEN when set), and optionally
+# a watcher polling the CURRENT version of each bundle every RELOAD_POLL_SECONDS (0 = no watcher).
+ADMIN_TOKEN = os.environ.get('RECOMMENDER_ADMIN_TOKEN')
+RELOAD_POLL_SECONDS = float(os.environ.get('RECOMMENDER_RELOAD_POLL_SECONDS', 0))
+
+# Per-stage latency histograms and counters of the hot path, served in Prometheus format at /metrics.
+# '0' turns off both the instrumentation and the endpoint.
+METRICS_ENABLED = os.environ.get('RECOMMENDER_METRICS', '1') == '1'
+
+@contextmanager
+def _timed_phase(name):
+    """Prints how long a startup phase took."""
+    start = time.perf_counter()
+    yield
+    print(f"  - {name}: {time.perf_counter() - start:.3f}s")
+
+@dataclass(frozen=True)
+class ModelBundle:
+    """
+    One consistent, immutable set of scoring artifacts. Requests read `app.state.bundle` once and use
+    that bundle throughout, so a reload that swaps the reference never mixes two artifact builds.
+    """
+    recommender: HybridRecommender
+    course_id_to_idx: dict
+    versions: dict
+
+def _validate_artifacts(content, content_manifest, cf, cf_manifest, check_values):
+    """Raises ValueError if the bundles are inconsistent with each other or with the online encoder."""
+    n_courses, n_students = len(content['course_ids']), len(content['user_ids'])
+    dim = content_manifest['dim']
+    if content['course_embeddings'].shape != (n_courses, dim):
+        raise ValueError(f"course_embeddings is {content['course_embeddings'].shape}, expected {(n_courses, dim)}.")
+    if content['student_embeddings'].shape != (n_students, dim):
+        raise ValueError(f"student_embeddings is {content['student_embeddings'].shape}, expected {(n_students, dim)}.")
+    if len(np.unique(content['course_ids'])) != n_courses:
+        raise ValueError("course_ids contains duplicates.")
+    if content_manifest['model_name'] != ENCODER_MODEL_NAME:
+        raise ValueError(f"Embeddings were built with '{content_manifest['model_name']}', the API encodes with '{ENCODER_MODEL_NAME}'.")
+    if 'ann_list_rows' in content and len(content['ann_list_rows']) and content['ann_list_rows'].max() >= n_courses:
+        raise ValueError("The ANN index refers to courses outside the catalog.")
+
+    n_factors = cf_manifest['n_factors']
+    if cf['pu'].shape != (len(cf['user_ids']), n_factors) or cf['qi'].shape != (len(cf['item_ids']), n_factors):
+        raise ValueError(f"CF factors {cf['pu'].shape}/{cf['qi'].shape} do not match the id tables and {n_factors} factors.")
+    if cf['bu'].shape != (len(cf['user_ids']),) or cf['bi'].shape != (len(cf['item_ids']),):
+        raise ValueError("CF biases do not match the id tables.")
+
+    if check_values:
+        # Reads every page, which also pre-faults them before the bundle takes traffic
+        for name, array in [('course_embeddings', content['course_embeddings']),
+                            ('student_embeddings', content['student_embeddings']),
+                            ('pu', cf['pu']), ('qi', cf['qi']), ('bu', cf['bu']), ('bi', cf['bi'])]:
+            if not np.isfinite(array).all():
+                raise ValueError(f"{name} contains NaN or infinite values.")
+
+def _load_model_bundle(check_values=False):
+    """
+    Opens the content and CF artifact bundles (memory-mapped, so workers share pages) and the
+    interaction history, validates them and returns a ModelBundle. No torch involved.
+    """
+    with _timed_phase("content bundle"):
+        content, content_manifest = load_bundle(CONTENT_MODEL_DIR, verify_checksums=VERIFY_ARTIFACTS)
+    with _timed_phase("CF bundle"):
+        cf, cf_manifest = load_bundle(CF_MODEL_DIR, verify_checksums=VERIFY_ARTIFACTS)
+    with _timed_phase("validation"):
+        _validate_artifacts(content, content_manifest, cf, cf_manifest, check_values)
+
+    # The bundle already has one L2-normalized row per course, so it is served as-is
+    all_course_ids = content['course_ids'].tolist()
+    course_id_to_idx = {course_id: i for i, course_id in enumerate(all_course_ids)}
+    with _timed_phase("CF factors"):
+        cf_factors = CFFactors.from_bundle(cf, cf_manifest, all_course_ids)
+
+    with _timed_phase("taken-course index"):
+        # Compile the interaction history into a per-user index of taken courses; the frame itself is dropped
+        interactions_df = pd.read_csv(os.path.join(DATA_DIR, 'student_interactions_cleaned.csv'), dtype={'user_id': str})
+        course_idx = interactions_df['course_id'].map(course_id_to_idx).fillna(-1).astype('int64')
+        taken_courses = TakenCourseIndex.from_pairs(
+            interactions_df['user_id'].to_numpy(), course_idx.to_numpy(), len(all_course_ids)
+        )
+        # Each user's ratings by course id, which fold-in re-solves their CF factors from
+        cf_factors.enable_fold_in(RatingHistory.from_pairs(
+            interactions_df['user_id'].to_numpy(), interactions_df['course_id'].to_numpy(), interactions_df['rating'].to_numpy()
+        ), FOLD_IN_REG, FOLD_IN_CACHE_SIZE)
+
+    ann_index = None
+    if RETRIEVAL_MODE == 'ann':
+        if 'ann_centroids' not in content:
+            print("WARNING: the content bundle has no ANN index. Falling back to exact retrieval.")
+        else:
+            ann_index = IVFFlatIndex.from_arrays(content, len(all_course_ids))
+            print(f"ANN index loaded: {ann_index.n_lists} lists, pool size {ANN_POOL_SIZE}, n_probe {ANN_N_PROBE}.")
+
+    scan_embeddings = None
+    if EMBEDDING_PRECISION != 'float32':
+        if f'course_embeddings_{EMBEDDING_PRECISION}' in content:
+            scan_embeddings = QuantizedEmbeddings.from_arrays(content, EMBEDDING_PRECISION)
+        else:
+            print(f"WARNING: the content bundle has no {EMBEDDING_PRECISION} course matrix. Quantizing it at startup.")
+            scan_embeddings = QuantizedEmbeddings.from_float(content['course_embeddings'], EMBEDDING_PRECISION)
+        if scan_embeddings.codes.shape != content['course_embeddings'].shape:
+            raise ValueError(f"The {EMBEDDING_PRECISION} course matrix is {scan_embeddings.codes.shape}, "
+                             f"expected {content['course_embeddings'].shape}.")
+        print(f"Scanning {EMBEDDING_PRECISION} course embeddings ({scan_embeddings.nbytes / 2**20:.2f} MiB "
+              f"instead of {content['course_embeddings'].nbytes / 2**20:.2f} MiB), re-scoring the shortlist in float32.")
+
+    lexical_index, lexical_version = None, None
+    if os.path.exists(LEXICAL_MODEL_DIR):
+        with _timed_phase("lexical bundle"):
+            lexical, lexical_manifest = load_bundle(LEXICAL_MODEL_DIR, verify_checksums=VERIFY_ARTIFACTS)
+            lexical_index = LexicalIndex.from_bundle(lexical, lexical_manifest, all_course_ids)
+        lexical_version = lexical_manifest['version']
+        print(f"Lexical index loaded: {len(lexical['terms'])} terms, "
+              f"{lexical_index.n_covered_courses}/{len(all_course_ids)} catalog courses covered.")
+    else:
+        print("No lexical bundle found; 'lexical' and 'blend' retrieval are disabled.")
+
+    recommender = HybridRecommender(
+        course_ids=all_course_ids,
+        course_embeddings=content['course_embeddings'],
+        user_ids=content['user_ids'].tolist(),
+        student_embeddings=content['student_embeddings'],
+        cf_factors=cf_factors,
+        taken_courses=taken_courses,
+        ann_index=ann_index,
+        ann_pool_size=ANN_POOL_SIZE,
+        ann_n_probe=ANN_N_PROBE,
+        scan_embeddings=scan_embeddings,
+        lexical_index=lexical_index,
+        metrics=app.state.metrics,
+    )
+    versions = {'content': content_manifest['version'], 'cf': cf_manifest['version'], 'lexical': lexical_version}
+    print(f"Artifact versions: content {versions['content']}, CF {versions['cf']}, lexical {versions['lexical']}.")
+    return ModelBundle(recommender=recommender, course_id_to_idx=course_id_to_idx, versions=versions)
+
+def _warm_up(bundle):
+    """Runs a few synthetic requests through a new bundle and checks that they produce sane rankings."""
+    recommender = bundle.recommender
+    user_ids = list(recommender.user_id_to_idx)[:3] + ['__warmup_unknown_user__']
+    for recs in recommender.recommend(user_ids, [10] * len(user_ids)):
+        if len(recommender.course_ids) and not recs:
+            raise ValueError("Warm-up request returned no recommendations.")
+        if not all(np.isfinite(score) for _, score in recs):
+            raise ValueError("Warm-up request returned non-finite scores.")
+
+def _apply_recorded_interactions(bundle):
+    """
+    Carries interactions recorded through the API over to a freshly loaded bundle. Those a retrained
+    CF model already covers are dropped for good: the bundle's CF version differs from the one they
+    were recorded against, it knows the user, and the history it was loaded with has the course (with
+    the same rating, for rated ones).
+    """
+    cf_factors = bundle.recommender.cf_factors
+    kept = {}
+    for user_id, entries in app.state.recorded_interactions.items():
+        if cf_factors.knows_user(user_id):
+            loaded = cf_factors.rating_history.ratings_for(user_id)
+            entries = [(cf_version, i) for cf_version, i in entries
+                       if cf_version == bundle.versions['cf'] or i.course_id not in loaded
+                       or (i.rating is not None and loaded[i.course_id] != i.rating)]
+        if entries:
+            kept[user_id] = entries
+            _add_interactions(bundle, user_id, [i for _, i in entries])
+    app.state.recorded_interactions = kept
+
+def _add_interactions(bundle, user_id, interactions):
+    """
+    Marks the courses as taken and records their ratings, so the user's CF factors are folded in
+    again on their next request. Returns the user's taken catalog indices.
+    """
+    course_idx = [bundle.course_id_to_idx[i.course_id] for i in interactions if i.course_id in bundle.course_id_to_idx]
+    ratings = {i.course_id: i.rating for i in interactions if i.rating is not None}
+    if ratings:
+        bundle.recommender.cf_factors.rating_history.add_ratings(user_id, ratings)
+    return bundle.recommender.taken_courses.add_courses(user_id, course_idx)
+
+def _install_bundle(bundle):
+    """Makes `bundle` the one new requests use. Runs on the event loop, so the swap is atomic for requests."""
+    _apply_recorded_interactions(bundle)
+    previous, app.state.bundle = app.state.bundle, bundle
+    if previous is not None:
+        app.state.result_cache.clear()
+    app.state.readiness['recommender'] = 'ready'
+
+async def _reload_model_bundle():
+    """
+    Loads, validates and warms a new bundle in a worker thread while the current one keeps serving,
+    then swaps the reference. In-flight requests finish on the bundle they started with.
+    """
+    async with app.state.reload_lock:
+        start = time.perf_counter()
+        print("--- Reloading model artifacts... ---")
+        bundle = await asyncio.to_thread(_load_model_bundle, True)
+        with _timed_phase("warm-up"):
+            await asyncio.to_thread(_warm_up, bundle)
+        _install_bundle(bundle)
+        print(f"--- Now serving artifacts {bundle.versions} (reload took {time.perf_counter() - start:.3f}s). ---")
+        return bundle
+
+def _published_versions():
+    """The live version of every artifact bundle on disk (None for a missing optional bundle)."""
+    return {
+        'content': read_manifest(CONTENT_MODEL_DIR)['version'],
+        'cf': read_manifest(CF_MODEL_DIR)['version'],
+        'lexical': read_manifest(LEXICAL_MODEL_DIR)['version'] if os.path.exists(LEXICAL_MODEL_DIR) else None,
+    }
+
+async def _watch_model_dirs():
+    """Polls the live version of each bundle and reloads when a new build is published."""
+    failed_versions = None
+    while True:
+        await asyncio.sleep(RELOAD_POLL_SECONDS)
+        try:
+            versions = _published_versions()
+        except Exception as e:
+            print(f"WARNING: could not read the published artifact versions: {e}")
+            continue
+        current = app.state.bundle.versions if app.state.bundle is not None else None
+        if versions == current or versions == failed_versions:
+            continue
+        try:
+            await _reload_model_bundle()
+        except Exception as e:
+            # Keep serving the current bundle and do not retry this build until a newer one is published
+            print(f"WARNING: reloading model artifacts failed, keeping the current ones: {e}")
+            failed_versions = versions
+
+def _load_text_encoder():
+    """Imports sentence_transformers (and with it torch) and loads the encoder. Slow; runs in a worker thread."""
+    print("Loading Sentence-BERT model (this may take a moment)...")
+    with _timed_phase("import sentence_transformers"):
+        import sentence_transformers  # noqa: F401
+    with _timed_phase(f"load {ENCODER_MODEL_NAME} ({ENCODER_BACKEND})"):
+        st_model = load_sentence_model(ENCODER_MODEL_NAME, ENCODER_BACKEND)
+
+    batcher = None
+    if ENCODE_BATCHING:
+        batcher = MicroBatchEncoder(st_model, ENCODE_MAX_BATCH, ENCODE_MAX_WAIT_MS, ENCODE_QUEUE_DEPTH)
+        batcher.start()
+    print("Sentence-BERT model loaded.")
+    return TextEncoder(st_model, encoder_id(ENCODER_MODEL_NAME, ENCODER_BACKEND), EmbeddingCache(EMBEDDING_CACHE_SIZE), batcher)
+
+async def _load_text_encoder_in_background():
+    app.state.readiness['encoder'] = 'loading'
+    try:
+        app.state.text_encoder = await asyncio.to_thread(_load_text_encoder)
+    except Exception as e:
+        print(f"ERROR loading the Sentence-BERT model (retried after {ENCODER_RETRY_SECONDS:g}s): {e}")
+        app.state.readiness['encoder'] = 'failed'
+        app.state.encoder_failed_at = time.monotonic()
+        return None
+    app.state.readiness['encoder'] = 'ready'
+    return app.state.text_encoder
+
+async def _get_text_encoder():
+    """
+    Returns the text encoder, starting its load if needed; concurrent callers share the one load.
+    A failed load is started again once ENCODER_RETRY_SECONDS have passed since it failed.
+    """
+    failed_at = app.state.encoder_failed_at
+    if failed_at is not None and time.monotonic() - failed_at >= ENCODER_RETRY_SECONDS:
+        app.state.encoder_failed_at = app.state.encoder_task = None
+    if app.state.encoder_task is None:
+        app.state.encoder_task = asyncio.create_task(_load_text_encoder_in_background())
+    return await asyncio.shield(app.state.encoder_task)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    """Load all model artifacts once on API startup using the new lifespan manager."""
-    print("--- Loading models and data artifacts for SEMANTIC model... ---")
-    
-    # Construct absolute paths to our models and data folders
-    MODEL_DIR = os.path.join(BASE_DIR, 'models')
-    CONTENT_MODEL_DIR = os.path.join(MODEL_DIR, 'content_based')
-    CF_MODEL_DIR = os.path.join(MODEL_DIR, 'collaborative_filtering')
-    DATA_DIR = os.path.join(BASE_DIR, 'data')
+    """
+    Loads the cheap scoring artifacts before accepting traffic, then the sentence encoder according
+    to ENCODER_LOADING. Each component's state is tracked in `app.state.readiness` for /readyz.
+    """
+    app.state.readiness = {'recommender': 'loading', 'encoder': 'not_loaded'}
+    app.state.bundle = None
+    app.state.reload_lock = asyncio.Lock()
+    app.state.recorded_interactions = {}
+    app.state.text_encoder = None
+    app.state.encoder_task = None
+    app.state.encoder_failed_at = None
+    app.state.result_cache = ResultCache(RESULT_CACHE_SIZE, RESULT_CACHE_TTL)
+    app.state.metrics = None
+    if METRICS_ENABLED:
+        app.state.metrics = RecommenderMetrics()
+        app.state.metrics.registry.add_collector(_collect_state_metrics)
 
+    print("--- Loading models and data artifacts for SEMANTIC model... ---")
+    startup = time.perf_counter()
     try:
-        # Load the Sentence Transformer neural network model itself
-        print("Loading Sentence-BERT model (this may take a moment)...")
-        app.state.st_model = SentenceTransformer('all-MiniLM-L6-v2')
-        print("Sentence-BERT model loaded.")
-
-        # Load all our artifacts using the new absolute paths
-        app.state.course_embeddings = joblib.load(os.path.join(CONTENT_MODEL_DIR, 'course_embeddings.joblib'))
-        app.state.student_embeddings = joblib.load(os.path.join(CONTENT_MODEL_DIR, 'student_embeddings.joblib'))
-        course_ids = joblib.load(os.path.join(CONTENT_MODEL_DIR, 'course_ids.joblib'))
-        user_ids_content = joblib.load(os.path.join(CONTENT_MODEL_DIR, 'user_ids.joblib'))
-        app.state.cf_model = joblib.load(os.path.join(CF_MODEL_DIR, 'cf_svd_model.joblib'))
-        app.state.interactions_df = pd.read_csv(os.path.join(DATA_DIR, 'student_interactions_cleaned.csv'), dtype={'user_id': str})
-        
-        # Helper mappings for quick lookups
-        app.state.course_id_to_idx = {course_id: i for i, course_id in enumerate(course_ids)}
-        app.state.user_id_to_idx = {str(user_id): i for i, user_id in enumerate(user_ids_content)}
-        app.state.all_course_ids = course_ids
-        
-        app.state.models_loaded = True
-        print("--- All models and data artifacts loaded successfully! ---")
-
+        _install_bundle(_load_model_bundle())
+        print(f"--- Scoring artifacts loaded in {time.perf_counter() - startup:.3f}s; serving /recommendations. ---")
     except Exception as e:
         print(f"FATAL ERROR during model loading: {e}")
-        app.state.models_loaded = False
+        app.state.readiness['recommender'] = 'failed'
+
+    if ENCODER_LOADING == 'eager':
+        await _get_text_encoder()
+    elif ENCODER_LOADING == 'background':
+        app.state.encoder_task = asyncio.create_task(_load_text_encoder_in_background())
+    # 'lazy': loaded by the first request that needs it
+
+    watcher = asyncio.create_task(_watch_model_dirs()) if RELOAD_POLL_SECONDS > 0 else None
     
     yield
     print("--- Server is shutting down. ---")
+    if watcher is not None:
+        watcher.cancel()
+    if app.state.text_encoder is not None and app.state.text_encoder.batcher is not None:
+        app.state.text_encoder.batcher.stop()
 
 app = FastAPI(
     title="Course Recommendation API (v2 - Semantic)",
@@ -60,6 +399,13 @@ app = FastAPI(
 class RecommendationRequest(BaseModel):
     user_id: str
     top_n: int = 10
+    # Free-text interests; when given, they are encoded on the fly and used as the student profile
+    # instead of the pre-computed one, so students without a profile still get content scores.
+    interests: str | None = None
+    # Content signal: sentence embeddings, TF-IDF term overlap, or a blend of both
+    retrieval: Literal['semantic', 'lexical', 'blend'] = 'semantic'
+    # Set to false to bypass the result cache (e.g. when debugging scores)
+    use_cache: bool = True
 
 class CourseRecommendation(BaseModel):
     course_id: str
@@ -68,49 +414,233 @@ class CourseRecommendation(BaseModel):
 class RecommendationResponse(BaseModel):
     recommendations: list[CourseRecommendation]
 
+class BatchRecommendationRequest(BaseModel):
+    users: list[RecommendationRequest]
+
+class UserRecommendations(BaseModel):
+    user_id: str
+    recommendations: list[CourseRecommendation]
+
+class BatchRecommendationResponse(BaseModel):
+    results: list[UserRecommendations]
+
+class Interaction(BaseModel):
+    course_id: str
+    rating: float | None = None  # On the model's rating scale; unrated courses are only excluded, not folded in
+
+class InteractionUpdate(BaseModel):
+    interactions: list[Interaction]
+
+def _stage(name):
+    """Times a stage of the request path into the stage histogram (a no-op with metrics off)."""
+    return app.state.metrics.stage(name) if app.state.metrics is not None else nullcontext()
+
+@contextmanager
+def _observed_request(endpoint):
+    """Counts the request by endpoint and status and records its latency."""
+    metrics = app.state.metrics
+    if metrics is None:
+        yield
+        return
+    start = time.perf_counter()
+    status = 200
+    try:
+        yield
+    except HTTPException as e:
+        status = e.status_code
+        raise
+    except Exception:
+        status = 500
+        raise
+    finally:
+        metrics.request_seconds.observe(time.perf_counter() - start, endpoint)
+        metrics.requests.inc(1, endpoint, str(status))
+
+def _collect_state_metrics():
+    """Values kept by other components, read only when /metrics is scraped."""
+    cache = app.state.result_cache.stats()
+    families = [
+        ('recommender_result_cache_lookups_total', 'counter', "Result cache lookups, by outcome.",
+         [({'outcome': 'hit'}, cache['hits']), ({'outcome': 'miss'}, cache['misses'])]),
+        ('recommender_result_cache_entries', 'gauge', "Ranked lists in the result cache.", [({}, cache['entries'])]),
+        ('recommender_component_ready', 'gauge', "1 when the component is ready.",
+         [({'component': name}, int(state == 'ready')) for name, state in app.state.readiness.items()]),
+    ]
+    if app.state.text_encoder is not None:
+        embedding_cache = app.state.text_encoder.cache
+        families.append(('recommender_embedding_cache_lookups_total', 'counter', "Encoded-text cache lookups, by outcome.",
+                         [({'outcome': 'hit'}, embedding_cache.hits), ({'outcome': 'miss'}, embedding_cache.misses)]))
+    bundle = app.state.bundle
+    if bundle is not None:
+        families += [
+            ('recommender_artifact_info', 'gauge', "Artifact versions being served.",
+             [({kind: version or "" for kind, version in bundle.versions.items()}, 1)]),
+            ('recommender_cf_fold_ins_total', 'counter', "CF factors folded in for users with recorded ratings (this bundle).",
+             [({}, bundle.recommender.cf_factors.fold_ins)]),
+            ('recommender_rescored_rows_total', 'counter', "Float32 course rows re-scored after a reduced-precision scan (this bundle).",
+             [({}, bundle.recommender.rescored_rows)]),
+        ]
+    return families
+
+def _current_bundle():
+    """Returns the bundle to serve this request with, or raises 503 before the first one is loaded."""
+    bundle = app.state.bundle
+    if bundle is None:
+        raise HTTPException(status_code=503, detail="Models are not loaded.")
+    return bundle
+
+def _cache_key(bundle, user_id, request):
+    """Everything a ranked list depends on: the request, the artifacts it was scored with and the user's history."""
+    interests = normalize_text(request.interests) if request.interests else None
+    return (
+        user_id, request.top_n, interests, request.retrieval,
+        bundle.versions['content'], bundle.versions['cf'],
+        bundle.versions['lexical'] if request.retrieval != 'semantic' else None,
+        app.state.result_cache.user_generation(user_id),
+    )
+
+async def _recommend(bundle, requests):
+    """
+    Ranks the catalog for every request and returns a list of recommendations per request.
+    Cached lists are reused; all misses are scored together in one pass.
+    """
+    cache = app.state.result_cache
+    with _stage('cache_lookup'):
+        keys = [_cache_key(bundle, str(request.user_id), request) for request in requests]
+        ranked = [cache.get(key) if request.use_cache and cache.enabled else None for key, request in zip(keys, requests)]
+    pending = [i for i, recs in enumerate(ranked) if recs is None]
+
+    if pending:
+        for i, recs in zip(pending, await _score(bundle, [requests[i] for i in pending])):
+            ranked[i] = recs
+            cache.put(keys[i], recs)
+    with _stage('serialize'):
+        return [[CourseRecommendation(course_id=cid, score=s) for cid, s in recs] for recs in ranked]
+
+def _lexical_weight(retrieval):
+    return {'semantic': 0.0, 'lexical': 1.0, 'blend': LEXICAL_BLEND_WEIGHT}[retrieval]
+
+async def _score(bundle, requests):
+    """Scores the requests against the catalog in one pass; returns (course_id, score) lists."""
+    user_ids = [str(request.user_id) for request in requests]
+    lexical_weights = [_lexical_weight(request.retrieval) for request in requests]
+    if any(lexical_weights) and bundle.recommender.lexical_index is None:
+        raise HTTPException(status_code=503, detail="Lexical retrieval is not available: no lexical bundle is loaded.")
+
+    # Encode all free-text interests of the call off the event loop (batched with other requests' texts).
+    # Purely lexical requests never need the sentence encoder.
+    overrides = None
+    needs_encoding = [bool(request.interests) and weight < 1 for request, weight in zip(requests, lexical_weights)]
+    texts = [request.interests for request, needed in zip(requests, needs_encoding) if needed]
+    if texts:
+        text_encoder = await _get_text_encoder()
+        if text_encoder is None:
+            raise HTTPException(status_code=503, detail="The sentence encoder failed to load; interests cannot be used.")
+        try:
+            with _stage('encode'):
+                encoded = iter(await text_encoder.encode_async(texts))
+        except EncoderQueueFull as e:
+            raise HTTPException(status_code=503, detail=f"Encoder is overloaded: {e}")
+        except EncoderStopped as e:
+            raise HTTPException(status_code=503, detail=f"Encoder is unavailable: {e}")
+        overrides = [next(encoded) if needed else None for needed in needs_encoding]
+
+    lexical_texts = [request.interests if weight else None for request, weight in zip(requests, lexical_weights)]
+    for user_id, request, weight in zip(user_ids, requests, lexical_weights):
+        known = (weight < 1 and bundle.recommender.knows_user(user_id)) or \
+                (weight > 0 and bundle.recommender.lexical_index.knows_user(user_id))
+        if not request.interests and not known:
+            print(f"Warning: User ID '{user_id}' not found in pre-computed profiles. Content score will be 0.")
+            if app.state.metrics is not None:
+                app.state.metrics.unknown_users.inc()
+        if app.state.metrics is not None and not bundle.recommender.cf_factors.knows_user(user_id) and \
+                bundle.recommender.cf_factors.rating_history.recorded(user_id) is None:
+            # CF falls back to the global mean and course biases
+            app.state.metrics.fallback('cf_unknown_user')
+
+    top_ns = [request.top_n for request in requests]
+    if not any(lexical_weights):
+        return bundle.recommender.recommend(user_ids, top_ns, overrides)
+    try:
+        # Free text for lexical scoring goes through the TF-IDF pipeline's normalizer (NLTK) in a worker thread
+        return await asyncio.to_thread(bundle.recommender.recommend, user_ids, top_ns, overrides, lexical_weights, lexical_texts)
+    except LookupError as e:
+        raise HTTPException(status_code=503, detail=f"Lexical text normalization is unavailable (missing NLTK data): {e}")
+
 @app.post("/recommendations", response_model=RecommendationResponse)
 async def get_recommendations(request: RecommendationRequest):
-    if not app.state.models_loaded:
-        raise HTTPException(status_code=503, detail="Models are not loaded.")
+    with _observed_request('recommendations'):
+        bundle = _current_bundle()
+        return RecommendationResponse(recommendations=(await _recommend(bundle, [request]))[0])
 
-    user_id = str(request.user_id)
-    
-    courses_taken_by_user = set(app.state.interactions_df[app.state.interactions_df['user_id'] == user_id]['course_id'])
-    candidate_courses = [cid for cid in app.state.all_course_ids if cid not in courses_taken_by_user]
-
-    content_scores = {}
-    if user_id in app.state.user_id_to_idx:
-        student_idx = app.state.user_id_to_idx[user_id]
-        student_profile_vector = app.state.student_embeddings[student_idx].reshape(1, -1)
-        
-        for course_id in candidate_courses:
-            course_idx = app.state.course_id_to_idx.get(course_id)
-            if course_idx is not None:
-                course_vector = app.state.course_embeddings[course_idx].reshape(1, -1)
-                similarity = cosine_similarity(student_profile_vector, course_vector)[0][0]
-                content_scores[course_id] = similarity
-    else:
-        print(f"Warning: User ID '{user_id}' not found in pre-computed profiles. Content score will be 0.")
+@app.post("/recommendations/batch", response_model=BatchRecommendationResponse)
+async def get_batch_recommendations(request: BatchRecommendationRequest):
+    """Recommends for many users at once; each user's list is the same as `/recommendations` returns."""
+    with _observed_request('recommendations_batch'):
+        bundle = _current_bundle()
+        results = await _recommend(bundle, request.users)
+        return BatchRecommendationResponse(results=[
+            UserRecommendations(user_id=str(user.user_id), recommendations=recs)
+            for user, recs in zip(request.users, results)
+        ])
+
+@app.post("/users/{user_id}/interactions")
+async def record_interactions(user_id: str, update: InteractionUpdate):
+    """
+    Records newly completed courses so they are excluded right away. Rated ones also update the
+    user's CF factors (folded in on their next request, no retraining). Drops the user's cached results.
+    """
+    with _observed_request('interactions'):
+        bundle = _current_bundle()
+        # Kept across reloads until a retrained CF model covers them (tagged with the CF version they
+        # were recorded against); courses outside the catalog are ignored, as in the CSV history
+        app.state.recorded_interactions.setdefault(user_id, []).extend(
+            (bundle.versions['cf'], interaction) for interaction in update.interactions)
+        taken = _add_interactions(bundle, user_id, update.interactions)
+        app.state.result_cache.invalidate_user(user_id)
+        recorded = bundle.recommender.cf_factors.rating_history.recorded(user_id)
+        return {"user_id": user_id, "taken_courses": len(taken), "recorded_ratings": len(recorded or {})}
+
+@app.post("/admin/reload")
+async def reload_models(x_admin_token: str | None = Header(default=None)):
+    """Loads the currently published artifacts and swaps them in without interrupting traffic."""
+    if ADMIN_TOKEN and x_admin_token != ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Invalid admin token.")
+    try:
+        bundle = await _reload_model_bundle()
+    except Exception as e:
+        # The bundle that was serving keeps serving
+        raise HTTPException(status_code=409, detail=f"Reload rejected, keeping the current artifacts: {e}")
+    return {"status": "reloaded", "versions": bundle.versions}
 
-    cf_scores = {}
-    for course_id in candidate_courses:
-        prediction = app.state.cf_model.predict(uid=user_id, iid=course_id)
-        cf_scores[course_id] = prediction.est
+@app.get("/metrics")
+async def metrics():
+    """Prometheus text exposition of the request, stage and cache metrics."""
+    if app.state.metrics is None:
+        raise HTTPException(status_code=404, detail="Metrics are disabled (RECOMMENDER_METRICS=0).")
+    return PlainTextResponse(app.state.metrics.registry.render(), media_type="text/plain; version=0.0.4")
 
-    hybrid_scores = {}
-    for course_id in candidate_courses:
-        content_score = content_scores.get(course_id, 0.0)
-        cf_score = cf_scores.get(course_id, 2.5)
-        normalized_cf_score = (cf_score - 1) / 9.0
-        
-        hybrid_score = (0.7 * content_score) + (0.3 * normalized_cf_score)
-        hybrid_scores[course_id] = hybrid_score
+@app.get("/cache/stats")
+async def cache_stats():
+    """Hit/miss/eviction counters of the result cache."""
+    return app.state.result_cache.stats()
 
-    sorted_recommendations = sorted(hybrid_scores.items(), key=lambda item: item[1], reverse=True)
-    top_recommendations = [CourseRecommendation(course_id=cid, score=s) for cid, s in sorted_recommendations[:request.top_n]]
+@app.get("/healthz")
+async def healthz():
+    """Liveness: the process is up and the event loop is responsive."""
+    return {"status": "ok"}
 
-    return RecommendationResponse(recommendations=top_recommendations)
+@app.get("/readyz")
+async def readyz():
+    """Readiness: 200 once /recommendations can be served; per-component states are always reported."""
+    ready = app.state.bundle is not None
+    body = {
+        "status": "ready" if ready else "not_ready",
+        "components": app.state.readiness,
+        "artifact_versions": app.state.bundle.versions if ready else None,
+    }
+    return JSONResponse(status_code=200 if ready else 503, content=body)
 
 @app.get("/")
 async def root():
-    return {"status": "ok", "models_loaded": app.state.models_loaded}
\ No newline at end of file
+    return {"status": "ok", "components": app.state.readiness}
\ No newline at end of file
@@ -0,0 +1,194 @@
+# Filename: 05_evaluate_recommender.py
+# Offline evaluation of the hybrid recommender: holds out a slice of every user's interaction history,
+# ranks the catalog with the serving scorer (the held-out courses are not excluded as taken) and
+# reports precision@k, recall@k, NDCG@k and catalog coverage per content/CF blend, plus per-user
+# scoring latency. The CF model is retrained on the remaining history so held-out ratings cannot leak.
+#
+#   python 05_evaluate_recommender.py                                  # default blend, k = 5, 10, 20
+#   python 05_evaluate_recommender.py --content-weights 0.5,0.7,0.9,1  # blend sweep (cached scores)
+#   python 05_evaluate_recommender.py --trainer als                     # evaluate the ALS CF model
+import argparse
+import hashlib
+import json
+import os
+import time
+import numpy as np
+import pandas as pd
+
+from artifacts import load_bundle, write_als_bundle, write_cf_bundle
+from cf_search import DEFAULT_PARAMS, make_model
+from scoring import CONTENT_WEIGHT, CF_WEIGHT, CFFactors, HybridRecommender, TakenCourseIndex, hybrid_scores, top_n_indices
+
+CONTENT_MODEL_DIR = 'models/content_based'
+CF_MODEL_DIR = 'models/collaborative_filtering'
+INTERACTIONS_PATH = 'data/student_interactions_cleaned.csv'
+# Retrained CF models and (users x courses) content and CF score matrices, keyed by everything they depend on
+EVALUATION_CACHE_DIR = '.cache/evaluation'
+
+
+def holdout_split(interactions_df, fraction, seed):
+    """
+    Splits every user's history at random into (train, held-out): `fraction` of their interactions,
+    at least one, are held out. Users with a single interaction keep it for training.
+    """
+    shuffled = interactions_df.iloc[np.random.default_rng(seed).permutation(len(interactions_df))]
+    position = shuffled.groupby('user_id').cumcount().to_numpy()
+    size = shuffled.groupby('user_id')['course_id'].transform('size').to_numpy()
+    n_held_out = np.where(size >= 2, np.maximum(np.floor(size * fraction), 1), 0)
+    held_out = position < n_held_out
+    return shuffled[~held_out].sort_index(), shuffled[held_out].sort_index()
+
+
+def cache_key(**parts):
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+
+def load_cf_factors(args, train_df, course_ids, data_key):
+    """CF factors to evaluate: the published bundle, or a model retrained on `train_df` (cached as a bundle)."""
+    if args.cf == 'bundle':
+        print("WARNING: the published CF model was trained on the held-out ratings too; its scores are optimistic.")
+        arrays, manifest = load_bundle(CF_MODEL_DIR)
+    else:
+        params = DEFAULT_PARAMS[args.trainer]
+        model_dir = os.path.join(EVALUATION_CACHE_DIR, f"cf-{cache_key(data=data_key, trainer=args.trainer, params=params)}")
+        if not os.path.exists(model_dir) or args.no_cache:
+            start = time.perf_counter()
+            model = make_model(args.trainer, params)
+            if args.trainer == 'als':
+                model.fit(train_df['user_id'], train_df['course_id'], train_df['rating'])
+                write_als_bundle(model_dir, model, hyperparameters=params, keep_versions=1)
+            else:
+                from surprise import Dataset, Reader
+                model.fit(Dataset.load_from_df(train_df[['user_id', 'course_id', 'rating']], Reader(rating_scale=(1, 10))).build_full_trainset())
+                write_cf_bundle(model_dir, model, hyperparameters=params, keep_versions=1)
+            print(f"Retrained {args.trainer} {params} on {len(train_df)} ratings in {time.perf_counter() - start:.2f}s.")
+        arrays, manifest = load_bundle(model_dir)
+    return CFFactors.from_bundle(arrays, manifest, course_ids), manifest['version']
+
+
+def score_matrices(recommender, user_ids, path):
+    """The (users x courses) content similarities and CF estimates of `user_ids`, cached in `path`."""
+    if path and os.path.exists(path):
+        with np.load(path, allow_pickle=False) as cached:
+            if cached['user_ids'].tolist() == user_ids:
+                print(f"Score matrices loaded from '{path}'.")
+                return cached['content'], cached['cf']
+    start = time.perf_counter()
+    students, _ = recommender.student_vectors(user_ids)
+    content = students @ recommender.course_embeddings.T  # Exactly the serving product (unit-length rows)
+    cf = recommender.cf_factors.estimate_many(user_ids)
+    print(f"Scored {len(user_ids)} users x {content.shape[1]} courses in {time.perf_counter() - start:.3f}s.")
+    if path:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        np.savez(path, user_ids=np.array(user_ids, dtype=str), content=content, cf=cf)
+    return content, cf
+
+
+def rank_catalog(content, cf, taken, k, content_weight):
+    """Top-k catalog indices per user for one blend, skipping taken courses (as the API does)."""
+    if content_weight == CONTENT_WEIGHT:
+        scores = hybrid_scores(content, cf)  # The serving weights, bit for bit
+    else:
+        scores = hybrid_scores(content, cf, content_weight, round(1 - content_weight, 6))
+    return [top_n_indices(scores[row], k, exclude=taken[row]) for row in range(len(scores))]
+
+
+def ranking_metrics(rankings, relevant, ks, n_courses):
+    """Mean precision@k, recall@k and NDCG@k (binary relevance) and catalog coverage@k, per k."""
+    discounts = 1.0 / np.log2(np.arange(2, max(ks) + 2))
+    rows = []
+    for k in ks:
+        precision, recall, ndcg = [], [], []
+        recommended = set()
+        for ranked, targets in zip(rankings, relevant):
+            hits = np.isin(ranked[:k], targets)
+            precision.append(hits.sum() / k)
+            recall.append(hits.sum() / len(targets))
+            ndcg.append((hits * discounts[:len(hits)]).sum() / discounts[:min(len(targets), k)].sum())
+            recommended.update(ranked[:k].tolist())
+        rows.append({'k': k, 'precision': np.mean(precision), 'recall': np.mean(recall),
+                     'ndcg': np.mean(ndcg), 'coverage': len(recommended) / n_courses})
+    return rows
+
+
+def measure_latency(recommender, user_ids, k, repeat):
+    """Per-user wall-clock of `recommender.recommend` for a single user (the /recommendations path), in ms."""
+    timings = []
+    for _ in range(repeat):
+        for user_id in user_ids:
+            start = time.perf_counter()
+            recommender.recommend([user_id], [k])
+            timings.append((time.perf_counter() - start) * 1000)
+    return np.array(timings)
+
+
+def evaluate(args):
+    print("--- 1. Splitting the Interaction History ---")
+    interactions_df = pd.read_csv(INTERACTIONS_PATH, dtype={'user_id': str})
+    train_df, held_out_df = holdout_split(interactions_df, args.holdout, args.seed)
+    with open(INTERACTIONS_PATH, 'rb') as f:
+        data_key = cache_key(interactions=hashlib.sha256(f.read()).hexdigest(), holdout=args.holdout, seed=args.seed)
+    print(f"{len(train_df)} interactions kept for training, {len(held_out_df)} held out ({args.holdout:.0%} per user).")
+
+    print("\n--- 2. Building the Hybrid Scorer on the Training Slice ---")
+    content, content_manifest = load_bundle(CONTENT_MODEL_DIR)
+    course_ids = content['course_ids'].tolist()
+    course_id_to_idx = {course_id: i for i, course_id in enumerate(course_ids)}
+    cf_factors, cf_version = load_cf_factors(args, train_df, course_ids, data_key)
+    taken_courses = TakenCourseIndex.from_pairs(
+        train_df['user_id'].to_numpy(),
+        train_df['course_id'].map(course_id_to_idx).fillna(-1).astype('int64').to_numpy(), len(course_ids),
+    )
+    recommender = HybridRecommender(course_ids, content['course_embeddings'], content['user_ids'].tolist(),
+                                    content['student_embeddings'], cf_factors, taken_courses)
+
+    # Relevant courses: held-out catalog courses rated at least --min-rating
+    relevant_df = held_out_df[(held_out_df['rating'] >= args.min_rating) & held_out_df['course_id'].isin(course_id_to_idx)]
+    relevant_by_user = relevant_df['course_id'].map(course_id_to_idx).groupby(relevant_df['user_id']).unique()
+    user_ids = relevant_by_user.index.tolist()
+    relevant = relevant_by_user.tolist()
+    print(f"Evaluating {len(user_ids)} users with {len(relevant_df)} relevant held-out courses "
+          f"(content {content_manifest['version']}, CF {cf_version}).")
+
+    scores_path = None if args.no_cache else os.path.join(
+        EVALUATION_CACHE_DIR, f"scores-{cache_key(data=data_key, content=content_manifest['version'], cf=cf_version)}.npz")
+    content_scores, cf_estimates = score_matrices(recommender, user_ids, scores_path)
+    taken = taken_courses.masks_for(user_ids)
+
+    print(f"\n--- 3. Ranking Quality (catalog of {len(course_ids)} courses) ---")
+    results = []
+    for content_weight in args.content_weights:
+        rankings = rank_catalog(content_scores, cf_estimates, taken, max(args.k), content_weight)
+        for row in ranking_metrics(rankings, relevant, args.k, len(course_ids)):
+            results.append({'content_weight': content_weight, **row})
+        if content_weight == CONTENT_WEIGHT:
+            # The cached matrices must rank exactly as the serving scorer does
+            served = recommender.recommend(user_ids, [max(args.k)] * len(user_ids))
+            same = sum([course_ids[i] for i in ranked] == [cid for cid, _ in recs] for ranked, recs in zip(rankings, served))
+            print(f"Serving scorer (weights {CONTENT_WEIGHT}/{CF_WEIGHT}) agrees on {same}/{len(user_ids)} ranked lists.")
+    print(pd.DataFrame(results).to_string(index=False, float_format=lambda v: f"{v:.4f}"))
+
+    print(f"\n--- 4. Scoring Latency (one user per call, {args.repeat} passes) ---")
+    timings = measure_latency(recommender, user_ids, max(args.k), args.repeat)
+    p50, p90, p99 = np.percentile(timings, [50, 90, 99])
+    print(f"p50 {p50:.3f} ms, p90 {p90:.3f} ms, p99 {p99:.3f} ms, max {timings.max():.3f} ms over {len(timings)} calls.")
+
+
+def parse_list(value, cast=int):
+    return [cast(v) for v in value.split(',')]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline ranking-quality and latency evaluation of the hybrid recommender.")
+    parser.add_argument('--k', type=parse_list, default=[5, 10, 20])
+    parser.add_argument('--content-weights', type=lambda v: parse_list(v, float), default=[CONTENT_WEIGHT],
+                        help="Content weights to evaluate; the CF weight is 1 - w.")
+    parser.add_argument('--holdout', type=float, default=0.2, help="Fraction of each user's history held out.")
+    parser.add_argument('--min-rating', type=float, default=0, help="Held-out courses rated below this are not relevant.")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--cf', choices=['retrain', 'bundle'], default='retrain',
+                        help="Retrain the CF model on the training slice, or use the published one (leaks).")
+    parser.add_argument('--trainer', choices=['surprise', 'als'], default='surprise')
+    parser.add_argument('--repeat', type=int, default=3, help="Latency passes over all users.")
+    parser.add_argument('--no-cache', action='store_true', help="Recompute the CF model and score matrices.")
+    evaluate(parser.parse_args())
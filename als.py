@@ -0,0 +1,122 @@
+# Filename: als.py
+# Biased matrix factorization trained with alternating least squares over a sparse user x course
+# matrix. Same model and objective as surprise.SVD, so its factors drop into the same CF bundle:
+#   r̂(u, i) = μ + b_u + b_i + p_u·q_i,   minimizing Σ (r - r̂)² + reg (b_u² + b_i² + |p_u|² + |q_i|²)
+# summed over the observed ratings (so each user/item is regularized in proportion to its ratings).
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+
+class ALS:
+    """
+    Each half-epoch fixes one side and solves every row of the other exactly: for a user, the
+    ridge system over [p_u, b_u] with design rows X = [q_i, 1] for the courses they rated. A row with
+    fewer ratings than unknowns solves the equivalent kernel form X^T (X X^T + λI)^-1 y, whose system
+    is (ratings x ratings) instead of (factors + 1)^2, which is most rows of a sparse rating matrix.
+    Rows are processed in chunks of bounded size; each chunk's systems are one batched matmul and one
+    batched `np.linalg.solve`, and chunks can run on several threads (BLAS and LAPACK release the GIL).
+    """
+
+    # Upper bound on the floats one chunk materializes: its gathered design rows plus its systems
+    CHUNK_ELEMENTS = 1 << 22
+
+    def __init__(self, n_factors=100, n_epochs=15, reg=0.5, init_std=0.1, rating_scale=(1, 10),
+                 n_threads=1, random_state=42):
+        self.n_factors = n_factors
+        self.n_epochs = n_epochs
+        self.reg = reg
+        self.init_std = init_std
+        self.rating_scale = tuple(rating_scale)
+        self.n_threads = n_threads
+        self.random_state = random_state
+        self.biased = True
+
+    def fit(self, user_ids, item_ids, ratings):
+        """Trains on parallel arrays of raw user ids, raw item ids and ratings. Returns self."""
+        user_codes, self.user_ids = pd.factorize(pd.Series(user_ids).astype(str))
+        item_codes, self.item_ids = pd.factorize(pd.Series(item_ids).astype(str))
+        self.user_ids, self.item_ids = self.user_ids.to_numpy(dtype=str), self.item_ids.to_numpy(dtype=str)
+        ratings = np.asarray(ratings, dtype=np.float64)
+        self.global_mean = float(ratings.mean())
+
+        # Duplicate (user, item) pairs are summed by the sparse constructor, so keep the last rating of each
+        pairs = pd.DataFrame({'u': user_codes, 'i': item_codes, 'r': ratings}).drop_duplicates(['u', 'i'], keep='last')
+        shape = (len(self.user_ids), len(self.item_ids))
+        by_user = sp.csr_matrix((pairs['r'].to_numpy(), (pairs['u'].to_numpy(), pairs['i'].to_numpy())), shape=shape)
+        by_item = by_user.T.tocsr()
+
+        rng = np.random.default_rng(self.random_state)
+        self.pu = rng.normal(0, self.init_std, (shape[0], self.n_factors))
+        self.qi = rng.normal(0, self.init_std, (shape[1], self.n_factors))
+        self.bu = np.zeros(shape[0])
+        self.bi = np.zeros(shape[1])
+
+        for _ in range(self.n_epochs):
+            self.pu, self.bu = self._solve_side(by_user, self.qi, self.bi)
+            self.qi, self.bi = self._solve_side(by_item, self.pu, self.bu)
+        return self
+
+    def _solve_side(self, matrix, fixed_factors, fixed_bias):
+        """Solves [factors, bias] of every row of `matrix` given the other side's factors and biases."""
+        # Design rows [factors, 1], plus an all-zero row that padded slots point at
+        design = np.hstack([fixed_factors, np.ones((fixed_factors.shape[0], 1))])
+        design = np.vstack([design, np.zeros(design.shape[1])])
+        padding = design.shape[0] - 1
+        # Residual each row's [factors, bias] has to explain: r - μ - (the other side's bias)
+        targets = matrix.data - self.global_mean - fixed_bias[matrix.indices]
+        width = design.shape[1]
+
+        # Rows are grouped by rating count rounded up to a power of two and padded to that length, so
+        # a group's Gram matrices are one batched matmul and padding at most doubles the work
+        counts = np.diff(matrix.indptr)
+        lengths = np.where(counts > 0, 2 ** np.ceil(np.log2(np.maximum(counts, 1))).astype(np.int64), 0)
+        chunks = []
+        for length in np.unique(lengths):
+            rows = np.flatnonzero(lengths == length)
+            system = min(length, width) ** 2  # Kernel (length^2) or normal-equation (width^2) matrix per row
+            step = max(self.CHUNK_ELEMENTS // (length * width + system + width), 1)
+            chunks.extend((length, rows[i:i + step]) for i in range(0, len(rows), step))
+
+        def solve(chunk):
+            length, rows = chunk
+            if not length:  # Rows without ratings solve to zero
+                return rows, np.zeros((len(rows), width))
+            slots = matrix.indptr[rows][:, None] + np.arange(length)
+            filled = slots < matrix.indptr[rows + 1][:, None]
+            slots = np.where(filled, slots, 0)
+            x = design[np.where(filled, matrix.indices[slots], padding)]  # rows x length x width
+            y = np.where(filled, targets[slots], 0.0)
+            # Per-rating regularization, as in the SGD objective
+            ridge = (self.reg * counts[rows])[:, None, None]
+            if length < width:
+                # Padded slots are zero rows with zero targets, so their dual weights solve to zero
+                kernel = np.matmul(x, x.transpose(0, 2, 1)) + ridge * np.eye(length)
+                weights = np.linalg.solve(kernel, y[:, :, None])
+                return rows, np.matmul(x.transpose(0, 2, 1), weights)[:, :, 0]
+            gram = np.matmul(x.transpose(0, 2, 1), x) + ridge * np.eye(width)
+            rhs = np.einsum('rlw,rl->rw', x, y)
+            return rows, np.linalg.solve(gram, rhs[:, :, None])[:, :, 0]
+
+        if self.n_threads > 1 and len(chunks) > 1:
+            with ThreadPoolExecutor(max_workers=self.n_threads) as pool:
+                solved = list(pool.map(solve, chunks))
+        else:
+            solved = [solve(chunk) for chunk in chunks]
+        result = np.empty((matrix.shape[0], width))
+        for rows, values in solved:
+            result[rows] = values
+        return np.ascontiguousarray(result[:, :-1]), np.ascontiguousarray(result[:, -1])
+
+    def predict_many(self, user_ids, item_ids):
+        """Clipped estimates for parallel arrays of raw ids, with surprise.SVD's fallbacks for unknown ids."""
+        users = pd.Index(self.user_ids).get_indexer(pd.Series(user_ids).astype(str))
+        items = pd.Index(self.item_ids).get_indexer(pd.Series(item_ids).astype(str))
+        known_u, known_i = users >= 0, items >= 0
+        est = np.full(len(users), self.global_mean)
+        est[known_u] += self.bu[users[known_u]]
+        est[known_i] += self.bi[items[known_i]]
+        both = known_u & known_i
+        est[both] += np.einsum('ij,ij->i', self.pu[users[both]], self.qi[items[both]])
+        return np.clip(est, *self.rating_scale)
@@ -0,0 +1,85 @@
+# Filename: ann_index.py
+# IVF-flat approximate nearest-neighbour index over L2-normalized embeddings (inner-product search).
+import numpy as np
+
+from scoring import l2_normalize_rows
+
+
+class IVFFlatIndex:
+    """
+    Partitions the rows of an embedding matrix into `n_lists` k-means cells. A query only scans the
+    rows of the `n_probe` cells whose centroids are closest to it, so the cost of a search scales
+    with `n_probe / n_lists` of the catalog instead of all of it.
+    The index stores row ids only; the vectors themselves are passed in at search time.
+    """
+
+    def __init__(self, centroids, list_offsets, list_rows, n_rows):
+        self.centroids = centroids          # (n_lists, dim) unit-length float32
+        self.list_offsets = list_offsets    # (n_lists + 1,) CSR offsets into list_rows
+        self.list_rows = list_rows          # row ids grouped by cell
+        self.n_rows = n_rows
+
+    @property
+    def n_lists(self):
+        return len(self.centroids)
+
+    @classmethod
+    def build(cls, embeddings, n_lists=None, random_state=42):
+        """Clusters the normalized rows of `embeddings`; defaults to ~sqrt(rows) cells."""
+        from sklearn.cluster import KMeans  # Only needed to build the index offline, not to serve it
+
+        vectors = l2_normalize_rows(embeddings)
+        if n_lists is None:
+            n_lists = int(np.sqrt(len(vectors)))
+        n_lists = max(1, min(n_lists, len(vectors)))
+
+        kmeans = KMeans(n_clusters=n_lists, n_init=1, random_state=random_state).fit(vectors)
+        # Re-normalize the centroids so routing by inner product matches the cosine metric
+        centroids = l2_normalize_rows(kmeans.cluster_centers_)
+        assignments = kmeans.labels_
+
+        list_rows = np.argsort(assignments, kind='stable').astype(np.int32)
+        list_offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assignments, minlength=n_lists), out=list_offsets[1:])
+        return cls(centroids, list_offsets, list_rows, len(vectors))
+
+    def candidates(self, query, n_probe):
+        """Returns the row ids in the `n_probe` cells closest to `query`."""
+        n_probe = max(1, min(n_probe, self.n_lists))
+        cells = np.argpartition(-(self.centroids @ query), n_probe - 1)[:n_probe]
+        return np.concatenate([self.list_rows[self.list_offsets[c]:self.list_offsets[c + 1]] for c in cells])
+
+    def search(self, vectors, query, k, n_probe, exclude_rows=None):
+        """
+        Returns the `min(k, rows not excluded)` row ids of `vectors` with the highest inner product
+        with `query`, sorted by row id, skipping `exclude_rows`. At least the `n_probe` closest cells
+        are scanned; when they hold fewer than `k` usable rows, further cells are probed in centroid order.
+        """
+        cells = np.argsort(-(self.centroids @ query), kind='stable')
+        n_probe = max(1, min(n_probe, self.n_lists))
+        chunks, found = [], 0
+        for i, c in enumerate(cells):
+            if i >= n_probe and found >= k:
+                break
+            rows = self.list_rows[self.list_offsets[c]:self.list_offsets[c + 1]]
+            if exclude_rows is not None and len(exclude_rows):
+                rows = rows[~np.isin(rows, exclude_rows)]
+            chunks.append(rows)
+            found += len(rows)
+        rows = np.concatenate(chunks)
+        if len(rows) > k:
+            rows = rows[np.argpartition(-(vectors[rows] @ query), k - 1)[:k]]
+        return np.sort(rows)
+
+    def to_arrays(self, prefix='ann_'):
+        """Returns the index as named arrays, for storing in an artifact bundle."""
+        return {
+            f'{prefix}centroids': self.centroids,
+            f'{prefix}list_offsets': self.list_offsets,
+            f'{prefix}list_rows': self.list_rows,
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays, n_rows, prefix='ann_'):
+        """Rebuilds an index from `to_arrays` output (memory-mapped arrays are used as-is)."""
+        return cls(arrays[f'{prefix}centroids'], arrays[f'{prefix}list_offsets'], arrays[f'{prefix}list_rows'], n_rows)
@@ -0,0 +1,261 @@
+# Filename: artifacts.py
+# Versioned model artifact bundles: raw .npy arrays plus a JSON manifest.
+# The API opens the arrays with mmap_mode='r', so every worker on a host shares the same pages.
+#
+# Layout: every build goes into its own `<directory>/<version>/` and the one-line `CURRENT` file
+# names the live version. Files of a published version are never rewritten, so processes that
+# still map an older version keep reading consistent data while a new one is published.
+import datetime
+import hashlib
+import json
+import os
+import shutil
+import uuid
+import numpy as np
+
+MANIFEST_NAME = 'manifest.json'
+CURRENT_NAME = 'CURRENT'
+FORMAT_VERSION = 1
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def current_version_dir(directory):
+    """Returns the directory of the live bundle version (`directory` itself for an unversioned bundle)."""
+    pointer = os.path.join(directory, CURRENT_NAME)
+    if not os.path.exists(pointer):
+        return directory
+    with open(pointer) as f:
+        return os.path.join(directory, f.read().strip())
+
+
+def current_version(directory):
+    """Returns the version name `CURRENT` points at, or None for an unversioned bundle."""
+    version_dir = current_version_dir(directory)
+    return None if version_dir == directory else os.path.basename(version_dir)
+
+
+def read_manifest(directory):
+    """Returns the manifest of the live bundle version in `directory` without opening any array."""
+    with open(os.path.join(current_version_dir(directory), MANIFEST_NAME)) as f:
+        return json.load(f)
+
+
+def write_bundle(directory, arrays, keep_versions=3, **metadata):
+    """
+    Writes `arrays` as `<name>.npy` files plus a manifest (dtypes, shapes, checksums, build timestamp,
+    version and `metadata`) into a new `<directory>/<version>/`, then atomically points `CURRENT` at
+    it. Only the newest `keep_versions` versions are kept. Returns the manifest.
+    """
+    os.makedirs(directory, exist_ok=True)
+    staging_dir = os.path.join(directory, f'.staging-{uuid.uuid4().hex}')
+    os.makedirs(staging_dir)
+
+    entries = {}
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        file_name = f'{name}.npy'
+        path = os.path.join(staging_dir, file_name)
+        np.save(path, array, allow_pickle=False)
+        entries[name] = {
+            'file': file_name,
+            'dtype': array.dtype.str,
+            'shape': list(array.shape),
+            'sha256': _sha256(path),
+        }
+
+    built_at = datetime.datetime.now(datetime.timezone.utc)
+    content_digest = hashlib.sha256(''.join(entries[name]['sha256'] for name in sorted(entries)).encode()).hexdigest()
+    manifest = {
+        'format_version': FORMAT_VERSION,
+        'version': f"{built_at:%Y%m%dT%H%M%SZ}-{content_digest[:12]}",
+        'built_at': built_at.isoformat(),
+        **metadata,
+        'arrays': entries,
+    }
+    with open(os.path.join(staging_dir, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    # Publish: the version directory appears complete, then CURRENT flips to it in one rename.
+    # The same version name means identical arrays built in the same second; keep the existing copy.
+    version_dir = os.path.join(directory, manifest['version'])
+    if os.path.exists(version_dir):
+        shutil.rmtree(staging_dir)
+    else:
+        os.rename(staging_dir, version_dir)
+    pointer = os.path.join(directory, CURRENT_NAME)
+    with open(pointer + '.tmp', 'w') as f:
+        f.write(manifest['version'] + '\n')
+    os.replace(pointer + '.tmp', pointer)
+
+    # Versions sort chronologically by name. Deleting files that a running process still maps is
+    # safe: the pages stay valid until it unmaps them.
+    versions = sorted(v for v in os.listdir(directory) if os.path.exists(os.path.join(directory, v, MANIFEST_NAME)))
+    for old_version in versions[:-keep_versions]:
+        shutil.rmtree(os.path.join(directory, old_version), ignore_errors=True)
+    return manifest
+
+
+def load_bundle(directory, mmap=True, verify_checksums=False):
+    """
+    Opens the arrays of the live bundle version in `directory` (read-only memory maps by default)
+    and returns `(arrays, manifest)`. Dtypes and shapes are always checked against the manifest;
+    checksums only on request, since hashing reads every page and defeats the point of mapping
+    them lazily.
+    """
+    directory = current_version_dir(directory)
+    manifest = read_manifest(directory)
+    if manifest.get('format_version') != FORMAT_VERSION:
+        raise ValueError(f"Unsupported artifact format {manifest.get('format_version')} in '{directory}'.")
+
+    arrays = {}
+    for name, entry in manifest['arrays'].items():
+        path = os.path.join(directory, entry['file'])
+        if verify_checksums and _sha256(path) != entry['sha256']:
+            raise ValueError(f"Checksum mismatch for '{path}'.")
+        # Zero-size arrays cannot be memory-mapped
+        mmap_mode = 'r' if mmap and np.prod(entry['shape']) > 0 else None
+        array = np.load(path, mmap_mode=mmap_mode, allow_pickle=False)
+        if array.dtype.str != entry['dtype'] or list(array.shape) != entry['shape']:
+            raise ValueError(f"'{path}' is {array.dtype.str}{list(array.shape)}, manifest says {entry['dtype']}{entry['shape']}.")
+        arrays[name] = array
+    return arrays, manifest
+
+
+def write_content_bundle(directory, course_ids, course_embeddings, user_ids, student_embeddings, model_name, **metadata):
+    """
+    Writes the content-based bundle in the layout the API serves directly: one row per course id
+    (a repeated code keeps its last row, listed where it first appears), L2-normalized float32
+    embeddings, id tables, an IVF index over the course rows, and float16/int8 copies of the course
+    matrix for reduced-precision scans. `metadata` goes into the manifest.
+    """
+    from ann_index import IVFFlatIndex
+    from quantized_embeddings import PRECISIONS, QuantizedEmbeddings
+    from scoring import l2_normalize_rows
+
+    last_row_for_course = {str(course_id): i for i, course_id in enumerate(course_ids)}
+    course_embeddings = l2_normalize_rows(np.asarray(course_embeddings)[list(last_row_for_course.values())])
+    student_embeddings = l2_normalize_rows(student_embeddings)
+    ann_index = IVFFlatIndex.build(course_embeddings)
+
+    return write_bundle(
+        directory,
+        {
+            'course_embeddings': course_embeddings,
+            'student_embeddings': student_embeddings,
+            'course_ids': np.array(list(last_row_for_course), dtype=str),
+            'user_ids': np.array([str(user_id) for user_id in user_ids], dtype=str),
+            **ann_index.to_arrays(),
+            **{name: array for precision in PRECISIONS
+               for name, array in QuantizedEmbeddings.from_float(course_embeddings, precision).to_arrays().items()},
+        },
+        kind='content_based',
+        model_name=model_name,
+        dim=int(course_embeddings.shape[1]),
+        normalized=True,
+        **metadata,
+    )
+
+
+def write_factor_bundle(directory, pu, qi, bu, bi, user_ids, item_ids, global_mean, rating_scale, algorithm, biased=True,
+                        **metadata):
+    """Writes a biased matrix-factorization model: factors and biases with their raw-id tables (row order)."""
+    return write_bundle(
+        directory,
+        {
+            'pu': pu,
+            'qi': qi,
+            'bu': bu,
+            'bi': bi,
+            'user_ids': np.array([str(user_id) for user_id in user_ids], dtype=str),
+            'item_ids': np.array([str(item_id) for item_id in item_ids], dtype=str),
+        },
+        kind='collaborative_filtering',
+        algorithm=algorithm,
+        n_factors=int(pu.shape[1]),
+        biased=bool(biased),
+        global_mean=float(global_mean),
+        rating_scale=[float(v) for v in rating_scale],
+        **metadata,
+    )
+
+
+def write_cf_bundle(directory, algo, **metadata):
+    """Writes the factors, biases and raw-id tables (in inner-id order) of a fitted `surprise.SVD`."""
+    trainset = algo.trainset
+    return write_factor_bundle(
+        directory, algo.pu, algo.qi, algo.bu, algo.bi,
+        [trainset.to_raw_uid(u) for u in trainset.all_users()],
+        [trainset.to_raw_iid(i) for i in trainset.all_items()],
+        trainset.global_mean, trainset.rating_scale, algorithm='surprise.SVD', biased=algo.biased,
+        **metadata,
+    )
+
+
+def write_als_bundle(directory, model, **metadata):
+    """Writes a fitted `als.ALS` model in the same layout as `write_cf_bundle`."""
+    return write_factor_bundle(
+        directory, model.pu, model.qi, model.bu, model.bi, model.user_ids, model.item_ids,
+        model.global_mean, model.rating_scale, algorithm='als', biased=model.biased, **metadata,
+    )
+
+
+def write_lexical_bundle(directory, course_ids, course_matrix, user_ids, student_matrix, vectorizer, min_token_length=0):
+    """
+    Writes the TF-IDF course and student matrices (as CSR arrays), the vocabulary in column order and
+    the IDF weights of a fitted `TfidfVectorizer`, plus the analyzer settings the API needs to
+    vectorize free text the same way. `min_token_length` is the text normalizer's setting.
+    """
+    if vectorizer.norm != 'l2' or vectorizer.sublinear_tf or not vectorizer.use_idf:
+        raise ValueError("Only l2-normalized, linear-tf TF-IDF vectors are supported.")
+    terms = sorted(vectorizer.vocabulary_, key=vectorizer.vocabulary_.get)
+    arrays = {
+        'course_ids': np.array([str(course_id) for course_id in course_ids], dtype=str),
+        'user_ids': np.array([str(user_id) for user_id in user_ids], dtype=str),
+        'terms': np.array(terms, dtype=str),
+        'idf': vectorizer.idf_,
+    }
+    for prefix, matrix in (('course', course_matrix), ('student', student_matrix)):
+        matrix = matrix.tocsr()
+        arrays.update({f'{prefix}_data': matrix.data, f'{prefix}_indices': matrix.indices, f'{prefix}_indptr': matrix.indptr})
+    return write_bundle(
+        directory,
+        arrays,
+        kind='lexical',
+        n_terms=len(terms),
+        min_token_length=min_token_length,
+        analyzer={
+            'lowercase': vectorizer.lowercase,
+            'stop_words': vectorizer.stop_words,
+            'token_pattern': vectorizer.token_pattern,
+            'ngram_range': list(vectorizer.ngram_range),
+        },
+    )
+
+
+def convert_legacy_models(model_dir='models'):
+    """Rewrites the pickled joblib artifacts of older builds in `model_dir` as bundles."""
+    import joblib
+
+    content_dir = os.path.join(model_dir, 'content_based')
+    write_content_bundle(
+        content_dir,
+        joblib.load(os.path.join(content_dir, 'course_ids.joblib')),
+        joblib.load(os.path.join(content_dir, 'course_embeddings.joblib')),
+        joblib.load(os.path.join(content_dir, 'user_ids.joblib')),
+        joblib.load(os.path.join(content_dir, 'student_embeddings.joblib')),
+        model_name='all-MiniLM-L6-v2',
+    )
+    cf_dir = os.path.join(model_dir, 'collaborative_filtering')
+    write_cf_bundle(cf_dir, joblib.load(os.path.join(cf_dir, 'cf_svd_model.joblib')))
+
+
+if __name__ == "__main__":
+    convert_legacy_models()
+    print("Legacy joblib artifacts converted to .npy bundles.")
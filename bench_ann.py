@@ -0,0 +1,79 @@
+# Filename: bench_ann.py
+# Benchmarks IVF (approximate) candidate retrieval against the brute-force content scan.
+#
+#   python bench_ann.py                          # the real course/student embeddings
+#   python bench_ann.py --synthetic 100000       # a synthetic clustered catalog of that size
+import argparse
+import time
+import numpy as np
+
+from ann_index import IVFFlatIndex
+from artifacts import load_bundle
+from scoring import l2_normalize_rows, top_n_indices
+
+
+def synthetic_embeddings(n_rows, dim, n_clusters, seed):
+    """Clustered random unit vectors, which is closer to real text embeddings than uniform noise."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((n_clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, n_clusters, size=n_rows)
+    return centers[labels] + 0.6 * rng.standard_normal((n_rows, dim)).astype(np.float32)
+
+
+def load_vectors(args):
+    if args.synthetic:
+        n_clusters = max(10, args.synthetic // 500)
+        courses = synthetic_embeddings(args.synthetic, 384, n_clusters, seed=0)
+        students = synthetic_embeddings(args.queries, 384, n_clusters, seed=1)
+    else:
+        arrays, _ = load_bundle('models/content_based')
+        courses, students = arrays['course_embeddings'], arrays['student_embeddings']
+    return l2_normalize_rows(courses), l2_normalize_rows(students)
+
+
+def run_benchmark(args):
+    courses, students = load_vectors(args)
+    print(f"--- Catalog: {courses.shape[0]} courses x {courses.shape[1]} dims, {len(students)} queries ---")
+
+    start = time.perf_counter()
+    index = IVFFlatIndex.build(courses, n_lists=args.n_lists)
+    print(f"IVF index built with {index.n_lists} lists in {time.perf_counter() - start:.2f}s")
+
+    # Ground truth: the exact top-k of the brute-force scan
+    start = time.perf_counter()
+    exact = [set(top_n_indices(courses @ q, args.k).tolist()) for q in students]
+    exact_ms = (time.perf_counter() - start) * 1000 / len(students)
+    print(f"\nExact scan: {exact_ms:.3f} ms/query")
+
+    print(f"\n{'pool':>6} {'n_probe':>8} {'ms/query':>10} {'speedup':>8} {f'recall@{args.k}':>10}")
+    for pool_size in args.pool_sizes:
+        for n_probe in args.n_probes:
+            start = time.perf_counter()
+            pools = [index.search(courses, q, pool_size, n_probe) for q in students]
+            ann_ms = (time.perf_counter() - start) * 1000 / len(students)
+
+            # Every pool must be full: short probed cells are topped up from the next closest ones
+            assert all(len(pool) == min(pool_size, len(courses)) for pool in pools), "ANN pool came up short"
+
+            # Recall of the exact top-k among the k best courses of each retrieved pool
+            hits = 0
+            for q, pool, truth in zip(students, pools, exact):
+                approx = pool[top_n_indices(courses[pool] @ q, args.k)]
+                hits += len(truth.intersection(approx.tolist()))
+            recall = hits / sum(len(t) for t in exact)
+            print(f"{pool_size:>6} {n_probe:>8} {ann_ms:>10.3f} {exact_ms / ann_ms:>7.1f}x {recall:>10.3f}")
+
+
+def parse_list(value):
+    return [int(v) for v in value.split(',')]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark IVF candidate retrieval against the exact content scan.")
+    parser.add_argument('--synthetic', type=int, default=0, help="Number of synthetic courses (0 = real embeddings).")
+    parser.add_argument('--queries', type=int, default=200, help="Number of synthetic queries.")
+    parser.add_argument('--n-lists', type=int, default=None, help="IVF lists (default ~sqrt(courses)).")
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--pool-sizes', type=parse_list, default=[50, 200])
+    parser.add_argument('--n-probes', type=parse_list, default=[1, 4, 8, 16])
+    run_benchmark(parser.parse_args())
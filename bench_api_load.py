@@ -0,0 +1,287 @@
+# Filename: bench_api_load.py
+# In-process load test of 04_recommendation_api.py: drives the ASGI app directly (no network, no
+# server) with a replayed JSONL request log or a synthetic request mix at a fixed concurrency, and
+# reports throughput, latency percentiles per request type, time spent per serving stage and result
+# cache counters. Results can be written as JSON and compared against an earlier run.
+#
+#   python bench_api_load.py --concurrency 1,8,32 --requests 2000 --output results.json
+#   python bench_api_load.py --replay traffic.jsonl --concurrency 16 --compare baseline.json
+#   RECOMMENDER_RESULT_CACHE_SIZE=0 python bench_api_load.py   # measure scoring, not cache hits
+#
+# A replay log has one request per line: {"method": "POST", "path": "/recommendations", "json": {...}}.
+# "method" defaults to POST and "path" to /recommendations; a line without "json" is taken as the body.
+import argparse
+import asyncio
+import importlib.util
+import json
+import os
+import platform
+import subprocess
+import time
+from collections import defaultdict
+import httpx
+import numpy as np
+import pandas as pd
+
+# Share of each request type in the synthetic mix ('lexical' is left out when no lexical bundle is loaded)
+DEFAULT_MIX = {'known': 0.6, 'unknown': 0.1, 'interests': 0.1, 'lexical': 0.05, 'batch': 0.1, 'interaction': 0.05}
+
+
+def load_api(path='04_recommendation_api.py'):
+    """Imports the API script (its file name is not a valid module name). Reads RECOMMENDER_* on import."""
+    spec = importlib.util.spec_from_file_location('recommendation_api', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def request_label(method, path, body):
+    """Groups requests for the per-type breakdown: endpoint, plus retrieval mode and free text when present."""
+    if path.startswith('/users/'):
+        path = '/users/{user_id}/interactions'
+    label = f"{method} {path}"
+    if isinstance(body, dict) and path == '/recommendations':
+        label += f" [{body.get('retrieval', 'semantic')}{', interests' if body.get('interests') else ''}]"
+    return label
+
+
+def load_replay(path):
+    requests = []
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            body = entry.get('json', entry if 'path' not in entry and 'method' not in entry else None)
+            requests.append((entry.get('method', 'POST').upper(), entry.get('path', '/recommendations'), body))
+    return requests
+
+
+def synthetic_requests(n_requests, mix, course_ids, seed=0):
+    """
+    A random request mix over the students of the data set, plus unknown users and free-text interests.
+    Recorded interactions pick from `course_ids`, the served catalog, so they reach fold-in and the taken-course filter.
+    """
+    rng = np.random.default_rng(seed)
+    user_ids = pd.read_csv('data/student_preferences_cleaned.csv', dtype={'user_id': str})['user_id'].tolist()
+    interests = pd.read_csv('data/student_preferences_cleaned.csv')['interests_combined'].dropna().tolist()
+    kinds = rng.choice(list(mix), n_requests, p=np.array(list(mix.values())) / sum(mix.values()))
+
+    requests = []
+    for kind in kinds:
+        user_id = str(rng.choice(user_ids))
+        if kind == 'known':
+            requests.append(('POST', '/recommendations', {'user_id': user_id, 'top_n': 10}))
+        elif kind == 'unknown':
+            requests.append(('POST', '/recommendations', {'user_id': f"new-{rng.integers(1_000_000)}", 'top_n': 10}))
+        elif kind == 'interests':
+            requests.append(('POST', '/recommendations', {'user_id': user_id, 'top_n': 10, 'interests': str(rng.choice(interests))}))
+        elif kind == 'lexical':
+            requests.append(('POST', '/recommendations', {'user_id': user_id, 'top_n': 10, 'retrieval': 'lexical'}))
+        elif kind == 'batch':
+            users = [{'user_id': str(u), 'top_n': 10} for u in rng.choice(user_ids, 16)]
+            requests.append(('POST', '/recommendations/batch', {'users': users}))
+        elif kind == 'interaction':
+            interaction = {'course_id': str(rng.choice(course_ids)), 'rating': float(rng.integers(1, 11))}
+            requests.append(('POST', f"/users/{user_id}/interactions", {'interactions': [interaction]}))
+    return requests
+
+
+class StageTimer:
+    """Accumulates wall-clock time and calls per serving stage, by wrapping the live objects' methods."""
+
+    def __init__(self):
+        self.seconds = defaultdict(float)
+        self.calls = defaultdict(int)
+
+    def wrap(self, obj, method, stage):
+        original = getattr(obj, method)
+        if asyncio.iscoroutinefunction(original):
+            async def timed(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await original(*args, **kwargs)
+                finally:
+                    self.seconds[stage] += time.perf_counter() - start
+                    self.calls[stage] += 1
+        else:
+            def timed(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return original(*args, **kwargs)
+                finally:
+                    self.seconds[stage] += time.perf_counter() - start
+                    self.calls[stage] += 1
+        setattr(obj, method, timed)
+
+    def reset(self):
+        self.seconds.clear()
+        self.calls.clear()
+
+
+async def run_level(client, requests, concurrency):
+    """Sends every request from `concurrency` closed-loop workers; returns (seconds, [(label, status, ms)])."""
+    queue = iter(requests)
+    samples = []
+
+    async def worker():
+        for method, path, body in queue:
+            start = time.perf_counter()
+            response = await client.request(method, path, json=body)
+            samples.append((request_label(method, path, body), response.status_code, (time.perf_counter() - start) * 1000))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return time.perf_counter() - start, samples
+
+
+def latency_stats(latencies):
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {'count': len(latencies), 'mean_ms': float(np.mean(latencies)), 'p50_ms': float(p50),
+            'p95_ms': float(p95), 'p99_ms': float(p99), 'max_ms': float(np.max(latencies))}
+
+
+def summarize(seconds, samples, stages):
+    latencies = np.array([ms for _, _, ms in samples])
+    by_label = defaultdict(list)
+    for label, _, ms in samples:
+        by_label[label].append(ms)
+    status_counts = defaultdict(int)
+    for _, status, _ in samples:
+        status_counts[str(status)] += 1
+    return {
+        'requests_per_second': len(samples) / seconds,
+        'seconds': seconds,
+        **latency_stats(latencies),
+        'status_counts': dict(status_counts),
+        'by_label': {label: latency_stats(np.array(values)) for label, values in sorted(by_label.items())},
+        # Stage time can overlap between concurrent requests; per-call means are the comparable figure
+        'stages': {stage: {'calls': stages.calls[stage], 'mean_ms': stages.seconds[stage] * 1000 / stages.calls[stage],
+                           'ms_per_request': stages.seconds[stage] * 1000 / len(samples)}
+                   for stage in sorted(stages.calls)},
+    }
+
+
+def print_level(concurrency, summary):
+    print(f"\n--- Concurrency {concurrency}: {summary['count']} requests in {summary['seconds']:.2f}s, "
+          f"{summary['requests_per_second']:.1f} req/s, statuses {summary['status_counts']} ---")
+    print(f"{'request type':<48} {'count':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for label, stats in [('all', summary), *summary['by_label'].items()]:
+        print(f"{label:<48} {stats['count']:>6} {stats['p50_ms']:>8.2f} {stats['p95_ms']:>8.2f} {stats['p99_ms']:>8.2f}")
+    for stage, stats in summary['stages'].items():
+        print(f"stage {stage:<12} {stats['calls']:>6} calls, {stats['mean_ms']:.3f} ms/call, {stats['ms_per_request']:.3f} ms/request")
+
+
+def print_comparison(results, baseline_path):
+    """Relative change of throughput and latency percentiles per concurrency level against a saved run."""
+    with open(baseline_path) as f:
+        baseline = {level['concurrency']: level for level in json.load(f)['levels']}
+    print(f"\n--- Compared with {baseline_path} (relative change; higher latency is worse) ---")
+    print(f"{'concurrency':>11} {'req/s':>9} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for level in results['levels']:
+        before = baseline.get(level['concurrency'])
+        if before is None:
+            continue
+        change = lambda key: f"{(level[key] / before[key] - 1) * 100:+.1f}%"
+        print(f"{level['concurrency']:>11} {change('requests_per_second'):>9} {change('p50_ms'):>9} "
+              f"{change('p95_ms'):>9} {change('p99_ms'):>9}")
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def reset_server_state(api, stages):
+    """
+    Puts the server back in its startup state between levels: interaction writes record ratings and
+    fold users in, which would otherwise carry over. Reloads the bundle and empties the caches.
+    """
+    api.app.state.recorded_interactions = {}
+    api._install_bundle(api._load_model_bundle())
+    api.app.state.result_cache.clear()
+    stages.wrap(api.app.state.bundle.recommender, 'recommend', 'score')
+
+
+async def run_benchmark(args):
+    api = load_api()
+    stages = StageTimer()
+    async with api.app.router.lifespan_context(api.app):
+        if api.app.state.bundle is None:
+            raise SystemExit("The recommender failed to load; see the log above.")
+        mix = args.mix
+        if api.app.state.bundle.versions['lexical'] is None and mix.get('lexical'):
+            # Lexical requests would all be 503s without a lexical bundle
+            print("No lexical bundle loaded; leaving 'lexical' requests out of the mix.")
+            mix = {kind: share for kind, share in mix.items() if kind != 'lexical'}
+        if args.replay:
+            requests = load_replay(args.replay)
+        else:
+            requests = synthetic_requests(args.n_requests, mix, list(api.app.state.bundle.recommender.course_ids), args.seed)
+        source = args.replay or f"synthetic mix {mix}"
+        print(f"--- {len(requests)} requests from {source} ---")
+
+        # Requests with interests need the encoder; measure serving, not the encoder's startup
+        if any(isinstance(body, dict) and body.get('interests') for _, _, body in requests):
+            text_encoder = await api._get_text_encoder()
+            if text_encoder is None:
+                print("WARNING: the sentence encoder failed to load; requests with interests will return 503.")
+            else:
+                stages.wrap(text_encoder, 'encode_async', 'encode')
+
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+            stages.wrap(api.app.state.bundle.recommender, 'recommend', 'score')
+            await run_level(client, requests[:args.warmup], min(args.concurrency))
+            results = {
+                'config': {'source': source, 'requests': len(requests), 'warmup': args.warmup,
+                           'env': {k: v for k, v in os.environ.items() if k.startswith('RECOMMENDER_')}},
+                'environment': {'git_commit': git_commit(), 'python': platform.python_version(),
+                                'cpu_count': os.cpu_count(), 'artifact_versions': api.app.state.bundle.versions},
+                'levels': [],
+            }
+            for concurrency in args.concurrency:
+                # Every level starts from the same server state (no recorded interactions or fold-ins)
+                reset_server_state(api, stages)
+                stages.reset()
+                seconds, samples = await run_level(client, requests, concurrency)
+                summary = {'concurrency': concurrency, **summarize(seconds, samples, stages),
+                           'result_cache': (await client.get('/cache/stats')).json()}
+                results['levels'].append(summary)
+                print_level(concurrency, summary)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    if args.compare:
+        print_comparison(results, args.compare)
+
+
+def parse_list(value):
+    return [int(v) for v in value.split(',')]
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(','):
+        kind, share = part.split('=')
+        if kind not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"Unknown request type '{kind}'; choose from {list(DEFAULT_MIX)}.")
+        mix[kind] = float(share)
+    return mix
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="In-process load test and request replay for the recommendation API.")
+    parser.add_argument('--replay', help="JSONL request log to replay instead of the synthetic mix.")
+    parser.add_argument('--requests', dest='n_requests', type=int, default=2000, help="Synthetic requests per level.")
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX, help="e.g. known=0.8,interests=0.2")
+    parser.add_argument('--concurrency', type=parse_list, default=[1, 8, 32])
+    parser.add_argument('--warmup', type=int, default=50, help="Requests sent before measuring.")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="Write the results as JSON.")
+    parser.add_argument('--compare', help="A previous --output file to compare against.")
+    asyncio.run(run_benchmark(parser.parse_args()))
@@ -0,0 +1,91 @@
+# Filename: bench_cf_trainers.py
+# Surprise SVD vs. the NumPy ALS trainer: rating-prediction parity on the same folds, then training
+# time and peak memory as the number of interactions grows (synthetic ratings).
+#
+#   python bench_cf_trainers.py --sizes 10000,100000,1000000 --threads 4
+import argparse
+import multiprocessing
+import resource
+import time
+import numpy as np
+import pandas as pd
+
+from als import ALS
+from cf_evaluation import cross_validate_cf, fit_predict_als, fit_predict_surprise
+
+# Same settings as 03_train_collaborative_filtering.py
+SURPRISE_PARAMS = dict(n_factors=100, n_epochs=20, lr_all=0.005, reg_all=0.04, random_state=42)
+ALS_PARAMS = dict(n_factors=100, n_epochs=15, reg=0.5, random_state=42)
+
+
+def make_surprise():
+    from surprise import SVD
+    return SVD(**SURPRISE_PARAMS)
+
+
+def synthetic_interactions(n_ratings, seed=0):
+    """Ratings on the 1-10 scale from a planted low-rank model; ~20 ratings per user."""
+    rng = np.random.default_rng(seed)
+    n_users, n_items = max(n_ratings // 20, 10), max(n_ratings // 200, 50)
+    users = rng.integers(0, n_users, n_ratings)
+    items = rng.zipf(1.3, n_ratings) % n_items  # A few popular courses, a long tail
+    # Only the rated cells of the taste matrix are formed, so the data set does not dominate peak memory
+    user_taste, item_taste = rng.normal(0, 1, (n_users, 8)), rng.normal(0, 1, (8, n_items))
+    taste = np.einsum('rf,fr->r', user_taste[users], item_taste[:, items]) / 3
+    ratings = np.clip(np.rint(6 + taste + rng.normal(0, 1, n_ratings)), 1, 10)
+    return pd.DataFrame({'user_id': users.astype(str), 'course_id': items.astype(str), 'rating': ratings})
+
+
+def _train(trainer, n_ratings, n_threads, queue):
+    df = synthetic_interactions(n_ratings)
+    start = time.perf_counter()
+    if trainer == 'surprise':
+        from surprise import Dataset, Reader
+        trainset = Dataset.load_from_df(df, Reader(rating_scale=(1, 10))).build_full_trainset()
+        make_surprise().fit(trainset)
+    else:
+        ALS(n_threads=n_threads, **ALS_PARAMS).fit(df['user_id'], df['course_id'], df['rating'])
+    seconds = time.perf_counter() - start
+    queue.put((seconds, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024))
+
+
+def train_in_subprocess(trainer, n_ratings, n_threads):
+    """Trains in a fresh process so peak memory is the trainer's own. Returns (seconds, peak MiB)."""
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_train, args=(trainer, n_ratings, n_threads, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def run_benchmark(args):
+    df = pd.read_csv('data/student_interactions_cleaned.csv', dtype={'user_id': str})
+    print(f"--- Parity on {len(df)} interactions, {args.folds}-fold CV (same folds for both) ---")
+    fits = {
+        'surprise': lambda train, test: fit_predict_surprise(make_surprise, train, test),
+        'als': lambda train, test: fit_predict_als(lambda: ALS(n_threads=args.threads, **ALS_PARAMS), train, test),
+    }
+    print(f"{'trainer':>9} {'RMSE':>7} {'MAE':>7}   per-fold RMSE")
+    for trainer, fit_predict in fits.items():
+        scores = np.array(cross_validate_cf(fit_predict, df, args.folds))
+        print(f"{trainer:>9} {scores[:, 0].mean():>7.4f} {scores[:, 1].mean():>7.4f}   {np.round(scores[:, 0], 4).tolist()}")
+
+    print(f"\n--- Training time vs. interactions (synthetic, ALS on {args.threads} thread(s)) ---")
+    print(f"{'ratings':>9} {'trainer':>9} {'seconds':>8} {'peak MiB':>9}")
+    for n_ratings in args.sizes:
+        for trainer in ('surprise', 'als'):
+            seconds, peak = train_in_subprocess(trainer, n_ratings, args.threads)
+            print(f"{n_ratings:>9} {trainer:>9} {seconds:>8.2f} {peak:>9.0f}")
+
+
+def parse_list(value):
+    return [int(v) for v in value.split(',')]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the Surprise SVD and NumPy ALS CF trainers.")
+    parser.add_argument('--sizes', type=parse_list, default=[10000, 100000, 1000000])
+    parser.add_argument('--folds', type=int, default=5)
+    parser.add_argument('--threads', type=int, default=1)
+    run_benchmark(parser.parse_args())
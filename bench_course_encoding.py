@@ -0,0 +1,77 @@
+# Filename: bench_course_encoding.py
+# Compares the single-pass course encode with chunked, length-sorted encoding.
+#
+#   python bench_course_encoding.py --batch-size 32 --repeat 3
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from sentence_transformers import SentenceTransformer
+
+from chunked_encoding import chunk_text, encode_chunked, max_chunk_tokens
+
+
+def load_course_texts():
+    """The same `content_full` text 02_preprocess_and_vectorize_bert.py encodes."""
+    df = pd.read_csv('data/courses_iiitd.csv')
+    tags = df['suitable tags'].fillna('').astype(str) if 'suitable tags' in df.columns else ''
+    return (df['course_name'].fillna('') + ' . ' + df['description'].fillna('') + ' . ' + tags).tolist()
+
+
+def padding_overhead(token_counts, batch_size):
+    """Padded tokens / real tokens when texts are batched in the given order."""
+    padded = sum(max(batch) * len(batch) for batch in
+                 (token_counts[i:i + batch_size] for i in range(0, len(token_counts), batch_size)))
+    return padded / max(sum(token_counts), 1)
+
+
+def run_benchmark(args):
+    print(f"Loading Sentence-BERT model ({args.model})...")
+    model = SentenceTransformer(args.model)
+    texts = load_course_texts()
+    max_tokens = max_chunk_tokens(model)
+    model.encode(texts[:8])  # Warm up
+
+    token_counts = [len(ids) for ids in model.tokenizer(texts, add_special_tokens=False)['input_ids']]
+    truncated = sum(n > max_tokens for n in token_counts)
+    dropped = sum(max(n - max_tokens, 0) for n in token_counts)
+    chunk_counts = [n for text in texts for _, n in chunk_text(model.tokenizer, text, max_tokens)]
+    print(f"\n--- {len(texts)} course texts, {sum(token_counts)} tokens, max sequence {max_tokens} tokens ---")
+    print(f"Single pass truncates {truncated} texts, dropping {dropped} tokens ({dropped / sum(token_counts):.1%}).")
+    # model.encode orders its input by character length; chunks are ordered by token count
+    by_chars = [min(token_counts[i], max_tokens) for i in np.argsort([-len(text) for text in texts], kind='stable')]
+    print(f"Padding overhead at batch size {args.batch_size}: single pass {padding_overhead(by_chars, args.batch_size):.2f}x, "
+          f"token-sorted chunks {padding_overhead(sorted(chunk_counts), args.batch_size):.2f}x")
+
+    modes = {
+        'single-pass': lambda: model.encode(texts, batch_size=args.batch_size),
+        'chunked': lambda: encode_chunked(model, texts, args.batch_size, max_tokens)[0],
+    }
+    # Tokens each mode actually runs through the model (the single pass never sees the truncated tail)
+    encoded_tokens = {'single-pass': sum(min(n, max_tokens) for n in token_counts), 'chunked': sum(chunk_counts)}
+    print(f"\n{'mode':>12} {'seconds':>8} {'texts/s':>8} {'tokens/s':>9} {'tokens kept':>12}")
+    results = {}
+    for mode, encode in modes.items():
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            results[mode] = encode()
+            timings.append(time.perf_counter() - start)
+        seconds = min(timings)
+        kept = encoded_tokens[mode] / sum(token_counts)
+        print(f"{mode:>12} {seconds:>8.2f} {len(texts) / seconds:>8.1f} {encoded_tokens[mode] / seconds:>9.0f} {kept:>12.1%}")
+
+    # How much the full-text vectors move relative to the truncated ones (short texts should not move)
+    single, chunked = (r / np.linalg.norm(r, axis=1, keepdims=True) for r in (results['single-pass'], results['chunked']))
+    cosine = (single * chunked).sum(axis=1)
+    short = np.array(token_counts) <= max_tokens
+    print(f"\nCosine(single-pass, chunked): texts that fit {cosine[short].min():.4f} (min), "
+          f"truncated texts {cosine[~short].mean() if truncated else float('nan'):.4f} (mean)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark chunked, length-sorted course encoding against a single-pass encode.")
+    parser.add_argument('--model', default='all-MiniLM-L6-v2')
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per mode; the fastest is reported.")
+    run_benchmark(parser.parse_args())
@@ -0,0 +1,92 @@
+# Filename: bench_embedding_precision.py
+# Memory, scan speed and ranking agreement of reduced-precision course embeddings vs. float32.
+#
+#   python bench_embedding_precision.py                      # the served bundle, all students
+#   python bench_embedding_precision.py --synthetic 200000   # a synthetic catalog of that size
+import argparse
+import time
+import numpy as np
+import pandas as pd
+
+from artifacts import load_bundle
+from bench_ann import synthetic_embeddings
+from quantized_embeddings import PRECISIONS, QuantizedEmbeddings
+from scoring import CFFactors, HybridRecommender, TakenCourseIndex, l2_normalize_rows
+
+
+class _NoCF:
+    """Neutral CF stage for synthetic catalogs: every course gets the same estimate."""
+
+    def __init__(self, n_courses):
+        self.n_courses = n_courses
+
+    def estimate_many(self, user_ids, course_idx=None):
+        return np.full((len(user_ids), self.n_courses), 5.5)
+
+
+def build_recommenders(args):
+    """Returns (float32 recommender, user ids, course matrix) for the served bundle or a synthetic catalog."""
+    if args.synthetic:
+        courses = l2_normalize_rows(synthetic_embeddings(args.synthetic, 384, max(10, args.synthetic // 500), seed=0))
+        students = l2_normalize_rows(synthetic_embeddings(args.queries, 384, max(10, args.synthetic // 500), seed=1))
+        user_ids = [str(i) for i in range(len(students))]
+        course_ids = [str(i) for i in range(len(courses))]
+        taken = TakenCourseIndex.from_pairs(np.array([], dtype=str), np.array([], dtype=np.int64), len(courses))
+        cf = _NoCF(len(courses))
+    else:
+        content, _ = load_bundle('models/content_based')
+        cf_arrays, cf_manifest = load_bundle('models/collaborative_filtering')
+        courses, students = content['course_embeddings'], content['student_embeddings']
+        course_ids, user_ids = content['course_ids'].tolist(), content['user_ids'].tolist()
+        course_idx = {course_id: i for i, course_id in enumerate(course_ids)}
+        interactions = pd.read_csv('data/student_interactions_cleaned.csv', dtype={'user_id': str})
+        taken = TakenCourseIndex.from_pairs(
+            interactions['user_id'].to_numpy(),
+            interactions['course_id'].map(course_idx).fillna(-1).astype('int64').to_numpy(), len(course_ids),
+        )
+        cf = CFFactors.from_bundle(cf_arrays, cf_manifest, course_ids)
+    recommender = HybridRecommender(course_ids, courses, user_ids, students, cf, taken)
+    return recommender, user_ids, courses
+
+
+def timed_recommend(recommender, user_ids, k, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        results = recommender.recommend(user_ids, [k] * len(user_ids))
+        best = min(best, time.perf_counter() - start)
+    return results, best
+
+
+def run_benchmark(args):
+    exact, user_ids, courses = build_recommenders(args)
+    print(f"--- {courses.shape[0]} courses x {courses.shape[1]} dims, {len(user_ids)} users, top-{args.k} ---")
+    reference, exact_seconds = timed_recommend(exact, user_ids, args.k, args.repeat)
+
+    print(f"\n{'precision':>9} {'scan MiB':>9} {'saved':>6} {'ms/user':>8} {'speedup':>8} {'shortlist':>9} "
+          f"{'same top-k':>10} {'max |dscore|':>12}")
+    print(f"{'float32':>9} {courses.nbytes / 2**20:>9.2f} {'':>6} {exact_seconds * 1000 / len(user_ids):>8.3f}")
+    for precision in PRECISIONS:
+        quantized = QuantizedEmbeddings.from_float(courses, precision)
+        rescored = HybridRecommender(
+            exact.course_ids, courses, user_ids, exact.student_embeddings, exact.cf_factors, exact.taken_courses,
+            scan_embeddings=quantized,
+        )
+        results, seconds = timed_recommend(rescored, user_ids, args.k, args.repeat)
+
+        shortlist = rescored.rescored_rows / (args.repeat * len(user_ids))
+        same = np.mean([[c for c, _ in a] == [c for c, _ in b] for a, b in zip(results, reference)])
+        delta = max((abs(sa - sb) for a, b in zip(results, reference) for (_, sa), (_, sb) in zip(a, b)), default=0.0)
+        print(f"{precision:>9} {quantized.nbytes / 2**20:>9.2f} {1 - quantized.nbytes / courses.nbytes:>6.0%} "
+              f"{seconds * 1000 / len(user_ids):>8.3f} {exact_seconds / seconds:>7.2f}x {shortlist:>9.1f} "
+              f"{same:>10.1%} {delta:>12.2e}")
+    print("\n'shortlist' is the number of courses re-scored in float32 per user.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark reduced-precision course embeddings with exact re-scoring.")
+    parser.add_argument('--synthetic', type=int, default=0, help="Number of synthetic courses (0 = the served bundle).")
+    parser.add_argument('--queries', type=int, default=256, help="Number of synthetic users.")
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per precision; the fastest is reported.")
+    run_benchmark(parser.parse_args())
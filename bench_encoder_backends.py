@@ -0,0 +1,72 @@
+# Filename: bench_encoder_backends.py
+# Parity and throughput of the int8-quantized sentence encoder against the fp32 one.
+#
+#   python bench_encoder_backends.py --online-requests 200
+import argparse
+import time
+import numpy as np
+import pandas as pd
+
+from bench_course_encoding import load_course_texts
+from encoder import ENCODER_BACKENDS, load_sentence_model
+from scoring import l2_normalize_rows, top_n_indices
+
+
+def load_student_texts():
+    return pd.read_csv('data/student_preferences_cleaned.csv')['interests_combined'].dropna().tolist()
+
+
+def online_latencies(model, texts, n_requests):
+    """One-sentence encodes, as the API issues them without micro-batching; latencies in ms."""
+    latencies = []
+    for i in range(n_requests):
+        start = time.perf_counter()
+        model.encode([texts[i % len(texts)]])
+        latencies.append((time.perf_counter() - start) * 1000)
+    return np.array(latencies)
+
+
+def run_benchmark(args):
+    courses, students = load_course_texts(), load_student_texts()
+    # Online inputs: the students' interests plus short course titles
+    online_texts = students + pd.read_csv('data/courses_iiitd.csv')['course_name'].dropna().tolist()
+
+    embeddings = {}
+    print(f"{'backend':>11} {'corpus s':>9} {'texts/s':>8} {'online p50 ms':>14} {'p95 ms':>8} {'sentences/s':>12}")
+    for backend in ENCODER_BACKENDS:
+        model = load_sentence_model(args.model, backend)
+        model.encode(courses[:8])  # Warm up
+
+        start = time.perf_counter()
+        course_vectors = model.encode(courses, batch_size=args.batch_size)
+        corpus_seconds = time.perf_counter() - start
+        embeddings[backend] = (l2_normalize_rows(course_vectors), l2_normalize_rows(model.encode(students)))
+
+        latencies = online_latencies(model, online_texts, args.online_requests)
+        p50, p95 = np.percentile(latencies, [50, 95])
+        print(f"{backend:>11} {corpus_seconds:>9.2f} {len(courses) / corpus_seconds:>8.1f} "
+              f"{p50:>14.2f} {p95:>8.2f} {1000 / latencies.mean():>12.1f}")
+
+    # Parity: per-text cosine between the backends, and overlap of each student's content top-k
+    (ref_courses, ref_students), (q_courses, q_students) = embeddings['torch'], embeddings['torch-int8']
+    course_cos = (ref_courses * q_courses).sum(axis=1)
+    student_cos = (ref_students * q_students).sum(axis=1)
+    overlaps = []
+    for ref_student, q_student in zip(ref_students, q_students):
+        ref_top = set(top_n_indices(ref_courses @ ref_student, args.k).tolist())
+        q_top = set(top_n_indices(q_courses @ q_student, args.k).tolist())
+        overlaps.append(len(ref_top & q_top) / args.k)
+
+    print("\n--- Parity of torch-int8 with fp32 ---")
+    print(f"Course cosine:  mean {course_cos.mean():.4f}, min {course_cos.min():.4f} ({len(courses)} texts)")
+    print(f"Student cosine: mean {student_cos.mean():.4f}, min {student_cos.min():.4f} ({len(students)} texts)")
+    print(f"Top-{args.k} content overlap per student: mean {np.mean(overlaps):.3f}, min {np.min(overlaps):.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the fp32 and int8-quantized sentence encoders.")
+    parser.add_argument('--model', default='all-MiniLM-L6-v2')
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--online-requests', type=int, default=200)
+    parser.add_argument('--k', type=int, default=10)
+    run_benchmark(parser.parse_args())
@@ -0,0 +1,73 @@
+# Filename: bench_encoder_batching.py
+# Compares one-sentence-per-call encoding with the API's micro-batching encoder under concurrency.
+#
+#   python bench_encoder_batching.py --concurrency 1,4,16,64 --requests 512
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from sentence_transformers import SentenceTransformer
+
+from encoder import MicroBatchEncoder
+
+
+def load_texts():
+    """Realistic online inputs: student interest strings and course titles."""
+    interests = pd.read_csv('data/student_preferences_cleaned.csv')['interests_combined'].dropna().tolist()
+    titles = pd.read_csv('data/courses_iiitd.csv')['course_name'].dropna().tolist()
+    return interests + titles
+
+
+def run_level(encode_one, texts, concurrency, n_requests):
+    """Runs `n_requests` encodes from `concurrency` threads; returns (encodes/sec, latencies in ms)."""
+    def timed(i):
+        start = time.perf_counter()
+        encode_one(texts[i % len(texts)])
+        return (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(timed, range(n_requests)))
+    return n_requests / (time.perf_counter() - start), np.array(latencies)
+
+
+def run_benchmark(args):
+    print(f"Loading Sentence-BERT model ({args.model})...")
+    model = SentenceTransformer(args.model)
+    texts = load_texts()
+    model.encode(texts[:8])  # Warm up
+
+    batcher = MicroBatchEncoder(model, args.max_batch, args.max_wait_ms, max_queue_size=args.n_requests)
+    batcher.start()
+    modes = {
+        'unbatched': lambda text: model.encode([text]),
+        'batched': lambda text: batcher.submit(text).result(),
+    }
+
+    print(f"\n--- {args.n_requests} encodes per level, max batch {args.max_batch}, max wait {args.max_wait_ms} ms ---")
+    print(f"{'concurrency':>11} {'mode':>10} {'encodes/s':>10} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    try:
+        for concurrency in args.concurrency:
+            for mode, encode_one in modes.items():
+                throughput, latencies = run_level(encode_one, texts, concurrency, args.n_requests)
+                p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+                print(f"{concurrency:>11} {mode:>10} {throughput:>10.1f} {p50:>8.2f} {p95:>8.2f} {p99:>8.2f}")
+    finally:
+        batcher.stop()
+    if batcher.batches:
+        print(f"\nBatched mode ran {batcher.batches} batches, {batcher.encoded / batcher.batches:.1f} texts per batch on average.")
+
+
+def parse_list(value):
+    return [int(v) for v in value.split(',')]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark micro-batched vs. unbatched online sentence encoding.")
+    parser.add_argument('--model', default='all-MiniLM-L6-v2')
+    parser.add_argument('--concurrency', type=parse_list, default=[1, 4, 16, 64])
+    parser.add_argument('--requests', dest='n_requests', type=int, default=512)
+    parser.add_argument('--max-batch', type=int, default=32)
+    parser.add_argument('--max-wait-ms', type=float, default=5.0)
+    run_benchmark(parser.parse_args())
@@ -0,0 +1,64 @@
+# Filename: bench_text_normalization.py
+# Compares the old per-row `preprocess_text` with the shared, memoized, multi-process normalizer
+# over the TF-IDF pipelines' corpus (course content plus student preferences), and checks that both
+# produce identical output.
+#
+#   python bench_text_normalization.py --jobs 1,4,8 --copies 20
+import argparse
+import os
+import re
+import time
+import nltk
+import pandas as pd
+
+from text_normalization import normalize_corpus
+
+
+def legacy_preprocess_text(text, min_token_length=0):
+    """The per-row function the pipelines used before, kept here as the reference."""
+    if pd.isna(text): return ""
+    text = str(text).lower()
+    text = re.sub(r'[^\w\s]', '', text)
+    tokens = nltk.word_tokenize(text)
+    stop_words = set(nltk.corpus.stopwords.words('english'))
+    lemmatizer = nltk.stem.WordNetLemmatizer()
+    tokens = [lemmatizer.lemmatize(w) for w in tokens if w not in stop_words and w.isalpha() and len(w) >= min_token_length]
+    return " ".join(tokens)
+
+
+def load_corpus(copies):
+    courses = pd.read_csv('data/courses.csv')
+    content = (courses['name'].fillna('') + ' ' + courses['description'].fillna('') + ' ' + courses['prerequisites'].fillna(''))
+    interests = pd.read_csv('data/student_preferences_cleaned.csv')['interests_combined']
+    # Repeating the corpus stands in for a larger catalog (and gives the lemma memo realistic reuse)
+    return (content.tolist() + interests.tolist()) * copies
+
+
+def run_benchmark(args):
+    texts = load_corpus(args.copies)
+    print(f"--- {len(texts)} texts ({args.copies} copies of courses + preferences), chunk size {args.chunk_size} ---")
+
+    for min_token_length in (0, 3):
+        start = time.perf_counter()
+        reference = [legacy_preprocess_text(text, min_token_length) for text in texts]
+        legacy_seconds = time.perf_counter() - start
+        print(f"\nmin_token_length={min_token_length}: per-row preprocess_text {legacy_seconds:.2f}s")
+
+        print(f"{'jobs':>5} {'seconds':>8} {'speedup':>8} {'identical':>10}")
+        for n_jobs in args.jobs:
+            start = time.perf_counter()
+            normalized = normalize_corpus(texts, min_token_length, n_jobs, args.chunk_size)
+            seconds = time.perf_counter() - start
+            print(f"{n_jobs:>5} {seconds:>8.2f} {legacy_seconds / seconds:>7.1f}x {str(normalized == reference):>10}")
+
+
+def parse_list(value):
+    return [int(v) for v in value.split(',')]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the shared text normalizer against per-row preprocessing.")
+    parser.add_argument('--jobs', type=parse_list, default=sorted({1, 4, os.cpu_count() or 1}))
+    parser.add_argument('--copies', type=int, default=20, help="Times the corpus is repeated.")
+    parser.add_argument('--chunk-size', type=int, default=256)
+    run_benchmark(parser.parse_args())
@@ -0,0 +1,44 @@
+# Filename: cf_evaluation.py
+# Rating-prediction evaluation shared by the CF trainers, so Surprise and ALS are scored on the
+# exact same folds.
+import numpy as np
+
+RATING_COLUMNS = ['user_id', 'course_id', 'rating']
+
+
+def kfold_splits(n_rows, n_splits=5, random_state=42):
+    """Yields (train_idx, test_idx) over a shuffled permutation of the rows, like surprise's KFold."""
+    order = np.random.default_rng(random_state).permutation(n_rows)
+    bounds = np.linspace(0, n_rows, n_splits + 1).astype(int)
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        yield np.sort(np.concatenate([order[:start], order[stop:]])), np.sort(order[start:stop])
+
+
+def rmse_mae(ratings, estimates):
+    errors = np.asarray(ratings, dtype=np.float64) - np.asarray(estimates, dtype=np.float64)
+    return float(np.sqrt(np.mean(errors ** 2))), float(np.mean(np.abs(errors)))
+
+
+def fit_predict_surprise(make_algo, train_df, test_df, rating_scale=(1, 10)):
+    """Fits a fresh Surprise algorithm on `train_df` and returns its estimates for `test_df`."""
+    from surprise import Dataset, Reader
+
+    trainset = Dataset.load_from_df(train_df[RATING_COLUMNS], Reader(rating_scale=rating_scale)).build_full_trainset()
+    algo = make_algo()
+    algo.fit(trainset)
+    return np.array([algo.predict(str(u), str(i)).est for u, i in zip(test_df['user_id'], test_df['course_id'])])
+
+
+def fit_predict_als(make_model, train_df, test_df):
+    """Fits a fresh `als.ALS` on `train_df` and returns its estimates for `test_df`."""
+    model = make_model().fit(train_df['user_id'], train_df['course_id'], train_df['rating'])
+    return model.predict_many(test_df['user_id'], test_df['course_id'])
+
+
+def cross_validate_cf(fit_predict, interactions_df, n_splits=5, random_state=42):
+    """Returns [(rmse, mae), ...] per fold of `fit_predict(train_df, test_df) -> estimates`."""
+    scores = []
+    for train_idx, test_idx in kfold_splits(len(interactions_df), n_splits, random_state):
+        train_df, test_df = interactions_df.iloc[train_idx], interactions_df.iloc[test_idx]
+        scores.append(rmse_mae(test_df['rating'], fit_predict(train_df, test_df)))
+    return scores
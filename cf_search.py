@@ -0,0 +1,133 @@
+# Filename: cf_search.py
+# Hyperparameter search for the CF trainers: configs x folds evaluated over a process pool on one set
+# of fold splits, with unpromising configs dropped after the first folds (successive halving).
+import itertools
+import math
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+from cf_evaluation import fit_predict_als, fit_predict_surprise, kfold_splits, rmse_mae
+
+# Settings 03_train_collaborative_filtering.py trains with when no search is run
+DEFAULT_PARAMS = {
+    'surprise': {'n_factors': 100, 'n_epochs': 20, 'lr_all': 0.005, 'reg_all': 0.04},
+    'als': {'n_factors': 100, 'n_epochs': 15, 'reg': 0.5},
+}
+
+SEARCH_SPACES = {
+    'surprise': {
+        'n_factors': [20, 50, 100, 200],
+        'n_epochs': [20, 40],
+        'lr_all': [0.002, 0.005, 0.01],
+        'reg_all': [0.02, 0.04, 0.1, 0.2],
+    },
+    'als': {
+        'n_factors': [20, 50, 100],
+        'n_epochs': [10, 15],
+        'reg': [0.1, 0.2, 0.5, 1.0, 2.0],
+    },
+}
+
+
+def make_model(trainer, params, n_threads=1):
+    """A fresh, unfitted model of `trainer` ('surprise' or 'als') with `params`."""
+    if trainer == 'surprise':
+        from surprise import SVD
+        return SVD(random_state=42, **params)
+    from als import ALS
+    return ALS(n_threads=n_threads, random_state=42, **params)
+
+
+def fit_predict(trainer, params, train_df, test_df, n_threads=1):
+    """Fits `trainer` with `params` on `train_df` and returns its estimates for `test_df`."""
+    if trainer == 'surprise':
+        return fit_predict_surprise(lambda: make_model(trainer, params), train_df, test_df)
+    return fit_predict_als(lambda: make_model(trainer, params, n_threads), train_df, test_df)
+
+
+def sample_configs(space, mode='grid', n_configs=20, random_state=42):
+    """Every combination of `space` ('grid'), or `n_configs` distinct ones drawn at random ('random')."""
+    names = list(space)
+    grid = [dict(zip(names, values)) for values in itertools.product(*(space[name] for name in names))]
+    if mode == 'grid' or n_configs >= len(grid):
+        return grid
+    picked = np.random.default_rng(random_state).choice(len(grid), n_configs, replace=False)
+    return [grid[i] for i in sorted(picked)]
+
+
+# Per-process copies of the data and folds, sent once per worker instead of once per task
+_worker_state = None
+
+
+def _init_worker(interactions_df, splits, n_threads):
+    global _worker_state
+    _worker_state = (interactions_df, splits, n_threads)
+
+
+def _evaluate(task):
+    """Scores one (config, fold) pair; returns (config index, fold, rmse, mae, seconds)."""
+    trainer, config_idx, params, fold = task
+    interactions_df, splits, n_threads = _worker_state
+    train_idx, test_idx = splits[fold]
+    train_df, test_df = interactions_df.iloc[train_idx], interactions_df.iloc[test_idx]
+    start = time.perf_counter()
+    rmse, mae = rmse_mae(test_df['rating'], fit_predict(trainer, params, train_df, test_df, n_threads))
+    return config_idx, fold, rmse, mae, time.perf_counter() - start
+
+
+def search_cf(trainer, interactions_df, configs, n_splits=5, n_jobs=1, min_folds=2, keep_fraction=1 / 3,
+              n_threads=1, random_state=42):
+    """
+    Cross-validates every config of `configs` on the same `n_splits` folds and returns a results table
+    ranked by mean RMSE (best first). All configs are scored on the first `min_folds` folds; only the
+    best `keep_fraction` of them go on to the remaining folds, the others are reported as 'pruned'.
+    With `n_jobs` > 1 the (config, fold) fits run on a process pool, so callers must run under
+    `if __name__ == "__main__":`.
+    """
+    interactions_df = interactions_df.reset_index(drop=True)
+    splits = list(kfold_splits(len(interactions_df), n_splits, random_state))
+    scores = {i: [] for i in range(len(configs))}
+    rungs = [range(min(min_folds, n_splits)), range(min(min_folds, n_splits), n_splits)]
+
+    pool = None
+    if n_jobs > 1:
+        pool = ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker,
+                                   initargs=(interactions_df, splits, n_threads))
+    else:
+        _init_worker(interactions_df, splits, n_threads)
+    try:
+        alive = list(range(len(configs)))
+        for rung, folds in enumerate(rungs):
+            tasks = [(trainer, i, configs[i], fold) for i in alive for fold in folds]
+            for config_idx, fold, rmse, mae, seconds in (pool.map(_evaluate, tasks) if pool else map(_evaluate, tasks)):
+                scores[config_idx].append((fold, rmse, mae, seconds))
+            if rung < len(rungs) - 1 and len(alive) > 1:
+                mean_rmse = {i: np.mean([s[1] for s in scores[i]]) for i in alive}
+                alive = sorted(alive, key=mean_rmse.get)[:max(math.ceil(len(alive) * keep_fraction), 1)]
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    rows = []
+    for i, params in enumerate(configs):
+        folds = np.array([s[1:] for s in scores[i]])
+        rows.append({
+            **params,
+            'folds': len(folds),
+            'rmse_mean': folds[:, 0].mean(),
+            'rmse_std': folds[:, 0].std(),
+            'mae_mean': folds[:, 1].mean(),
+            'fit_seconds': folds[:, 2].sum(),
+            'status': 'complete' if len(folds) == n_splits else 'pruned',
+        })
+    results = pd.DataFrame(rows).sort_values(['status', 'rmse_mean'], kind='stable').reset_index(drop=True)
+    results.insert(0, 'rank', np.arange(1, len(results) + 1))
+    return results
+
+
+def best_params(results, configs):
+    """The params of the best fully cross-validated config of a `search_cf` results table."""
+    best = results.iloc[0]
+    return {name: type(configs[0][name])(best[name]) for name in configs[0]}
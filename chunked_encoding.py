@@ -0,0 +1,82 @@
+# Filename: chunked_encoding.py
+# Offline encoding of long texts: split into chunks that fit the model's sequence length, encode
+# all chunks in batches of similar token length, and mean-pool the chunks back into one vector per text.
+import numpy as np
+
+
+def max_chunk_tokens(model):
+    """Longest chunk (in tokens, without [CLS]/[SEP]) that the model encodes without truncation."""
+    special = model.tokenizer.num_special_tokens_to_add(pair=False)
+    return model.max_seq_length - special
+
+
+def chunk_text(tokenizer, text, max_tokens):
+    """
+    Splits `text` into consecutive pieces of at most `max_tokens` tokens, cutting between words.
+    Returns a list of (chunk text, token count). Needs a fast (Rust) tokenizer for the offsets.
+    """
+    encoding = tokenizer(str(text), add_special_tokens=False, return_offsets_mapping=True)
+    offsets, word_ids = encoding['offset_mapping'], encoding.word_ids()
+    if len(offsets) <= max_tokens:
+        return [(str(text), len(offsets))]
+
+    chunks = []
+    start = 0
+    while start < len(offsets):
+        end = min(start + max_tokens, len(offsets))
+        # Do not split a word's sub-word tokens across two chunks (unless the word alone is too long)
+        while end < len(offsets) and end - 1 > start and word_ids[end] == word_ids[end - 1]:
+            end -= 1
+        if end < len(offsets) and word_ids[end] == word_ids[end - 1]:
+            end = min(start + max_tokens, len(offsets))
+        chunks.append((str(text)[offsets[start][0]:offsets[end - 1][1]], end - start))
+        start = end
+    return chunks
+
+
+def encode_length_sorted(model, texts, batch_size=32, token_counts=None):
+    """
+    Encodes `texts` in batches of similar token length so short texts are not padded to the length
+    of a long neighbour. Returns the embeddings in the order of `texts`.
+    """
+    if not texts:
+        return np.zeros((0, 0), dtype=np.float32)
+    if token_counts is None:
+        token_counts = [len(ids) for ids in model.tokenizer(list(texts), add_special_tokens=False)['input_ids']]
+    order = np.argsort(token_counts, kind='stable')
+    batches = [order[start:start + batch_size] for start in range(0, len(texts), batch_size)]
+    sorted_embeddings = np.concatenate([model.encode([texts[i] for i in batch], batch_size=len(batch)) for batch in batches])
+    embeddings = np.empty_like(sorted_embeddings)
+    embeddings[order] = sorted_embeddings
+    return embeddings
+
+
+def encode_chunked(model, texts, batch_size=32, max_tokens=None):
+    """
+    Encodes every text in full: texts longer than the model's sequence length are split into chunks,
+    all chunks of all texts are encoded length-sorted, and each text gets the token-weighted mean of
+    its chunk embeddings. Returns (embeddings, stats).
+    """
+    max_tokens = max_tokens or max_chunk_tokens(model)
+    chunk_texts, chunk_tokens, owners = [], [], []
+    for i, text in enumerate(texts):
+        for chunk, n_tokens in chunk_text(model.tokenizer, text, max_tokens):
+            chunk_texts.append(chunk)
+            chunk_tokens.append(n_tokens)
+            owners.append(i)
+
+    chunk_embeddings = encode_length_sorted(model, chunk_texts, batch_size, chunk_tokens)
+
+    # Token-weighted mean pooling per text: a short closing chunk counts for less than a full one
+    weights = np.maximum(np.asarray(chunk_tokens, dtype=np.float32), 1.0)
+    embeddings = np.zeros((len(texts), chunk_embeddings.shape[1]), dtype=np.float32)
+    np.add.at(embeddings, owners, chunk_embeddings * weights[:, None])
+    embeddings /= np.bincount(owners, weights=weights, minlength=len(texts))[:, None].astype(np.float32)
+
+    stats = {
+        'texts': len(texts),
+        'chunks': len(chunk_texts),
+        'chunked_texts': int((np.bincount(owners, minlength=len(texts)) > 1).sum()),
+        'tokens': int(sum(chunk_tokens)),
+    }
+    return embeddings, stats
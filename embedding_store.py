@@ -0,0 +1,70 @@
+# Filename: embedding_store.py
+# Persistent embedding cache for the offline vectorization step, so a rebuild only encodes the
+# texts that are new or changed since the previous run.
+import hashlib
+import os
+import numpy as np
+
+
+def text_key(text):
+    """Content hash of a text; the model name is part of the store's file name."""
+    return hashlib.sha256(str(text).encode('utf-8')).hexdigest()
+
+
+class EmbeddingStore:
+    """
+    On-disk map of text hash -> raw embedding for one model, kept in `<directory>/<model_name>.npz`
+    (`<model_name>-<variant>.npz` for a variant).
+    Texts are hashed exactly as given, so a cached vector is the one the model produced for that
+    exact string. `save` drops entries no text of the current run used (deleted or edited rows).
+    """
+
+    def __init__(self, directory, model_name, variant=None):
+        # `variant` separates embeddings the same model produced differently (e.g. chunked + pooled)
+        file_name = model_name.replace('/', '__') + (f'-{variant}' if variant else '')
+        self.path = os.path.join(directory, f"{file_name}.npz")
+        self.model_name = model_name
+        self._vectors = {}
+        self._used = set()
+        self.hits = 0    # Distinct texts found in the store
+        self.misses = 0  # Distinct texts that had to be encoded
+        if os.path.exists(self.path):
+            with np.load(self.path, allow_pickle=False) as cached:
+                self._vectors = dict(zip(cached['keys'].tolist(), cached['vectors']))
+
+    def __len__(self):
+        return len(self._vectors)
+
+    def missing(self, texts):
+        """
+        Returns the distinct texts of `texts` that have no cached embedding, in first-seen order,
+        and counts the distinct texts as cache hits or misses.
+        """
+        distinct = {}
+        for text in texts:
+            distinct.setdefault(text_key(text), text)
+        missing = [text for key, text in distinct.items() if key not in self._vectors]
+        self.hits += len(distinct) - len(missing)
+        self.misses += len(missing)
+        return missing
+
+    def add(self, texts, vectors):
+        for text, vector in zip(texts, vectors):
+            self._vectors[text_key(text)] = np.asarray(vector, dtype=np.float32)
+
+    def get_many(self, texts):
+        """Returns the (len(texts) x dim) matrix of cached embeddings; every text must be cached."""
+        keys = [text_key(text) for text in texts]
+        self._used.update(keys)
+        return np.stack([self._vectors[key] for key in keys])
+
+    def save(self, prune=True):
+        """Writes the store atomically; with `prune`, keeps only the entries used since it was opened."""
+        keys = sorted(self._used if prune else self._vectors)
+        pruned = len(self._vectors) - len(keys)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + '.tmp.npz'
+        vectors = np.stack([self._vectors[key] for key in keys]) if keys else np.zeros((0, 0), dtype=np.float32)
+        np.savez(tmp_path, keys=np.array(keys, dtype=str), vectors=vectors)
+        os.replace(tmp_path, self.path)
+        return pruned
@@ -0,0 +1,227 @@
+# Filename: encoder.py
+# Online sentence encoding for the API: turns free text into unit-length student vectors.
+import asyncio
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from scoring import l2_normalize_rows
+
+
+# Inference backends for the sentence encoder. 'torch-int8' applies PyTorch dynamic quantization to
+# the model's Linear layers (int8 weights, activations quantized on the fly), which speeds up CPU
+# inference; see bench_encoder_backends.py for its parity with fp32 and its throughput.
+ENCODER_BACKENDS = ('torch', 'torch-int8')
+
+
+def load_sentence_model(model_name, backend='torch'):
+    """Loads a SentenceTransformer on the CPU with the given inference backend. Imports torch."""
+    if backend not in ENCODER_BACKENDS:
+        raise ValueError(f"Unknown encoder backend '{backend}'; expected one of {ENCODER_BACKENDS}.")
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(model_name, device='cpu')
+    if backend == 'torch-int8':
+        torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    return model
+
+
+def encoder_id(model_name, backend):
+    """Name of the embeddings a model/backend pair produces, for cache keys and manifests."""
+    return model_name if backend == 'torch' else f'{model_name}+{backend}'
+
+
+def normalize_text(text):
+    """Collapses whitespace so trivially different spellings of the same text share a cache entry."""
+    return " ".join(str(text).split())
+
+
+class EmbeddingCache:
+    """Thread-safe bounded LRU of embeddings keyed by (model name, normalized text)."""
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return vector
+
+    def put(self, key, vector):
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class EncoderQueueFull(Exception):
+    """Raised when the micro-batching queue already holds `max_queue_size` pending texts."""
+
+
+class EncoderStopped(Exception):
+    """Raised for texts submitted to, or still queued in, a micro-batching encoder that was stopped."""
+
+
+class MicroBatchEncoder:
+    """
+    Dynamic micro-batching in front of `model.encode`. Callers submit single texts and get a future;
+    a dedicated worker thread collects pending texts until it has `max_batch_size` of them or the
+    oldest has waited `max_wait_ms`, encodes them as one batch and resolves each future with its row.
+    """
+
+    def __init__(self, model, max_batch_size=32, max_wait_ms=5.0, max_queue_size=1024):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._thread = None
+        self._stopped = threading.Event()
+        self._submit_lock = threading.Lock()  # Makes "not stopped, so enqueue" atomic with `stop`
+        self.batches = 0
+        self.encoded = 0
+
+    def start(self):
+        if self._thread is None:
+            with self._submit_lock:
+                self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name='micro-batch-encoder', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Encodes the texts already queued and stops the worker. Never blocks on a full queue."""
+        if self._thread is not None:
+            with self._submit_lock:
+                self._stopped.set()  # No new submissions from here on
+            while True:
+                try:
+                    self._queue.put_nowait(None)  # Sentinel: finish the queued texts and exit
+                    break
+                except queue.Full:
+                    # Fail the queued texts rather than wait for them; that frees room for the sentinel
+                    self._fail_queued(EncoderStopped("The encoder was stopped before this text was encoded."))
+            self._thread.join()
+            self._thread = None
+            # Nothing can be queued behind the sentinel any more, but never leave a future unresolved
+            self._fail_queued(EncoderStopped("The encoder was stopped before this text was encoded."))
+
+    def _fail_queued(self, error):
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if item is not None and item[1].set_running_or_notify_cancel():
+                item[1].set_exception(error)
+
+    def submit(self, text):
+        """Queues `text` for encoding and returns a `concurrent.futures.Future` of its embedding."""
+        future = Future()
+        with self._submit_lock:
+            if self._stopped.is_set():
+                raise EncoderStopped("The encoder is stopped.")
+            try:
+                self._queue.put_nowait((text, future))
+            except queue.Full:
+                raise EncoderQueueFull(f"{self._queue.maxsize} texts are already waiting to be encoded.")
+        return future
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = [first]
+            deadline = time.monotonic() + self.max_wait
+            stopping = False
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            self._encode_batch(batch)
+            if stopping:
+                return
+
+    def _encode_batch(self, batch):
+        # Skip jobs whose caller already gave up (cancelled futures)
+        batch = [(text, future) for text, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        texts = [text for text, _ in batch]
+        futures = [future for _, future in batch]
+        try:
+            vectors = self.model.encode(texts)
+        except Exception as e:
+            for future in futures:
+                future.set_exception(e)
+            return
+        self.batches += 1
+        self.encoded += len(texts)
+        for future, vector in zip(futures, vectors):
+            future.set_result(vector)
+
+
+class TextEncoder:
+    """
+    Wraps a SentenceTransformer so repeated texts are served from the cache and only the misses of
+    a call are encoded. Misses go through `batcher` when one is configured, so texts from
+    concurrent requests share one `encode` batch; otherwise they are encoded in a worker thread.
+    """
+
+    def __init__(self, model, model_name, cache, batcher=None):
+        self.model = model
+        self.model_name = model_name
+        self.cache = cache
+        self.batcher = batcher
+
+    def _lookup(self, texts):
+        keys = [(self.model_name, normalize_text(text)) for text in texts]
+        vectors = {key: self.cache.get(key) for key in set(keys)}
+        missing = [key for key, vector in vectors.items() if vector is None]
+        return keys, vectors, missing
+
+    def _finish(self, keys, vectors, missing, encoded):
+        for key, vector in zip(missing, l2_normalize_rows(encoded) if missing else []):
+            vectors[key] = vector
+            self.cache.put(key, vector)
+        return l2_normalize_rows([vectors[key] for key in keys])
+
+    def encode(self, texts):
+        """Returns a (len(texts) x dim) float32 matrix of unit-length embeddings. Blocks the caller."""
+        keys, vectors, missing = self._lookup(texts)
+        encoded = self.model.encode([text for _, text in missing]) if missing else []
+        return self._finish(keys, vectors, missing, encoded)
+
+    async def encode_async(self, texts):
+        """Like `encode`, but never blocks the event loop."""
+        if self.batcher is None:
+            return await asyncio.to_thread(self.encode, texts)
+
+        keys, vectors, missing = self._lookup(texts)
+        futures = [asyncio.wrap_future(self.batcher.submit(text)) for _, text in missing]
+        encoded = await asyncio.gather(*futures)
+        return self._finish(keys, vectors, missing, encoded)
@@ -0,0 +1,32 @@
+# Filename: enrolment_ratings.py
+# How course enrolments (user_semester_courses rows) become collaborative-filtering ratings. Shared by
+# the full fetch (001_fetch_data_new.py) and the incremental sync (01_sync_supabase_data.py), so both
+# produce the same student_interactions.csv from the same source rows.
+import pandas as pd
+
+# Only finished courses carry a grade worth learning from
+COMPLETED_STATUS = 'completed'
+
+# --- Define Grade to Rating Mapping ---
+# Adjust this mapping based on your actual grade values and desired numerical scale
+# Ensure a consistent numerical scale, e.g., 1 (worst) to 5 (best) or 0-10.
+# The 'surprise' library typically expects a min/max rating scale.
+GRADE_TO_RATING_MAPPING = {
+    'A+': 10.0, 'A': 9.0, 'A-': 8.5,
+    'B+': 8.0, 'B': 7.0, 'B-': 6.5,
+    'C+': 6.0, 'C': 5.0, 'C-': 4.5,
+    'D+': 4.0, 'D': 3.0,
+    'P': 5.0,  # Pass
+    'S': 7.0,  # Satisfactory (often used for non-graded courses)
+    'F': 1.0,  # Fail
+    'U': 1.0,  # Unsatisfactory
+    # Add any other grades present in your 'user_semester_courses' table
+}
+DEFAULT_RATING_FOR_UNKNOWN_GRADE = 3.0 # A neutral rating for unmapped grades
+
+
+def interactions_from_enrolments(enrolments_df):
+    """(user_id, course_id, rating) of the completed enrolments (columns user_id, course_uuid, grade, status)."""
+    completed = enrolments_df[enrolments_df['status'] == COMPLETED_STATUS]
+    ratings = completed['grade'].str.upper().map(GRADE_TO_RATING_MAPPING).fillna(DEFAULT_RATING_FOR_UNKNOWN_GRADE)
+    return pd.DataFrame({'user_id': completed['user_id'], 'course_id': completed['course_uuid'], 'rating': ratings})
@@ -0,0 +1,120 @@
+# Filename: fake_postgrest_server.py
+# Local stand-in for Supabase's PostgREST API, serving CSV files as tables, for exercising the
+# ingestion scripts without a Supabase project. Supports the subset postgrest_fetcher.py uses:
+# `select`, `order=<col>.asc|desc`, eq/neq/gt/gte/lt/lte filters, `Range` headers, `Prefer: count=exact`,
+# plus a PostgREST-style `max-rows` page cap, exact counts that can be switched off, and injected
+# latency and transient failures.
+#
+#   python fake_postgrest_server.py --tables data --port 54321 --fail-rate 0.1 --latency-ms 20
+#   SUPABASE_URL=http://127.0.0.1:54321 SUPABASE_SERVICE_KEY=dev python fetch_courses_from_supabase.py
+import argparse
+import json
+import os
+import random
+import re
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+import pandas as pd
+
+OPERATORS = {
+    'eq': lambda a, b: a == b, 'neq': lambda a, b: a != b,
+    'gt': lambda a, b: a > b, 'gte': lambda a, b: a >= b,
+    'lt': lambda a, b: a < b, 'lte': lambda a, b: a <= b,
+}
+
+
+def load_tables(directory):
+    """Every `<name>.csv` of `directory` as table `<name>`: a list of row dicts (missing values are null)."""
+    tables = {}
+    for file_name in sorted(os.listdir(directory)):
+        if file_name.endswith('.csv'):
+            frame = pd.read_csv(os.path.join(directory, file_name))
+            tables[file_name[:-4]] = json.loads(frame.to_json(orient='records'))
+    return tables
+
+
+def query_rows(rows, params):
+    """Applies PostgREST-style filters, ordering and column selection to `rows`."""
+    for column, condition in params.items():
+        if column in ('select', 'order', 'limit', 'offset'):
+            continue
+        operator, _, value = condition.partition('.')
+        if operator not in OPERATORS:
+            raise ValueError(f"Unsupported filter '{condition}'")
+        rows = [row for row in rows if row.get(column) is not None
+                and OPERATORS[operator](row[column], type(row[column])(value))]
+    for term in reversed(params.get('order', '').split(',')):
+        if term:
+            column, _, direction = term.partition('.')
+            # Nulls last, as PostgreSQL does for ascending order
+            rows = sorted(rows, key=lambda row: (row.get(column) is None, row.get(column)), reverse=direction == 'desc')
+    select = params.get('select', '*')
+    if select != '*':
+        columns = [c.strip() for c in select.split(',')]
+        rows = [{c: row.get(c) for c in columns} for row in rows]
+    return rows
+
+
+def make_handler(tables, fail_rate, latency_ms, max_rows=None, exact_count=True):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status, body, headers=None):
+            payload = json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            time.sleep(latency_ms / 1000)
+            if random.random() < fail_rate:
+                return self._send(503, {'message': 'Injected failure'})
+            url = urlparse(self.path)
+            table = url.path.strip('/').split('/')[-1]
+            if table not in tables:
+                return self._send(404, {'message': f"relation '{table}' does not exist"})
+            try:
+                rows = query_rows(tables[table], dict(parse_qsl(url.query)))
+            except ValueError as e:
+                return self._send(400, {'message': str(e)})
+
+            start, end = 0, len(rows) - 1
+            match = re.fullmatch(r'(\d+)-(\d*)', self.headers.get('Range', ''))
+            if match:
+                start = int(match.group(1))
+                end = min(int(match.group(2)) if match.group(2) else end, len(rows) - 1)
+            if max_rows:
+                # Like PostgREST's max-rows: a page never holds more, whatever range was asked for
+                end = min(end, start + max_rows - 1)
+                if start > 0 and start >= len(rows):
+                    return self._send(416, {'message': 'Requested range not satisfiable'},
+                                      {'Content-Range': f"*/{len(rows)}"})
+            total = str(len(rows)) if exact_count and 'count=exact' in self.headers.get('Prefer', '') else '*'
+            page = rows[start:end + 1]
+            content_range = f"{start}-{start + len(page) - 1}/{total}" if page else f"*/{total}"
+            self._send(206 if len(page) < len(rows) else 200, page, {'Content-Range': content_range})
+
+    return Handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve CSV files through a PostgREST-style API.")
+    parser.add_argument('--tables', default='data', help="Directory of <table>.csv files.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=54321)
+    parser.add_argument('--fail-rate', type=float, default=0.0, help="Share of requests answered with a 503.")
+    parser.add_argument('--latency-ms', type=float, default=0.0, help="Delay added to every request.")
+    parser.add_argument('--max-rows', type=int, default=None, help="Most rows a page may hold (PostgREST's max-rows).")
+    parser.add_argument('--no-count', action='store_true', help="Never report exact counts (as if counting were off).")
+    args = parser.parse_args()
+    tables = load_tables(args.tables)
+    print(f"Serving {', '.join(f'{name} ({len(rows)} rows)' for name, rows in tables.items())} "
+          f"at http://{args.host}:{args.port}/rest/v1")
+    handler = make_handler(tables, args.fail_rate, args.latency_ms, args.max_rows, exact_count=not args.no_count)
+    ThreadingHTTPServer((args.host, args.port), handler).serve_forever()
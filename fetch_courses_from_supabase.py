@@ -1,15 +1,20 @@
 # Filename: fetch_courses_from_supabase.py
 import os
 import pandas as pd
-from supabase import create_client, Client
 from dotenv import load_dotenv
+from postgrest_fetcher import PostgrestFetcher
 
 # --- Configuration ---
 OUTPUT_DATA_DIR = 'data'
 OUTPUT_FILE_NAME = 'courses.csv'
+# Raw table exports (and their resume checkpoints while a fetch is in progress)
+RAW_DATA_DIR = os.path.join(OUTPUT_DATA_DIR, 'raw')
+# Rows per range request and how many requests are in flight at once
+PAGE_SIZE = int(os.environ.get('SUPABASE_PAGE_SIZE', 1000))
+MAX_IN_FLIGHT = int(os.environ.get('SUPABASE_MAX_IN_FLIGHT', 4))
 
 def init_supabase_client():
-    """Initializes and returns the Supabase client."""
+    """Returns a paginated fetcher for the project's PostgREST API (`<SUPABASE_URL>/rest/v1`)."""
     load_dotenv()
     url = os.environ.get("SUPABASE_URL")
     key = os.environ.get("SUPABASE_SERVICE_KEY")
@@ -21,22 +26,21 @@ def init_supabase_client():
         
     try:
         print("Connecting to Supabase...")
-        return create_client(url, key)
+        return PostgrestFetcher(f"{url.rstrip('/')}/rest/v1", key, page_size=PAGE_SIZE, max_in_flight=MAX_IN_FLIGHT)
     except Exception as e:
         print(f"Error creating Supabase client: {e}")
         return None
 
-def fetch_courses_data(supabase: Client):
+def fetch_courses_data(fetcher: PostgrestFetcher):
     """Fetches the master course list from the 'courses' table in Supabase."""
     print("--- Fetching Master Course List from Supabase ---")
     try:
-        # Select all the columns relevant for our models and logic
-        response = supabase.table('courses').select(
-            'id, code, name, description, prerequisites, department, semester, credits'
-        ).execute()
-        
-        if response.data:
-            df = pd.DataFrame(response.data)
+        # Select all the columns relevant for our models and logic; pages are streamed to disk
+        raw_path = os.path.join(RAW_DATA_DIR, 'courses.csv')
+        fetcher.fetch_table('courses', raw_path, select='id,code,name,description,prerequisites,department,semester,credits')
+        df = pd.read_csv(raw_path)
+
+        if not df.empty:
             # Rename the 'id' column to 'course_id' for consistency across all our scripts
             df = df.rename(columns={'id': 'course_id'})
             
@@ -46,9 +50,7 @@ def fetch_courses_data(supabase: Client):
             print(f"✅ Successfully fetched {len(df)} courses.")
             print(f"Data saved to: {output_path}")
         else:
-            print("⚠️ No courses data found or an error occurred while fetching.")
-            if hasattr(response, 'error'):
-                print(f"Error details: {response.error}")
+            print("⚠️ No courses data found.")
 
     except Exception as e:
         print(f"An unexpected error occurred during the fetch operation: {e}")
@@ -59,9 +61,10 @@ if __name__ == "__main__":
         os.makedirs(OUTPUT_DATA_DIR)
         print(f"Created output directory: {OUTPUT_DATA_DIR}")
         
-    supabase_client = init_supabase_client()
+    fetcher = init_supabase_client()
     
-    if supabase_client:
-        fetch_courses_data(supabase_client)
+    if fetcher:
+        with fetcher:
+            fetch_courses_data(fetcher)
     else:
         print("\nCould not proceed with data fetching due to client initialization failure.")
\ No newline at end of file
@@ -0,0 +1,116 @@
+# Filename: incremental_sync.py
+# Watermark-based incremental sync of PostgREST tables into local CSV mirrors. Each run downloads only
+# the rows whose `updated_at` is at or past the table's high-water mark, upserts them into the mirror
+# by primary key, drops deleted rows (tombstones) and writes a changeset listing the inserted, updated
+# and deleted keys, so downstream stages can process only what changed.
+import json
+import os
+import time
+from datetime import datetime, timezone
+import pandas as pd
+
+SYNC_STATE_PATH = 'data/raw/sync_state.json'
+CHANGES_DIR = 'data/changes'
+
+
+def load_state(path=SYNC_STATE_PATH):
+    """Per-table sync state: {table: {'watermark', 'synced_at', 'rows'}}."""
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_state(state, path=SYNC_STATE_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _read_rows(path, key):
+    """A CSV export as text (values round-trip exactly), indexed by `key`; empty if there is none."""
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return pd.DataFrame(columns=[key]).set_index(key)
+    df = pd.read_csv(path, dtype=str, keep_default_na=False)
+    return df.drop_duplicates(subset=[key], keep='last').set_index(key)
+
+
+def sync_table(fetcher, table, mirror_path, key, state, watermark_column='updated_at', select='*',
+               soft_delete_column=None, detect_deletes=True, full=False, work_dir='data/raw',
+               changes_dir=CHANGES_DIR, state_path=SYNC_STATE_PATH):
+    """
+    Brings `mirror_path` up to date with `table` and returns the changeset. Without a watermark (first
+    run, missing mirror or `full`) the whole table is downloaded and diffed against the old mirror.
+
+    Deletes: rows with a non-empty `soft_delete_column` are tombstones, and with `detect_deletes` the
+    table's keys (one cheap column) are compared with the mirror's to catch hard deletes.
+    The filter is `>=` the watermark, so rows sharing the last timestamp are fetched again and simply
+    upserted unchanged. State is saved last: a crash before it repeats the run (at-least-once changesets).
+    """
+    start = time.perf_counter()
+    table_state = state.get(table, {})
+    watermark = None if full or not os.path.exists(mirror_path) else table_state.get('watermark')
+    print(f"  {table}: " + (f"fetching rows with {watermark_column} >= {watermark}" if watermark else "full sync"))
+
+    changes_path = os.path.join(work_dir, f"{table}.changes.csv")
+    filters = {watermark_column: f"gte.{watermark}"} if watermark else None
+    fetcher.fetch_table(table, changes_path, select=select, order=key, filters=filters)
+    fetched = _read_rows(changes_path, key)
+    old = _read_rows(mirror_path, key)
+
+    tombstones = set()
+    if soft_delete_column and soft_delete_column in fetched.columns:
+        tombstones = set(fetched.index[fetched[soft_delete_column] != ''])
+    if watermark is None:
+        # A full download is the whole table: whatever the old mirror has beyond it was deleted
+        tombstones |= set(old.index) - set(fetched.index)
+    elif detect_deletes:
+        keys_path = os.path.join(work_dir, f"{table}.keys.csv")
+        fetcher.fetch_table(table, keys_path, select=key, order=key)
+        tombstones |= set(old.index) - set(_read_rows(keys_path, key).index)
+        os.remove(keys_path)
+    fetched = fetched[~fetched.index.isin(tombstones)]
+
+    inserted = [k for k in fetched.index if k not in old.index]
+    columns = fetched.columns.union(old.columns, sort=False)
+    existing = fetched.index.intersection(old.index)
+    differs = (fetched.loc[existing].reindex(columns=columns, fill_value='')
+               != old.loc[existing].reindex(columns=columns, fill_value='')).any(axis=1)
+    updated = existing[differs.to_numpy()].tolist()
+    deleted = sorted(tombstones & set(old.index))
+
+    new_watermark = watermark
+    if len(fetched) and watermark_column in fetched.columns:
+        # Keep the server's own timestamp text; parse only to find the latest one
+        parsed = pd.to_datetime(fetched[watermark_column], utc=True, errors='coerce', format='mixed')
+        if parsed.notna().any():
+            new_watermark = fetched[watermark_column].iloc[parsed.to_numpy().argmax()]
+
+    synced_at = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S.%fZ')
+    changeset = {'table': table, 'key': key, 'synced_at': synced_at, 'full': watermark is None,
+                 'watermark_from': watermark, 'watermark_to': new_watermark,
+                 'inserted': inserted, 'updated': updated, 'deleted': deleted}
+    if inserted or updated or deleted:
+        # The changeset is written before the mirror, so a crash in between cannot lose it
+        os.makedirs(os.path.join(changes_dir, table), exist_ok=True)
+        with open(os.path.join(changes_dir, table, f"{synced_at}.json"), 'w') as f:
+            json.dump(changeset, f, indent=2)
+        merged = pd.concat([old.drop(index=deleted + updated), fetched.loc[inserted + updated]])
+        merged = merged.reindex(columns=columns, fill_value='').sort_index()
+        merged.index.name = key
+        os.makedirs(os.path.dirname(os.path.abspath(mirror_path)), exist_ok=True)
+        tmp_path = f"{mirror_path}.tmp"
+        merged.reset_index().to_csv(tmp_path, index=False)
+        os.replace(tmp_path, mirror_path)
+        rows = len(merged)
+    else:
+        rows = len(old)
+    os.remove(changes_path)
+
+    state[table] = {'watermark': new_watermark, 'synced_at': synced_at, 'rows': rows}
+    save_state(state, state_path)
+    print(f"  {table}: {len(inserted)} inserted, {len(updated)} updated, {len(deleted)} deleted "
+          f"({len(fetched)} rows fetched, {rows} in mirror) in {time.perf_counter() - start:.2f}s")
+    return changeset
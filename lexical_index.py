@@ -0,0 +1,111 @@
+# Filename: lexical_index.py
+# TF-IDF (lexical) similarity between students and the course catalog, as sparse matrix products.
+# Needs no sentence encoder: stored student vectors are used as-is, free text goes through the
+# TF-IDF pipeline's normalizer (NLTK) and the stored vocabulary and IDF weights.
+import threading
+import numpy as np
+import scipy.sparse as sp
+
+
+class LexicalIndex:
+    """
+    L2-normalized TF-IDF rows of the courses (aligned to the catalog; courses the TF-IDF pipeline did
+    not see get an empty row) and of the students. The cosine similarity of a block of students with
+    every course is one sparse matrix product.
+    """
+
+    def __init__(self, course_matrix, user_ids, student_matrix, terms, idf, analyzer_params, min_token_length=0):
+        self.course_matrix_t = sp.csr_matrix(course_matrix).T.tocsr()  # vocab x courses
+        self.user_id_to_row = {str(user_id): i for i, user_id in enumerate(user_ids)}
+        self.student_matrix = sp.csr_matrix(student_matrix)
+        self.vocabulary = {term: i for i, term in enumerate(terms)}
+        self.idf = np.asarray(idf, dtype=np.float64)
+        self.analyzer_params = analyzer_params
+        self.min_token_length = min_token_length
+        self._analyzer = None
+        self._normalizer = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_bundle(cls, arrays, manifest, course_ids):
+        """Builds the index from a lexical bundle, re-indexing its course rows onto `course_ids`."""
+        n_terms = len(arrays['terms'])
+        course_matrix = sp.csr_matrix(
+            (arrays['course_data'], arrays['course_indices'], arrays['course_indptr']),
+            shape=(len(arrays['course_ids']), n_terms),
+        )
+        student_matrix = sp.csr_matrix(
+            (arrays['student_data'], arrays['student_indices'], arrays['student_indptr']),
+            shape=(len(arrays['user_ids']), n_terms),
+        )
+        if len(arrays['idf']) != n_terms:
+            raise ValueError(f"The lexical bundle has {len(arrays['idf'])} IDF weights for {n_terms} terms.")
+
+        # Selection matrix from TF-IDF rows to catalog rows; a repeated course id keeps its last row
+        catalog_idx = {course_id: i for i, course_id in enumerate(course_ids)}
+        row_for_course = {catalog_idx[c]: row for row, c in enumerate(arrays['course_ids'].tolist()) if c in catalog_idx}
+        selection = sp.csr_matrix(
+            (np.ones(len(row_for_course)), (list(row_for_course), list(row_for_course.values()))),
+            shape=(len(course_ids), course_matrix.shape[0]),
+        )
+        analyzer_params = dict(manifest['analyzer'], ngram_range=tuple(manifest['analyzer']['ngram_range']))
+        return cls(selection @ course_matrix, arrays['user_ids'].tolist(), student_matrix, arrays['terms'].tolist(),
+                   arrays['idf'], analyzer_params, manifest['min_token_length'])
+
+    @property
+    def n_covered_courses(self):
+        return int(np.count_nonzero(np.diff(self.course_matrix_t.tocsc().indptr)))
+
+    def knows_user(self, user_id):
+        return user_id in self.user_id_to_row
+
+    def transform(self, texts):
+        """TF-IDF rows for free texts, computed as the pipeline's TfidfVectorizer would."""
+        with self._lock:
+            if self._normalizer is None:
+                from sklearn.feature_extraction.text import TfidfVectorizer
+                from text_normalization import TextNormalizer
+                self._analyzer = TfidfVectorizer(**self.analyzer_params).build_analyzer()
+                self._normalizer = TextNormalizer(self.min_token_length)
+
+        rows, cols, counts = [], [], []
+        for row, text in enumerate(texts):
+            term_counts = {}
+            for term in self._analyzer(self._normalizer(text)):
+                col = self.vocabulary.get(term)
+                if col is not None:
+                    term_counts[col] = term_counts.get(col, 0) + 1
+            rows.extend([row] * len(term_counts))
+            cols.extend(term_counts)
+            counts.extend(term_counts.values())
+        matrix = sp.csr_matrix((counts, (rows, cols)), shape=(len(texts), len(self.vocabulary)), dtype=np.float64)
+        matrix = matrix.multiply(self.idf).tocsr()
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        norms[norms == 0] = 1.0
+        return sp.diags(1.0 / norms) @ matrix
+
+    def student_rows(self, user_ids, texts=None):
+        """
+        The (users x vocab) TF-IDF matrix for `user_ids`: the transformed text where `texts` has one,
+        else the stored row, else an empty row (lexical score 0).
+        """
+        texts = texts if texts is not None else [None] * len(user_ids)
+        stored = [None if text else self.user_id_to_row.get(user_id) for user_id, text in zip(user_ids, texts)]
+        picked = [i for i, row in enumerate(stored) if row is not None]
+        selection = sp.csr_matrix((np.ones(len(picked)), (picked, [stored[i] for i in picked])),
+                                  shape=(len(user_ids), self.student_matrix.shape[0]))
+        matrix = selection @ self.student_matrix
+
+        text_rows = [i for i, text in enumerate(texts) if text]
+        if text_rows:
+            placement = sp.csr_matrix((np.ones(len(text_rows)), (text_rows, range(len(text_rows)))),
+                                      shape=(len(user_ids), len(text_rows)))
+            matrix = matrix + placement @ self.transform([texts[i] for i in text_rows])
+        # Sorted columns fix each row's summation order in `scores`, whatever other rows share the batch
+        matrix = matrix.tocsr()
+        matrix.sort_indices()
+        return matrix
+
+    def scores(self, student_rows):
+        """Dense (users x courses) cosine similarities of TF-IDF `student_rows` with every course."""
+        return (student_rows @ self.course_matrix_t).toarray()
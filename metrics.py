@@ -0,0 +1,161 @@
+# Filename: metrics.py
+# Minimal in-process metrics (counters and latency histograms) rendered in the Prometheus text
+# exposition format, so the API can serve /metrics without a client library.
+import threading
+import time
+from contextlib import contextmanager
+
+# Latency buckets in seconds: 50 µs to 2.5 s
+LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    """A monotonically increasing count per combination of label values."""
+
+    kind = 'counter'
+
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, *label_values):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, _format_labels(self.label_names, key), value) for key, value in sorted(self._values.items())]
+
+
+class Histogram:
+    """Cumulative-bucket histogram of observed values (seconds) per combination of label values."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, label_names=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [per-bucket counts (last = +Inf), sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        # Linear scan: there are few buckets and most latencies land in the first ones
+        bucket = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                bucket = i
+                break
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][bucket] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, *label_values):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *label_values)
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            series = sorted((key, list(counts), total) for key, (counts, total) in self._series.items())
+        for key, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                samples.append((f"{self.name}_bucket", _format_labels(self.label_names, key, [('le', le)]), cumulative))
+            samples.append((f"{self.name}_sum", _format_labels(self.label_names, key), total))
+            samples.append((f"{self.name}_count", _format_labels(self.label_names, key), cumulative))
+        return samples
+
+
+class Registry:
+    """
+    Owns the metrics and renders them. Collectors are callables run at scrape time that return
+    (name, kind, help, [(label dict, value), ...]) for values kept elsewhere (cache counters...), so
+    they cost nothing between scrapes.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, help_text, label_names=()):
+        metric = Counter(name, help_text, label_names)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help_text, label_names=(), buckets=LATENCY_BUCKETS):
+        metric = Histogram(name, help_text, label_names, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector):
+        self._collectors.append(collector)
+
+    def render(self):
+        """The Prometheus text exposition (version 0.0.4) of every metric and collector."""
+        lines = []
+        for metric in self._metrics:
+            lines += [f"# HELP {metric.name} {metric.help}", f"# TYPE {metric.name} {metric.kind}"]
+            lines += [f"{name}{labels} {_format_value(value)}" for name, labels, value in metric.samples()]
+        for collector in self._collectors:
+            for name, kind, help_text, values in collector():
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+                lines += [f"{name}{_format_labels(labels, labels.values())} {_format_value(value)}"
+                          for labels, value in values]
+        return '\n'.join(lines) + '\n'
+
+
+class RecommenderMetrics:
+    """The serving metrics of the recommendation API: request latency, per-stage latency and counters."""
+
+    def __init__(self, registry=None):
+        self.registry = registry or Registry()
+        self.requests = self.registry.counter(
+            'recommender_requests_total', "Requests handled, by endpoint and HTTP status.", ('endpoint', 'status'))
+        self.request_seconds = self.registry.histogram(
+            'recommender_request_seconds', "Request latency inside the endpoint handler.", ('endpoint',))
+        self.stage_seconds = self.registry.histogram(
+            'recommender_stage_seconds', "Latency of each stage of the recommendation hot path.", ('stage',))
+        self.users = self.registry.counter(
+            'recommender_scored_users_total', "Users ranked, by scoring path.", ('path',))
+        self.candidates = self.registry.counter(
+            'recommender_candidates_total', "Courses whose hybrid score was computed, by scoring path.", ('path',))
+        self.unknown_users = self.registry.counter(
+            'recommender_unknown_users_total', "Requests for users with no content profile and no interests.")
+        self.fallbacks = self.registry.counter(
+            'recommender_fallbacks_total', "Degraded answers, by kind.", ('kind',))
+
+    def stage(self, name):
+        return self.stage_seconds.time(name)
+
+    def scored(self, path, users, candidates):
+        self.users.inc(users, path)
+        self.candidates.inc(candidates, path)
+
+    def fallback(self, kind, count=1):
+        self.fallbacks.inc(count, kind)
@@ -0,0 +1,197 @@
+# Filename: postgrest_fetcher.py
+# Paginated table export from Supabase's PostgREST API: pages are requested as item ranges, several
+# at a time over one pooled HTTP client, retried with exponential backoff, appended to a CSV as they
+# arrive (in order) and checkpointed, so an interrupted export resumes where it stopped.
+import csv
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import httpx
+
+# Responses worth retrying: rate limiting and transient server/gateway errors
+RETRY_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+
+
+class PostgrestFetcher:
+    """
+    Exports PostgREST tables to CSV. `base_url` is the REST root (`<SUPABASE_URL>/rest/v1`, or a local
+    fake server). Rows are paged with `Range` headers over a stable `order`, so concurrent pages never
+    overlap; the first request of a run asks for the exact row count to know how many pages there are.
+    A server may return fewer rows per page than asked (PostgREST's `max-rows`): the first page's size
+    then becomes the page step, and every later page must hold exactly its share of the count.
+
+    Progress (next offset, rows and bytes written) is saved next to the output after every page that
+    reaches the file. A run with the same query resumes from it; a different query starts over.
+    The CSV is written as `<output>.partial` and only renamed to `<output>` once complete.
+    """
+
+    def __init__(self, base_url, api_key, page_size=1000, max_in_flight=4, max_retries=5, backoff_seconds=0.5,
+                 timeout=30.0, client=None):
+        self.base_url = base_url.rstrip('/')
+        self.page_size = page_size
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.client = client or httpx.Client(
+            headers={'apikey': api_key, 'Authorization': f"Bearer {api_key}", 'Accept': 'application/json'},
+            limits=httpx.Limits(max_connections=max_in_flight, max_keepalive_connections=max_in_flight),
+            timeout=timeout,
+        )
+        self.retries = 0
+        self._lock = threading.Lock()
+
+    def close(self):
+        self.client.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _get(self, table, params, headers):
+        """GET with retries on transport errors and RETRY_STATUSES, honoring a numeric Retry-After."""
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.client.get(f"{self.base_url}/{table}", params=params, headers=headers)
+            except httpx.TransportError as e:
+                if attempt == self.max_retries:
+                    raise
+                delay, reason = None, type(e).__name__
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                    return response
+                delay, reason = response.headers.get('Retry-After'), f"HTTP {response.status_code}"
+            # Exponential backoff with jitter, unless the server said how long to wait
+            wait = float(delay) if delay and delay.isdigit() else self.backoff_seconds * 2 ** attempt * (0.5 + random.random())
+            with self._lock:
+                self.retries += 1
+            print(f"  {table}: {reason}, retrying in {wait:.2f}s (attempt {attempt + 1}/{self.max_retries})")
+            time.sleep(min(wait, 60.0))
+
+    def fetch_page(self, table, query, offset, count=False, limit=None):
+        """
+        Rows [offset, offset + limit) of the query (`limit` defaults to page_size; the server may return
+        fewer), and the total row count when `count` is set.
+        """
+        limit = limit or self.page_size
+        headers = {'Range-Unit': 'items', 'Range': f"{offset}-{offset + limit - 1}"}
+        if count:
+            headers['Prefer'] = 'count=exact'
+        response = self._get(table, query, headers)
+        if response.status_code == 416:  # Range starts past the last row
+            return [], None
+        response.raise_for_status()
+        total = None
+        if count:
+            # Content-Range: "0-999/12345" (or "*/0" for an empty table; "/*" when the count is unavailable)
+            size = response.headers.get('Content-Range', '*/*').rsplit('/', 1)[-1]
+            total = int(size) if size.isdigit() else None
+        return response.json(), total
+
+    def fetch_table(self, table, output_path, select='*', order='id', filters=None):
+        """
+        Exports `table` (`select` columns, `filters` as PostgREST params such as {'status': 'eq.completed'})
+        to `output_path`, resuming a previous interrupted run of the same query. Returns run statistics.
+        """
+        query = {'select': select, 'order': f"{order}.asc", **(filters or {})}
+        partial_path, checkpoint_path = f"{output_path}.partial", f"{output_path}.checkpoint.json"
+        fingerprint = {'table': table, 'query': query, 'page_size': self.page_size}
+
+        # Columns come from `select` when it lists them, else from the first row
+        columns = [c.strip() for c in select.split(',')] if select != '*' else None
+        state = {'fingerprint': fingerprint, 'next_offset': 0, 'rows': 0, 'bytes': 0, 'columns': columns}
+        if os.path.exists(checkpoint_path) and os.path.exists(partial_path):
+            with open(checkpoint_path) as f:
+                saved = json.load(f)
+            if saved.get('fingerprint') == fingerprint:
+                state = saved
+                print(f"  {table}: resuming at row {state['next_offset']} ({state['rows']} rows already on disk)")
+        start = time.perf_counter()
+        retries_before = self.retries
+
+        os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+        with open(partial_path, 'a+b') as raw:
+            # Drop anything written after the last checkpoint (a page cut short by the crash)
+            raw.truncate(state['bytes'])
+        with open(partial_path, 'a', newline='', encoding='utf-8') as out:
+            writer = None
+
+            def write_page(rows):
+                nonlocal writer
+                if rows and state['columns'] is None:
+                    state['columns'] = list(rows[0])
+                if state['columns'] is not None and writer is None:
+                    writer = csv.DictWriter(out, fieldnames=state['columns'], extrasaction='ignore')
+                    if state['bytes'] == 0:
+                        writer.writeheader()
+                if rows:
+                    writer.writerows({k: _csv_value(v) for k, v in row.items()} for row in rows)
+                out.flush()
+                # Advance by what arrived, not what was asked for: the server may cap pages
+                state['next_offset'] += len(rows)
+                state['rows'] += len(rows)
+                state['bytes'] = out.tell()
+                _save_checkpoint(checkpoint_path, state)
+
+            rows, total = self.fetch_page(table, query, state['next_offset'], count=True)
+            step = self.page_size
+            if total is not None:
+                _check_page(table, rows, state['next_offset'], step, total)
+                if rows and len(rows) < min(step, total - state['next_offset']):
+                    step = len(rows)
+                    print(f"  {table}: the server caps pages at {step} rows, paging by {step}")
+            write_page(rows)
+            if total is None:
+                # No row count, so a short page may just be capped: walk the pages one at a time until an empty one
+                while rows:
+                    rows, _ = self.fetch_page(table, query, state['next_offset'])
+                    write_page(rows)
+            else:
+                offsets = list(range(state['next_offset'], total, step))
+                with ThreadPoolExecutor(max_workers=self.max_in_flight) as pool:
+                    # At most max_in_flight pages ahead of the file; pages are written in offset order
+                    pending = {}
+                    for offset in offsets[:self.max_in_flight]:
+                        pending[offset] = pool.submit(self.fetch_page, table, query, offset, limit=step)
+                    for i, offset in enumerate(offsets):
+                        rows, _ = pending.pop(offset).result()
+                        if i + self.max_in_flight < len(offsets):
+                            ahead = offsets[i + self.max_in_flight]
+                            pending[ahead] = pool.submit(self.fetch_page, table, query, ahead, limit=step)
+                        _check_page(table, rows, offset, step, total, exact=True)
+                        write_page(rows)
+
+        os.replace(partial_path, output_path)
+        os.remove(checkpoint_path)
+        seconds = time.perf_counter() - start
+        print(f"  {table}: {state['rows']} rows -> {output_path} in {seconds:.2f}s ({self.retries - retries_before} retries)")
+        return {'table': table, 'rows': state['rows'], 'seconds': seconds, 'retries': self.retries - retries_before}
+
+
+def _check_page(table, rows, offset, limit, total, exact=False):
+    """
+    Raises when a page has more rows than asked for or left in the count, or (`exact`) fewer than
+    that: rows would otherwise be skipped or repeated. The checkpoint keeps the pages before it.
+    """
+    expected = max(min(limit, total - offset), 0)
+    if len(rows) > expected or (exact and len(rows) < expected) or (not rows and expected):
+        raise RuntimeError(f"{table}: got {len(rows)} rows at offset {offset}, expected {expected} of {total}; "
+                           f"the table changed during the export or the server pages inconsistently")
+
+
+def _csv_value(value):
+    """Arrays and JSON objects are stored as JSON text (readable back with json or ast.literal_eval)."""
+    if isinstance(value, (list, dict)):
+        return json.dumps(value)
+    return value
+
+
+def _save_checkpoint(path, state):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
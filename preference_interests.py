@@ -0,0 +1,37 @@
+# Filename: preference_interests.py
+# How a student's course preferences (user_course_preferences rows) become the `interests_combined`
+# text their content profile is built from. Shared by the full fetch (001_fetch_data_new.py) and the
+# incremental sync (01_sync_supabase_data.py), so both write the same student_preferences.csv.
+import ast
+import json
+import pandas as pd
+
+# Preference fields joined into the interests text, in this order
+PREFERENCE_COLUMNS = ['career_goal', 'technical_skills', 'improvement_areas', 'primary_interest', 'secondary_interest']
+
+
+def _as_text(value):
+    """A preference field as plain text. TEXT[] values (JSON arrays, or Python lists in older exports) are space-joined."""
+    if isinstance(value, list):
+        return ' '.join(str(item) for item in value if item)
+    if not isinstance(value, str):
+        return '' if value is None or pd.isna(value) else str(value)
+    if value.startswith('['):
+        for parse in (json.loads, ast.literal_eval):
+            try:
+                items = parse(value)
+            except (ValueError, SyntaxError):
+                continue
+            if isinstance(items, list):
+                return ' '.join(str(item) for item in items if item)
+    return value
+
+
+def interests_from_preferences(preferences_df):
+    """(user_id, interests_combined) of every preferences row; missing fields count as empty, whitespace is collapsed."""
+    combined = pd.Series('', index=preferences_df.index, dtype=object)
+    for column in PREFERENCE_COLUMNS:
+        if column in preferences_df.columns:
+            combined = combined + ' ' + preferences_df[column].map(_as_text).astype(str)
+    combined = combined.str.replace(r'\s+', ' ', regex=True).str.strip()
+    return pd.DataFrame({'user_id': preferences_df['user_id'], 'interests_combined': combined})
@@ -0,0 +1,74 @@
+# Filename: quantized_embeddings.py
+# Reduced-precision copies of the course embeddings for the full-catalog scan. The float32 matrix
+# stays memory-mapped and is only read for the few shortlisted rows that get re-scored exactly.
+import numpy as np
+
+PRECISIONS = ('float16', 'int8')
+
+
+class QuantizedEmbeddings:
+    """
+    An embedding matrix stored as float16 or as int8 with one float32 scale per row, plus a per-row
+    bound on the quantization error: `errors[r] >= ||x_r - dequantized(x_r)||`. For a unit-length
+    query q, Cauchy-Schwarz gives |q.x_r - q.x̂_r| <= errors[r], so a caller can shortlist every row
+    that could still reach the exact top-N and re-score only those.
+    """
+
+    # Rows dequantized at a time during a scan; bounds the float32 working set
+    CHUNK_ROWS = 4096
+
+    def __init__(self, codes, scales, errors):
+        self.codes = codes
+        self.scales = scales  # None for float16
+        self.errors = errors
+
+    @property
+    def precision(self):
+        return self.codes.dtype.name
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.codes, self.scales, self.errors) if a is not None)
+
+    @classmethod
+    def from_float(cls, embeddings, precision):
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if precision == 'float16':
+            codes, scales = embeddings.astype(np.float16), None
+            restored = codes.astype(np.float32)
+        elif precision == 'int8':
+            # Symmetric per-row quantization: the largest component of each row maps to +-127
+            scales = np.abs(embeddings).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            codes = np.clip(np.rint(embeddings / scales[:, None]), -127, 127).astype(np.int8)
+            scales = scales.astype(np.float32)
+            restored = codes.astype(np.float32) * scales[:, None]
+        else:
+            raise ValueError(f"Unknown precision '{precision}'; expected one of {PRECISIONS}.")
+        # Computed in float64 and padded, so float32 rounding in the scan cannot exceed the bound
+        errors = np.linalg.norm(embeddings.astype(np.float64) - restored, axis=1) * (1 + 1e-6) + 1e-6
+        return cls(codes, scales, errors.astype(np.float32))
+
+    def dot(self, queries):
+        """Returns the approximate (rows x queries) scores of the (queries x dim) matrix `queries`."""
+        queries = np.asarray(queries, dtype=np.float32).T
+        scores = np.empty((self.codes.shape[0], queries.shape[1]), dtype=np.float32)
+        for start in range(0, self.codes.shape[0], self.CHUNK_ROWS):
+            rows = slice(start, start + self.CHUNK_ROWS)
+            scores[rows] = self.codes[rows].astype(np.float32) @ queries
+            if self.scales is not None:
+                scores[rows] *= self.scales[rows, None]
+        return scores
+
+    def to_arrays(self, prefix='course_embeddings_'):
+        """Returns the matrix as named arrays, for storing in an artifact bundle."""
+        arrays = {f'{prefix}{self.precision}': self.codes, f'{prefix}{self.precision}_error': self.errors}
+        if self.scales is not None:
+            arrays[f'{prefix}{self.precision}_scale'] = self.scales
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays, precision, prefix='course_embeddings_'):
+        """Rebuilds the matrix from `to_arrays` output (memory-mapped arrays are used as-is)."""
+        return cls(arrays[f'{prefix}{precision}'], arrays.get(f'{prefix}{precision}_scale'),
+                   arrays[f'{prefix}{precision}_error'])
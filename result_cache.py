@@ -0,0 +1,105 @@
+# Filename: result_cache.py
+# In-process cache of final ranked recommendation lists.
+import threading
+import time
+from collections import OrderedDict
+
+
+class ResultCache:
+    """
+    Bounded LRU cache with a per-entry TTL. Keys are built by the caller and should include
+    everything the result depends on (user, top_n, artifact versions...). Per-user generations let a
+    user's entries be invalidated in O(1): bumping the generation changes their keys, and the stale
+    entries simply age out of the LRU.
+
+    Generations never go backwards, so a result computed before an invalidation (an in-flight `put`)
+    can never become reachable again. They are drawn from one counter; users without a tracked
+    generation get `_generation_floor`, which is at least every generation dropped from the bounded
+    table (and is raised past all of them by `clear`).
+    """
+
+    def __init__(self, max_entries=10000, ttl_seconds=300.0, max_tracked_users=None):
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self.max_tracked_users = max_tracked_users or max(max_entries, 1)
+        self._entries = OrderedDict()
+        self._user_generations = OrderedDict()
+        self._last_generation = 0
+        self._generation_floor = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def user_generation(self, user_id):
+        with self._lock:
+            return self._user_generations.get(user_id, self._generation_floor)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate_user(self, user_id):
+        """Makes every cached result of `user_id` unreachable."""
+        with self._lock:
+            self._last_generation += 1
+            self._user_generations[user_id] = self._last_generation
+            self._user_generations.move_to_end(user_id)
+            while len(self._user_generations) > self.max_tracked_users:
+                # Untracked users read the floor, which stays above the dropped generation
+                _, generation = self._user_generations.popitem(last=False)
+                self._generation_floor = max(self._generation_floor, generation)
+            self.invalidations += 1
+
+    def clear(self):
+        """Drops every entry; results computed before the call stay unreachable."""
+        with self._lock:
+            self._entries.clear()
+            self._last_generation += 1
+            self._generation_floor = self._last_generation
+            self._user_generations.clear()
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+            }
@@ -0,0 +1,545 @@
+# Filename: scoring.py
+# Vectorized scoring helpers shared by the recommendation API and offline tools.
+from collections import OrderedDict
+from contextlib import nullcontext
+import threading
+import numpy as np
+import pandas as pd
+
+# Weights of the hybrid score: content similarity vs. normalized CF estimate
+CONTENT_WEIGHT = 0.7
+CF_WEIGHT = 0.3
+
+_NO_STAGE = nullcontext()
+
+
+def l2_normalize_rows(matrix):
+    """Returns a contiguous float32 copy of `matrix` with every row scaled to unit length."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0  # Leave all-zero rows as zeros instead of dividing by zero
+    return np.ascontiguousarray(matrix / norms, dtype=np.float32)
+
+
+def hybrid_scores(content_scores, cf_estimates, content_weight=CONTENT_WEIGHT, cf_weight=CF_WEIGHT):
+    """Blends cosine similarities with CF estimates rescaled from the 1-10 rating scale to 0-1."""
+    return content_weight * content_scores + cf_weight * ((cf_estimates - 1) / 9.0)
+
+
+def row_products(vectors, matrix):
+    """
+    Returns `vectors @ matrix.T` as one matrix-vector product per row. A matrix-matrix product can
+    round differently depending on how many rows share it, so this keeps a user's scores
+    bit-identical whether they are scored alone or within a batch.
+    """
+    products = np.empty((len(vectors), len(matrix)), dtype=np.result_type(vectors, matrix))
+    for row, vector in enumerate(vectors):
+        products[row] = matrix @ vector
+    return products
+
+
+def top_n_indices(scores, n, exclude=None):
+    """
+    Returns the indices of the `n` highest `scores`, best first, skipping entries flagged in
+    the boolean `exclude` mask. Uses a partial selection, so the cost is O(len(scores)).
+    Ties are broken by position so results are deterministic.
+    """
+    scores = np.asarray(scores)
+    available = scores.size
+    if exclude is not None:
+        scores = np.where(exclude, -np.inf, scores)
+        available -= int(np.count_nonzero(exclude))
+    n = min(int(n), available)
+    if n <= 0:
+        return np.empty(0, dtype=np.intp)
+
+    if n < scores.size:
+        # Keep everything tied with the n-th best score so ties resolve by position, not by
+        # whichever of them the partition happened to place first
+        cutoff = scores[np.argpartition(-scores, n - 1)[n - 1]]
+        idx = np.flatnonzero(scores >= cutoff)
+    else:
+        idx = np.arange(scores.size)
+    # lexsort uses the last key as the primary one: score descending, then index ascending
+    return idx[np.lexsort((idx, -scores[idx]))][:n]
+
+
+class CFFactors:
+    """
+    Latent factors of a trained SVD, with the item side mapped onto the course catalog so one user's
+    estimates for every course come from a single matrix-vector product.
+    Mirrors `surprise.SVD.predict` exactly, including its fallbacks for unknown users and items.
+    The factor matrices are used as given, so memory-mapped arrays stay shared between processes.
+    Users rated courses after training can be folded in on demand (see `enable_fold_in`); the
+    fold-in cache is shared by the event loop and worker threads, so it is guarded by a lock.
+    """
+
+    def __init__(self, pu, qi, bu, bi, global_mean, rating_scale, user_id_to_inner, item_id_to_inner,
+                 course_ids, biased=True):
+        self.pu = pu
+        self.qi = qi
+        self.bu = bu
+        self.global_mean = float(global_mean)
+        self.rating_scale = (float(rating_scale[0]), float(rating_scale[1]))
+        self.user_id_to_inner = user_id_to_inner
+        self.biased = biased
+
+        # Inner item id of every catalog course, or -1 for courses the model never saw. Those get
+        # zero factors and bias, which is exactly how they contribute in Surprise.
+        self.catalog_items = np.array([item_id_to_inner.get(cid, -1) for cid in course_ids], dtype=np.int64)
+        self.known_items = self.catalog_items >= 0
+        self.bi = np.zeros(len(course_ids), dtype=np.float64)
+        self.bi[self.known_items] = bi[self.catalog_items[self.known_items]]
+
+        # Fold-in of users whose ratings changed after training (see `enable_fold_in`)
+        self.item_id_to_inner = item_id_to_inner
+        self._item_bias = np.asarray(bi, dtype=np.float64)
+        self.rating_history = None
+        self.fold_in_reg = 0.0
+        self._folded = OrderedDict()  # LRU of user_id -> (the ratings it was solved from, pu, bu)
+        self.max_folded_users = 0
+        self.fold_ins = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_surprise(cls, algo, course_ids):
+        """Pulls the factors, biases and raw-id maps out of a fitted `surprise.SVD`."""
+        trainset = algo.trainset
+        user_id_to_inner = {trainset.to_raw_uid(u): u for u in trainset.all_users()}
+        item_id_to_inner = {trainset.to_raw_iid(i): i for i in trainset.all_items()}
+        return cls(algo.pu, algo.qi, algo.bu, algo.bi, trainset.global_mean, trainset.rating_scale,
+                   user_id_to_inner, item_id_to_inner, course_ids, biased=algo.biased)
+
+    @classmethod
+    def from_bundle(cls, arrays, manifest, course_ids):
+        """Builds the scorer from a collaborative-filtering artifact bundle (see artifacts.py)."""
+        user_id_to_inner = {user_id: u for u, user_id in enumerate(arrays['user_ids'].tolist())}
+        item_id_to_inner = {item_id: i for i, item_id in enumerate(arrays['item_ids'].tolist())}
+        return cls(arrays['pu'], arrays['qi'], arrays['bu'], arrays['bi'], manifest['global_mean'],
+                   manifest['rating_scale'], user_id_to_inner, item_id_to_inner, course_ids,
+                   biased=manifest['biased'])
+
+    def knows_user(self, user_id):
+        return user_id in self.user_id_to_inner
+
+    def enable_fold_in(self, rating_history, reg, max_cached_users=10000):
+        """
+        Scores users with ratings recorded in `rating_history` since training from factors folded in
+        on demand (see `fold_in`) instead of their trained ones (or the unknown-user fallback).
+        Each user's result is cached until their ratings change; the `max_cached_users` most recently
+        used ones are kept, the others are solved again when they next need scoring.
+        """
+        self.rating_history = rating_history
+        self.fold_in_reg = reg
+        self.max_folded_users = max_cached_users
+
+    def fold_in(self, ratings):
+        """
+        Solves a user's factors and bias from `ratings` ({raw course id: rating}) against the fixed
+        item side: regularized least squares over [p_u, b_u] with design rows [q_i, 1], targets
+        r - μ - b_i and a ridge of `fold_in_reg` per rating. Courses the model never saw are ignored.
+        """
+        pairs = [(self.item_id_to_inner[cid], r) for cid, r in ratings.items() if cid in self.item_id_to_inner]
+        n_factors = self.qi.shape[1]
+        if not pairs:
+            return np.zeros(n_factors), 0.0
+        items = np.array([i for i, _ in pairs], dtype=np.int64)
+        targets = np.array([r for _, r in pairs], dtype=np.float64)
+        design = np.asarray(self.qi[items], dtype=np.float64)
+        if self.biased:
+            design = np.hstack([design, np.ones((len(items), 1))])
+            targets = targets - self.global_mean - self._item_bias[items]
+        gram = design.T @ design + self.fold_in_reg * len(items) * np.eye(design.shape[1])
+        solution = np.linalg.solve(gram, design.T @ targets)
+        with self._lock:
+            self.fold_ins += 1
+        return solution[:n_factors], (float(solution[n_factors]) if self.biased else 0.0)
+
+    def user_factors(self, user_ids):
+        """Returns the (users x factors) factors, biases and known-user mask used to score `user_ids`."""
+        pu = np.zeros((len(user_ids), self.qi.shape[1]), dtype=np.float64)
+        bu = np.zeros(len(user_ids), dtype=np.float64)
+        known = np.zeros(len(user_ids), dtype=bool)
+        for row, user_id in enumerate(user_ids):
+            recorded = self.rating_history.recorded(user_id) if self.rating_history is not None else None
+            if recorded is not None:
+                with self._lock:
+                    cached = self._folded.get(user_id)
+                    # The cache entry is only valid for the exact ratings it was solved from
+                    if cached is not None and cached[0] is recorded:
+                        self._folded.move_to_end(user_id)
+                    else:
+                        cached = None
+                if cached is None:
+                    # Solved outside the lock; a thread racing on the same user just stores the same result
+                    cached = (recorded, *self.fold_in(self.rating_history.ratings_for(user_id)))
+                    with self._lock:
+                        self._folded[user_id] = cached
+                        self._folded.move_to_end(user_id)
+                        while len(self._folded) > self.max_folded_users:
+                            self._folded.popitem(last=False)
+                pu[row], bu[row], known[row] = cached[1], cached[2], True
+                continue
+            inner = self.user_id_to_inner.get(user_id)
+            if inner is not None:
+                pu[row], bu[row], known[row] = self.pu[inner], self.bu[inner], True
+        return pu, bu, known
+
+    def estimate(self, user_id):
+        """Returns the clipped rating estimate of `user_id` for every catalog course."""
+        return self.estimate_many([user_id])[0]
+
+    def estimate_many(self, user_ids, course_idx=None):
+        """
+        Returns a (users x courses) matrix of clipped rating estimates, optionally restricted to the
+        catalog positions in `course_idx`.
+        """
+        items, bi, known_items = self.catalog_items, self.bi, self.known_items
+        if course_idx is not None:
+            items, bi, known_items = items[course_idx], bi[course_idx], known_items[course_idx]
+
+        # Unknown users get zero factors and bias, which is exactly how they contribute in Surprise
+        pu, bu, known_users = self.user_factors(user_ids)
+
+        # Score against the requested items' own factors only (a pool costs its size, not the catalog's),
+        # then scatter into catalog positions; unknown items stay 0
+        dots = np.zeros((len(user_ids), len(items)))
+        dots[:, known_items] = row_products(pu, self.qi[items[known_items]])
+
+        if self.biased:
+            est = self.global_mean + bu[:, None]
+            est = est + bi[None, :]
+            est = est + dots
+        else:
+            # Unbiased SVD cannot predict unless both sides are known and falls back to the global mean
+            known = known_users[:, None] & known_items[None, :]
+            est = np.where(known, dots, self.global_mean)
+        return np.clip(est, *self.rating_scale)
+
+
+class TakenCourseIndex:
+    """
+    Compact CSR-style map from user id to the catalog indices of the courses they have taken.
+    `indices[indptr[row]:indptr[row + 1]]` holds the sorted int32 course indices of one user.
+    Courses recorded after the index was built live in a small per-user overlay on top of it.
+    """
+
+    def __init__(self, user_id_to_row, indptr, indices, n_courses):
+        self.user_id_to_row = user_id_to_row
+        self.indptr = indptr
+        self.indices = indices
+        self.n_courses = n_courses
+        self._updated = {}
+
+    @classmethod
+    def from_pairs(cls, user_ids, course_idx, n_courses):
+        """Builds the index from parallel arrays of user ids and catalog indices (-1 = not in catalog)."""
+        user_ids = np.asarray(user_ids)
+        course_idx = np.asarray(course_idx, dtype=np.int64)
+        in_catalog = course_idx >= 0
+        users, rows = np.unique(user_ids, return_inverse=True)
+        rows, course_idx = rows[in_catalog], course_idx[in_catalog]
+
+        # Sort by (user, course) and drop repeated pairs so each user's slice is a sorted set
+        order = np.lexsort((course_idx, rows))
+        rows, course_idx = rows[order], course_idx[order]
+        keep = np.ones(len(rows), dtype=bool)
+        keep[1:] = (rows[1:] != rows[:-1]) | (course_idx[1:] != course_idx[:-1])
+        rows, course_idx = rows[keep], course_idx[keep]
+
+        indptr = np.zeros(len(users) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=len(users)), out=indptr[1:])
+        user_id_to_row = {str(user_id): i for i, user_id in enumerate(users)}
+        return cls(user_id_to_row, indptr, course_idx.astype(np.int32), n_courses)
+
+    def courses_for(self, user_id):
+        """Returns the catalog indices taken by `user_id` (empty for unknown users)."""
+        updated = self._updated.get(user_id)
+        if updated is not None:
+            return updated
+        row = self.user_id_to_row.get(user_id)
+        if row is None:
+            return self.indices[:0]
+        return self.indices[self.indptr[row]:self.indptr[row + 1]]
+
+    def add_courses(self, user_id, course_idx):
+        """Records newly taken catalog indices for `user_id`; returns the user's updated course set."""
+        updated = np.union1d(self.courses_for(user_id), np.asarray(course_idx, dtype=np.int32)).astype(np.int32)
+        self._updated[user_id] = updated
+        return updated
+
+    def mask_for(self, user_id):
+        """Returns a boolean catalog-length mask of the courses taken by `user_id`."""
+        return self.masks_for([user_id])[0]
+
+    def masks_for(self, user_ids):
+        """Returns a (users x courses) boolean mask of taken courses."""
+        masks = np.zeros((len(user_ids), self.n_courses), dtype=bool)
+        for row, user_id in enumerate(user_ids):
+            masks[row, self.courses_for(user_id)] = True
+        return masks
+
+
+class RatingHistory:
+    """
+    Every user's ratings by raw course id: the interaction history the CF model was trained on,
+    plus ratings recorded after it in a per-user overlay. Users with recorded ratings are the ones
+    whose CF factors get folded in (see `CFFactors.enable_fold_in`).
+    """
+
+    def __init__(self, user_id_to_row, indptr, course_ids, ratings):
+        self.user_id_to_row = user_id_to_row
+        self.indptr = indptr
+        self.course_ids = course_ids
+        self.ratings = ratings
+        self._recorded = {}
+
+    @classmethod
+    def from_pairs(cls, user_ids, course_ids, ratings):
+        """Builds the history from parallel arrays; a repeated (user, course) pair keeps its last rating."""
+        frame = pd.DataFrame({'user_id': np.asarray(user_ids).astype(str), 'course_id': np.asarray(course_ids).astype(str),
+                              'rating': np.asarray(ratings, dtype=np.float64)})
+        frame = frame.drop_duplicates(['user_id', 'course_id'], keep='last').sort_values('user_id', kind='stable')
+        users, counts = np.unique(frame['user_id'].to_numpy(), return_counts=True)
+        indptr = np.zeros(len(users) + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+        user_id_to_row = {user_id: i for i, user_id in enumerate(users.tolist())}
+        return cls(user_id_to_row, indptr, frame['course_id'].to_numpy(), frame['rating'].to_numpy())
+
+    def recorded(self, user_id):
+        """The ratings recorded for `user_id` since the history was loaded, or None."""
+        return self._recorded.get(user_id)
+
+    def ratings_for(self, user_id):
+        """Returns {course_id: rating} for `user_id`; recorded ratings replace historical ones."""
+        row = self.user_id_to_row.get(user_id)
+        ratings = {}
+        if row is not None:
+            ratings = dict(zip(self.course_ids[self.indptr[row]:self.indptr[row + 1]].tolist(),
+                               self.ratings[self.indptr[row]:self.indptr[row + 1]].tolist()))
+        ratings.update(self._recorded.get(user_id, {}))
+        return ratings
+
+    def add_ratings(self, user_id, ratings):
+        """Records {course_id: rating} for `user_id`. The overlay is replaced, never mutated in place."""
+        self._recorded[user_id] = {**self._recorded.get(user_id, {}), **ratings}
+        return self._recorded[user_id]
+
+
+class HybridRecommender:
+    """
+    The full hybrid scorer: content similarity from the normalized embeddings blended with CF
+    estimates, with taken courses excluded. Scores users in blocks so a batch of users shares one
+    pass per stage; a single user is just a block of one. Each user's row is its own matrix-vector
+    product (see `row_products`), so batch scores are bit-identical to single-request ones.
+
+    With an `ann_index`, users that have a content profile are instead ranked within a candidate
+    pool of the `ann_pool_size` most similar courses retrieved from the index, so the cost no
+    longer grows with the size of the catalog. Users without a profile are always scored exactly.
+
+    With `scan_embeddings` (a reduced-precision QuantizedEmbeddings copy of the course matrix), the
+    exact path scans that copy instead, then re-scores in float32 only the courses whose error
+    bound leaves them a chance of reaching the top-N. Rankings match the float32 scan.
+
+    With a `lexical_index`, a request can also ask for lexical (TF-IDF) content scores or a blend:
+    its content score becomes (1 - w) * semantic + w * lexical for its lexical weight w. Those users
+    are always scored exactly, and a weight of 1 skips the dense product altogether.
+
+    With `metrics` (a metrics.RecommenderMetrics), every stage is timed (taken-course filter, content,
+    lexical, CF, hybrid merge, top-N) and users and candidate courses are counted per scoring path.
+    """
+
+    # Users scored per matrix product; bounds the (users x courses) working set
+    BLOCK_SIZE = 256
+
+    def __init__(self, course_ids, course_embeddings, user_ids, student_embeddings, cf_factors, taken_courses,
+                 ann_index=None, ann_pool_size=200, ann_n_probe=8, scan_embeddings=None, lexical_index=None,
+                 metrics=None):
+        self.course_ids = course_ids
+        self.course_embeddings = course_embeddings
+        self.user_id_to_idx = {str(user_id): i for i, user_id in enumerate(user_ids)}
+        self.student_embeddings = student_embeddings
+        self.cf_factors = cf_factors
+        self.taken_courses = taken_courses
+        self.ann_index = ann_index
+        self.ann_pool_size = ann_pool_size
+        self.ann_n_probe = ann_n_probe
+        self.scan_embeddings = scan_embeddings
+        self.lexical_index = lexical_index
+        self.rescored_rows = 0  # Float32 course rows read by reduced-precision re-scoring
+        self._lock = threading.Lock()  # Counters are updated from the event loop and worker threads
+        self.metrics = metrics
+
+    def _stage(self, name):
+        """Times a stage when metrics are attached; a shared no-op context otherwise."""
+        return self.metrics.stage(name) if self.metrics is not None else _NO_STAGE
+
+    def _count(self, path, users, candidates):
+        if self.metrics is not None:
+            self.metrics.scored(path, users, candidates)
+
+    def knows_user(self, user_id):
+        return user_id in self.user_id_to_idx
+
+    def student_vectors(self, user_ids, overrides=None):
+        """
+        Returns the (users x dim) profile matrix and a mask of the users that have one. A vector in
+        `overrides` (one entry per user, None = use the stored profile) replaces the stored profile.
+        Users with neither keep an all-zero row, so their content score is 0.
+        """
+        students = np.zeros((len(user_ids), self.student_embeddings.shape[1]), dtype=np.float32)
+        has_profile = np.zeros(len(user_ids), dtype=bool)
+        for row, user_id in enumerate(user_ids):
+            override = overrides[row] if overrides is not None else None
+            if override is not None:
+                students[row] = override
+                has_profile[row] = True
+                continue
+            student_idx = self.user_id_to_idx.get(user_id)
+            if student_idx is not None:
+                students[row] = self.student_embeddings[student_idx]
+                has_profile[row] = True
+        return students, has_profile
+
+    def score(self, user_ids, students):
+        """Returns the (users x courses) hybrid scores for unit-length `students` and the taken-course masks."""
+        with self._stage('content'):
+            content_scores = row_products(students, self.course_embeddings)  # Rows are unit length, so this is cosine similarity
+        with self._stage('cf'):
+            cf_estimates = self.cf_factors.estimate_many(user_ids)
+        with self._stage('merge'):
+            scores = hybrid_scores(content_scores, cf_estimates)
+        with self._stage('taken_filter'):
+            taken = self.taken_courses.masks_for(user_ids)
+        return scores, taken
+
+    def recommend(self, user_ids, top_ns, overrides=None, lexical_weights=None, lexical_texts=None):
+        """
+        Returns, per user, the top-N untaken courses as (course_id, score) pairs, best first.
+        `overrides` optionally supplies a unit-length profile vector per user (see `student_vectors`).
+        `lexical_weights` gives each user's lexical weight (0 = semantic only, see the class docstring)
+        and `lexical_texts` optional free text to build their TF-IDF profile from.
+        """
+        students, has_profile = self.student_vectors(user_ids, overrides)
+        if lexical_weights is not None and any(lexical_weights):
+            return self._recommend_mixed(user_ids, top_ns, students, has_profile, lexical_weights, lexical_texts)
+        return self._recommend_semantic(user_ids, top_ns, students, has_profile)
+
+    def _recommend_mixed(self, user_ids, top_ns, students, has_profile, lexical_weights, lexical_texts):
+        """Scores the lexical/blended users and the purely semantic ones separately, keeping request order."""
+        if self.lexical_index is None:
+            raise ValueError("Lexical scoring needs a lexical index.")
+        lexical_texts = lexical_texts if lexical_texts is not None else [None] * len(user_ids)
+        blended = [i for i, weight in enumerate(lexical_weights) if weight]
+        semantic = [i for i, weight in enumerate(lexical_weights) if not weight]
+
+        results = [None] * len(user_ids)
+        for start in range(0, len(blended), self.BLOCK_SIZE):
+            rows = blended[start:start + self.BLOCK_SIZE]
+            block_users = [user_ids[i] for i in rows]
+            weights = np.array([lexical_weights[i] for i in rows], dtype=np.float64)[:, None]
+            with self._stage('lexical'):
+                content = weights * self.lexical_index.scores(
+                    self.lexical_index.student_rows(block_users, [lexical_texts[i] for i in rows])
+                )
+            if (weights < 1).any():
+                with self._stage('content'):
+                    content += (1 - weights) * row_products(students[rows], self.course_embeddings)
+            with self._stage('cf'):
+                cf_estimates = self.cf_factors.estimate_many(block_users)
+            with self._stage('merge'):
+                scores = hybrid_scores(content, cf_estimates)
+            with self._stage('taken_filter'):
+                taken = self.taken_courses.masks_for(block_users)
+            self._count('lexical', len(rows), taken.size - int(taken.sum()))
+            with self._stage('top_n'):
+                for row, i in enumerate(rows):
+                    top_idx = top_n_indices(scores[row], top_ns[i], exclude=taken[row])
+                    results[i] = [(self.course_ids[c], float(scores[row, c])) for c in top_idx]
+        if semantic:
+            semantic_results = self._recommend_semantic(
+                [user_ids[i] for i in semantic], [top_ns[i] for i in semantic], students[semantic], has_profile[semantic]
+            )
+            for i, recs in zip(semantic, semantic_results):
+                results[i] = recs
+        return results
+
+    def _recommend_semantic(self, user_ids, top_ns, students, has_profile):
+        if self.ann_index is None:
+            return self._recommend_exact(user_ids, top_ns, students)
+
+        results = []
+        for row, (user_id, top_n) in enumerate(zip(user_ids, top_ns)):
+            if has_profile[row]:
+                results.append(self._recommend_from_pool(user_id, top_n, students[row]))
+            else:
+                # Nothing to search the index with
+                if self.metrics is not None:
+                    self.metrics.fallback('ann_without_profile')
+                results.extend(self._recommend_exact([user_id], [top_n], students[row:row + 1]))
+        return results
+
+    def _recommend_exact(self, user_ids, top_ns, students):
+        if self.scan_embeddings is not None:
+            return self._recommend_rescored(user_ids, top_ns, students)
+        results = []
+        for start in range(0, len(user_ids), self.BLOCK_SIZE):
+            block = slice(start, start + self.BLOCK_SIZE)
+            scores, taken = self.score(user_ids[block], students[block])
+            self._count('exact', len(scores), taken.size - int(taken.sum()))
+            with self._stage('top_n'):
+                for row, top_n in enumerate(top_ns[block]):
+                    top_idx = top_n_indices(scores[row], top_n, exclude=taken[row])
+                    results.append([(self.course_ids[i], float(scores[row, i])) for i in top_idx])
+        return results
+
+    def _recommend_from_pool(self, user_id, top_n, student):
+        """Re-ranks the ANN candidate pool (sorted by catalog position) with the hybrid score."""
+        with self._stage('taken_filter'):
+            taken = self.taken_courses.courses_for(user_id)
+        with self._stage('content'):
+            pool = self.ann_index.search(
+                self.course_embeddings, student, max(self.ann_pool_size, top_n), self.ann_n_probe, exclude_rows=taken,
+            )
+            content = self.course_embeddings[pool] @ student
+        with self._stage('cf'):
+            cf_estimates = self.cf_factors.estimate_many([user_id], course_idx=pool)[0]
+        with self._stage('merge'):
+            scores = hybrid_scores(content, cf_estimates)
+        self._count('ann', 1, len(pool))
+        with self._stage('top_n'):
+            return [(self.course_ids[pool[i]], float(scores[i])) for i in top_n_indices(scores, top_n)]
+
+    def _recommend_rescored(self, user_ids, top_ns, students):
+        """Reduced-precision scan, then an exact float32 re-score of the shortlisted courses."""
+        margin = CONTENT_WEIGHT * self.scan_embeddings.errors
+        results = []
+        for start in range(0, len(user_ids), self.BLOCK_SIZE):
+            block = slice(start, start + self.BLOCK_SIZE)
+            with self._stage('cf'):
+                cf = self.cf_factors.estimate_many(user_ids[block])
+            with self._stage('content'):
+                approx_content = self.scan_embeddings.dot(students[block]).T
+            with self._stage('merge'):
+                approx = hybrid_scores(approx_content, cf)
+            with self._stage('taken_filter'):
+                taken = self.taken_courses.masks_for(user_ids[block])
+            for row, top_n in enumerate(top_ns[block]):
+                # A course can only reach the top-N if its upper bound beats the N-th best lower bound
+                lower = np.where(taken[row], -np.inf, approx[row] - margin)
+                n = min(int(top_n), int(np.count_nonzero(~taken[row])))
+                if n <= 0:
+                    results.append([])
+                    continue
+                with self._stage('top_n'):
+                    cutoff = lower[np.argpartition(-lower, n - 1)[n - 1]]
+                    shortlist = np.flatnonzero(~taken[row] & (approx[row] + margin >= cutoff))
+                with self._lock:
+                    self.rescored_rows += len(shortlist)
+                self._count('rescored', 1, len(shortlist))
+                with self._stage('rescore'):
+                    content = self.course_embeddings[shortlist] @ students[block][row]
+                    scores = hybrid_scores(content, cf[row, shortlist])
+                with self._stage('top_n'):
+                    results.append([(self.course_ids[shortlist[i]], float(scores[i])) for i in top_n_indices(scores, n)])
+        return results
@@ -0,0 +1,117 @@
+# Filename: test_postgrest_fetcher.py
+# Exports tables from fake_postgrest_server.py with postgrest_fetcher.py: capped pages (PostgREST's
+# max-rows) with and without exact counts, a table changing mid-export, and resuming from a checkpoint.
+#
+#   python -m unittest test_postgrest_fetcher.py
+import csv
+import json
+import os
+import tempfile
+import threading
+import unittest
+from http.server import ThreadingHTTPServer
+from fake_postgrest_server import make_handler
+from postgrest_fetcher import PostgrestFetcher
+
+N_ROWS = 23
+
+
+class RecordingFetcher(PostgrestFetcher):
+    """Records the offset of every page request; raises on the first request for `fail_at`."""
+
+    def __init__(self, *args, fail_at=None, on_page=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.offsets = []
+        self.fail_at = fail_at
+        self.on_page = on_page
+
+    def fetch_page(self, table, query, offset, count=False, limit=None):
+        with self._lock:
+            self.offsets.append(offset)
+        if offset == self.fail_at:
+            self.fail_at = None
+            raise ConnectionError(f"lost the connection at offset {offset}")
+        page = super().fetch_page(table, query, offset, count, limit)
+        if self.on_page is not None:
+            self.on_page(offset)
+        return page
+
+
+class PostgrestFetcherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.rows = [{'id': i, 'name': f"course {i}", 'tags': ['a', str(i)]} for i in range(N_ROWS)]
+        self.work_dir = tempfile.TemporaryDirectory()
+        self.output_path = os.path.join(self.work_dir.name, 'courses.csv')
+
+    def tearDown(self):
+        self.work_dir.cleanup()
+
+    def serve(self, **handler_options):
+        """Starts a fake server over self.rows and returns its REST root."""
+        server = ThreadingHTTPServer(('127.0.0.1', 0), make_handler({'courses': self.rows}, 0.0, 0.0, **handler_options))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return f"http://127.0.0.1:{server.server_address[1]}/rest/v1"
+
+    def fetcher(self, base_url, **options):
+        options = {'page_size': 10, 'max_in_flight': 3, 'max_retries': 0, **options}
+        fetcher = RecordingFetcher(base_url, 'test-key', **options)
+        self.addCleanup(fetcher.close)
+        return fetcher
+
+    def exported_ids(self):
+        with open(self.output_path, newline='') as f:
+            return [int(row['id']) for row in csv.DictReader(f)]
+
+    def test_capped_pages_with_count(self):
+        fetcher = self.fetcher(self.serve(max_rows=4))
+        stats = fetcher.fetch_table('courses', self.output_path)
+        self.assertEqual(stats['rows'], N_ROWS)
+        self.assertEqual(self.exported_ids(), list(range(N_ROWS)))
+        self.assertEqual(sorted(fetcher.offsets), list(range(0, N_ROWS, 4)))
+
+    def test_capped_pages_without_count(self):
+        fetcher = self.fetcher(self.serve(max_rows=4, exact_count=False))
+        fetcher.fetch_table('courses', self.output_path)
+        self.assertEqual(self.exported_ids(), list(range(N_ROWS)))
+        # Without a count, only an empty page ends the export
+        self.assertEqual(fetcher.offsets, list(range(0, N_ROWS, 4)) + [N_ROWS])
+
+    def test_rows_deleted_during_export_raise(self):
+        def delete_a_row(offset):
+            if offset == 0:
+                del self.rows[15]
+
+        fetcher = self.fetcher(self.serve(), max_in_flight=1, on_page=delete_a_row)
+        with self.assertRaises(RuntimeError):
+            fetcher.fetch_table('courses', self.output_path)
+        self.assertFalse(os.path.exists(self.output_path))
+        with open(f"{self.output_path}.checkpoint.json") as f:
+            self.assertEqual(json.load(f)['next_offset'], 20)
+
+    def test_resume_from_checkpoint(self):
+        base_url = self.serve(max_rows=4)
+        with self.assertRaises(ConnectionError):
+            self.fetcher(base_url, fail_at=12).fetch_table('courses', self.output_path)
+        partial_path, checkpoint_path = f"{self.output_path}.partial", f"{self.output_path}.checkpoint.json"
+        with open(checkpoint_path) as f:
+            checkpoint = json.load(f)
+        self.assertEqual((checkpoint['next_offset'], checkpoint['rows']), (12, 12))
+        # A page cut short by the crash, past the checkpoint
+        with open(partial_path, 'a') as f:
+            f.write('12,course 12,"[""a""')
+
+        fetcher = self.fetcher(base_url)
+        stats = fetcher.fetch_table('courses', self.output_path)
+        self.assertEqual(min(fetcher.offsets), 12)
+        self.assertEqual(stats['rows'], N_ROWS)
+        self.assertEqual(self.exported_ids(), list(range(N_ROWS)))
+        self.assertFalse(os.path.exists(partial_path) or os.path.exists(checkpoint_path))
+        with open(self.output_path, newline='') as f:
+            self.assertEqual(json.loads(list(csv.DictReader(f))[N_ROWS - 1]['tags']), ['a', str(N_ROWS - 1)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+# Filename: text_normalization.py
+# Shared text normalization for the TF-IDF pipelines: lowercase, strip punctuation, tokenize, drop
+# stopwords and non-alphabetic tokens, lemmatize. NLTK resources are loaded once per process.
+import re
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+import nltk
+
+_PUNCTUATION = re.compile(r'[^\w\s]')
+
+
+class TextNormalizer:
+    """
+    Callable equivalent of the scripts' former per-row `preprocess_text`, with the stopword set and
+    lemmatizer built once and one lemma lookup per distinct token. `min_token_length` drops shorter
+    tokens (02_preprocess_course_text.py keeps only tokens longer than two characters).
+    """
+
+    def __init__(self, min_token_length=0):
+        self.min_token_length = min_token_length
+        self.stop_words = set(nltk.corpus.stopwords.words('english'))
+        self._lemmatizer = nltk.stem.WordNetLemmatizer()
+        self._lemmas = {}
+
+    def lemmatize(self, token):
+        lemma = self._lemmas.get(token)
+        if lemma is None:
+            lemma = self._lemmas[token] = self._lemmatizer.lemmatize(token)
+        return lemma
+
+    def __call__(self, text):
+        if pd.isna(text):
+            return ""
+        text = _PUNCTUATION.sub('', str(text).lower())
+        tokens = nltk.word_tokenize(text)
+        return " ".join(
+            self.lemmatize(w) for w in tokens
+            if w not in self.stop_words and w.isalpha() and len(w) >= self.min_token_length
+        )
+
+
+_worker_normalizer = None
+
+
+def _init_worker(min_token_length):
+    global _worker_normalizer
+    _worker_normalizer = TextNormalizer(min_token_length)
+
+
+def _normalize_chunk(texts):
+    return [_worker_normalizer(text) for text in texts]
+
+
+def normalize_corpus(texts, min_token_length=0, n_jobs=1, chunk_size=256):
+    """
+    Normalizes every text of `texts`, in order. With `n_jobs` > 1 the corpus is split into chunks of
+    `chunk_size` texts spread over a process pool (each worker keeps its own lemma memo), so callers
+    must run under `if __name__ == "__main__":`.
+    """
+    texts = list(texts)
+    if n_jobs <= 1 or len(texts) <= chunk_size:
+        normalizer = TextNormalizer(min_token_length)
+        return [normalizer(text) for text in texts]
+
+    chunks = [texts[i:i + chunk_size] for i in range(0, len(texts), chunk_size)]
+    with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker, initargs=(min_token_length,)) as pool:
+        return [text for chunk in pool.map(_normalize_chunk, chunks) for text in chunk]